@@ -0,0 +1,37 @@
+from typing import Any
+from app.services.admission import AdmissionController, admission
+from app.services.answer_cache import AnswerCache, answer_cache
+from app.services.assistant_registry import AssistantRegistry, assistant_registry
+from app.services.language_service import LanguageService, language_service
+from app.services.message_writer import MessageWriter, message_writer
+from app.services.openai_service import openai_service
+from app.services.supabase_service import SupabaseService, supabase_service
+from app.services.train_jobs import TrainJobManager, train_jobs
+
+# Dependencias de FastAPI para los servicios que usan las rutas. Las
+# instancias no abren conexiones hasta su primer uso (o hasta el arranque, si
+# se precalientan) y se pueden sustituir con app.dependency_overrides.
+
+def get_supabase_service() -> SupabaseService:
+    return supabase_service
+
+def get_message_writer() -> MessageWriter:
+    return message_writer
+
+def get_answer_cache() -> AnswerCache:
+    return answer_cache
+
+def get_assistant_registry() -> AssistantRegistry:
+    return assistant_registry
+
+def get_language_service() -> LanguageService:
+    return language_service
+
+def get_train_jobs() -> TrainJobManager:
+    return train_jobs
+
+def get_admission() -> AdmissionController:
+    return admission
+
+def get_openai_service() -> Any:
+    return openai_service
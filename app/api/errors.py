@@ -0,0 +1,30 @@
+import logging
+from typing import Any, Dict
+from fastapi import HTTPException
+from app.core.resilience import is_transient, retry_after_for
+from app.services.supabase_service import SupabaseService
+
+logger = logging.getLogger(__name__)
+
+def upstream_error(error: Exception, detail: str) -> HTTPException:
+    """
+    Respuesta para un error inesperado de una ruta: 503 con Retry-After si
+    es una caída pasajera de Supabase u OpenAI, 500 con `detail` si no.
+    """
+    if is_transient(error):
+        return HTTPException(
+            status_code=503,
+            detail="Servicio no disponible temporalmente",
+            headers={"Retry-After": str(retry_after_for(error))}
+        )
+    return HTTPException(status_code=500, detail=detail)
+
+async def require_client(supabase: SupabaseService, client_id: str) -> Dict[str, Any]:
+    """
+    Obtiene el cliente o responde 404 si no existe. Los errores al
+    consultarlo se propagan para no confundirlos con un cliente inexistente.
+    """
+    client = await supabase.get_client(client_id, strict=True)
+    if not client:
+        raise HTTPException(status_code=404, detail="Cliente no encontrado")
+    return client
@@ -1,108 +1,277 @@
 import logging
-from fastapi import APIRouter, HTTPException
-from app.models.api import (
-    MessageRequest,
-    MessageResponse,
-    TrainRequest,
-    TrainResponse
+from typing import Any, Dict, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from app.core.utils import format_sse
+from app.models.api import MessageRequest, MessageResponse
+from app.api.deps import (
+    get_admission,
+    get_answer_cache,
+    get_assistant_registry,
+    get_language_service,
+    get_message_writer,
+    get_supabase_service
 )
-from app.services.openai_assistant import openai_assistant
-from app.services.supabase_service import supabase_service
+from app.api.errors import require_client, upstream_error
+from app.services.admission import AdmissionController
+from app.services.answer_cache import AnswerCache
+from app.services.assistant_registry import AssistantRegistry
+from app.services.chat_engine import resolve_engine
+from app.services.language_service import LanguageService
+from app.services.message_writer import MessageWriter
+from app.services.supabase_service import SupabaseService
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+async def _persist_message(
+    supabase: SupabaseService,
+    writer: MessageWriter,
+    conversation_id: str,
+    role: str,
+    content: str
+) -> bool:
+    """
+    Guarda un mensaje, de forma diferida si el write-behind está activo.
+    """
+    if writer.enqueue(conversation_id, role, content):
+        return True
+    return bool(await supabase.save_message(conversation_id, role, content))
+
+async def _prepare_conversation(
+    request: MessageRequest,
+    supabase: SupabaseService,
+    writer: MessageWriter
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Verifica el cliente, obtiene o crea la conversación activa y guarda el mensaje del usuario.
+    
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, Any]]: (cliente, conversación)
+    """
+    # Verificar que el cliente existe
+    client = await require_client(supabase, request.client_id)
+    
+    # Obtener o crear conversación
+    conversation = await supabase.get_or_create_active_conversation(
+        request.client_id,
+        request.role
+    )
+    if not conversation:
+        raise HTTPException(status_code=500, detail="Error al crear conversación")
+    
+    # Guardar mensaje del usuario
+    user_message = await _persist_message(
+        supabase,
+        writer,
+        conversation["id"],
+        "user",
+        request.message
+    )
+    if not user_message:
+        raise HTTPException(status_code=500, detail="Error al guardar mensaje")
+    
+    return client, conversation
+
+async def _cached_answer(
+    request: MessageRequest,
+    client: Dict[str, Any],
+    cache: AnswerCache,
+    languages: LanguageService,
+    registry: AssistantRegistry
+) -> Tuple[Optional[Tuple[str, Optional[str]]], Optional[str]]:
+    """
+    Busca la respuesta en la caché de respuestas si aplica al cliente y rol.
+    
+    Returns:
+        Tuple[Optional[Tuple[str, Optional[str]]], Optional[str]]: ((idioma del
+        mensaje, huella de las instrucciones vigentes), respuesta cacheada); la
+        primera parte es None si la caché no aplica
+    """
+    if not cache.applies_to(client, request.role):
+        return None, None
+    language = await languages.detect(request.message)
+    # El registro refleja los reentrenamientos hechos por cualquier worker
+    record = await registry.get(request.client_id)
+    instructions_hash = record.get("instructions_hash") if record else None
+    cached = cache.get(request.client_id, request.role, request.message, language, instructions_hash)
+    return (language, instructions_hash), cached
+
+def _cache_answer(
+    request: MessageRequest,
+    cache: AnswerCache,
+    cache_key: Optional[Tuple[str, Optional[str]]],
+    response: Dict[str, Any]
+) -> None:
+    """
+    Guarda la respuesta generada si la caché aplica. Una respuesta a varios
+    mensajes juntos no responde solo a la pregunta de esta petición, así que
+    no se guarda.
+    """
+    if not cache_key or response.get("batched"):
+        return
+    language, instructions_hash = cache_key
+    cache.set(
+        request.client_id,
+        request.role,
+        request.message,
+        language,
+        response["response"],
+        instructions_hash,
+        response.get("tokens", 0)
+    )
+
 @router.post("/message", response_model=MessageResponse)
-async def send_message(request: MessageRequest) -> MessageResponse:
+async def send_message(
+    request: MessageRequest,
+    supabase: SupabaseService = Depends(get_supabase_service),
+    writer: MessageWriter = Depends(get_message_writer),
+    cache: AnswerCache = Depends(get_answer_cache),
+    languages: LanguageService = Depends(get_language_service),
+    registry: AssistantRegistry = Depends(get_assistant_registry),
+    admission: AdmissionController = Depends(get_admission)
+) -> MessageResponse:
     """
     Envía un mensaje a NNIA y obtiene la respuesta.
+    
+    Si el worker ya tiene el máximo de runs en curso y la cola de espera
+    está llena, responde 503 (o 429 si el límite es el del cliente) con
+    Retry-After.
     """
+    admitted_at = await admission.acquire(request.client_id)
     try:
-        # Verificar que el cliente existe
-        client = await supabase_service.get_client(request.client_id)
-        if not client:
-            raise HTTPException(status_code=404, detail="Cliente no encontrado")
-        
-        # Obtener o crear conversación
-        conversations = await supabase_service.get_conversations(request.client_id)
-        conversation = next(
-            (c for c in conversations if c["role"] == request.role and c["status"] == "active"),
-            None
-        )
+        client, conversation = await _prepare_conversation(request, supabase, writer)
         
-        if not conversation:
-            conversation = await supabase_service.create_conversation(
+        # Obtener respuesta de NNIA, de la caché si es una pregunta repetida
+        cache_key, cached = await _cached_answer(request, client, cache, languages, registry)
+        if cached:
+            response = {"thread_id": conversation.get("thread_id") or "", "response": cached}
+        else:
+            engine = resolve_engine(request.engine, client)
+            response = await engine.send_message(
                 request.client_id,
-                request.role
+                request.message,
+                conversation.get("thread_id"),
+                conversation_id=conversation["id"]
             )
-            if not conversation:
-                raise HTTPException(status_code=500, detail="Error al crear conversación")
-        
-        # Guardar mensaje del usuario
-        user_message = await supabase_service.save_message(
-            conversation["id"],
-            "user",
-            request.message
-        )
-        if not user_message:
-            raise HTTPException(status_code=500, detail="Error al guardar mensaje")
+            _cache_answer(request, cache, cache_key, response)
         
-        # Obtener respuesta de NNIA
-        response = await openai_assistant.send_message(
-            request.client_id,
-            request.message,
-            conversation.get("thread_id")
-        )
+        # Guardar respuesta de NNIA (una sola vez si respondió a varios mensajes)
+        if not response.get("coalesced"):
+            assistant_message = await _persist_message(
+                supabase,
+                writer,
+                conversation["id"],
+                "assistant",
+                response["response"]
+            )
+            if not assistant_message:
+                raise HTTPException(status_code=500, detail="Error al guardar respuesta")
         
-        # Guardar respuesta de NNIA
-        assistant_message = await supabase_service.save_message(
-            conversation["id"],
-            "assistant",
-            response["response"]
-        )
-        if not assistant_message:
-            raise HTTPException(status_code=500, detail="Error al guardar respuesta")
+        # Recordar el thread para los siguientes mensajes
+        if response["thread_id"] and response["thread_id"] != conversation.get("thread_id"):
+            await supabase.set_conversation_thread(conversation, response["thread_id"])
         
         return MessageResponse(
             thread_id=response["thread_id"],
             response=response["response"]
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error en endpoint /message: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail="Error interno al procesar el mensaje"
-        )
+        raise upstream_error(e, "Error interno al procesar el mensaje")
+    finally:
+        admission.release(request.client_id, admitted_at)
 
-@router.post("/train", response_model=TrainResponse)
-async def train_assistant(request: TrainRequest) -> TrainResponse:
+@router.post("/message/stream")
+async def stream_message(
+    request: MessageRequest,
+    supabase: SupabaseService = Depends(get_supabase_service),
+    writer: MessageWriter = Depends(get_message_writer),
+    cache: AnswerCache = Depends(get_answer_cache),
+    languages: LanguageService = Depends(get_language_service),
+    registry: AssistantRegistry = Depends(get_assistant_registry),
+    admission: AdmissionController = Depends(get_admission)
+) -> StreamingResponse:
     """
-    Reentrena el assistant con la información actualizada del cliente.
+    Envía un mensaje a NNIA y transmite la respuesta como Server-Sent Events.
+    
+    Emite eventos `delta` con cada fragmento, un evento `done` con el thread y
+    la respuesta completa, o un evento `error`. La respuesta se guarda en
+    Supabase y en la caché de respuestas una vez cerrado el stream. El hueco del control de admisión se
+    mantiene hasta que termina el stream.
     """
+    admitted_at = await admission.acquire(request.client_id)
     try:
-        # Verificar que el cliente existe
-        client = await supabase_service.get_client(request.client_id)
-        if not client:
-            raise HTTPException(status_code=404, detail="Cliente no encontrado")
-        
-        # Reentrenar assistant
-        success = await openai_assistant.train_assistant(request.client_id)
-        
-        if success:
-            return TrainResponse(
-                success=True,
-                message="Assistant reentrenado exitosamente"
-            )
-        else:
-            raise HTTPException(
-                status_code=500,
-                detail="Error al reentrenar el assistant"
-            )
-            
+        client, conversation = await _prepare_conversation(request, supabase, writer)
+        cache_key, cached = await _cached_answer(request, client, cache, languages, registry)
+        engine = resolve_engine(request.engine, client)
+    except HTTPException:
+        admission.release(request.client_id, admitted_at)
+        raise
     except Exception as e:
-        logger.error(f"Error en endpoint /train: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail="Error interno al reentrenar el assistant"
-        ) 
\ No newline at end of file
+        admission.release(request.client_id, admitted_at)
+        logger.error(f"Error en endpoint /message/stream: {str(e)}")
+        raise upstream_error(e, "Error interno al procesar el mensaje")
+    
+    result: Dict[str, Any] = {}
+    
+    async def event_stream():
+        try:
+            async for chunk in _stream_events():
+                yield chunk
+        finally:
+            admission.release(request.client_id, admitted_at)
+    
+    async def _stream_events():
+        if cached:
+            result.update({"thread_id": conversation.get("thread_id") or "", "response": cached})
+            yield format_sse("delta", {"text": cached})
+            yield format_sse("done", result)
+            return
+        
+        try:
+            async for event in engine.stream_message(
+                request.client_id,
+                request.message,
+                conversation.get("thread_id"),
+                conversation_id=conversation["id"]
+            ):
+                if event["type"] == "delta":
+                    yield format_sse("delta", {"text": event["text"]})
+                else:
+                    result.update(event)
+                    yield format_sse("done", {
+                        "thread_id": event["thread_id"],
+                        "response": event["response"]
+                    })
+        except Exception as e:
+            logger.error(f"Error en stream de /message/stream: {str(e)}")
+            yield format_sse("error", {"detail": "Error interno al procesar el mensaje"})
+    
+    async def save_response():
+        if not result.get("response"):
+            return
+        if not cached:
+            _cache_answer(request, cache, cache_key, result)
+        if result["thread_id"] and result["thread_id"] != conversation.get("thread_id"):
+            await supabase.set_conversation_thread(conversation, result["thread_id"])
+        assistant_message = await _persist_message(
+            supabase,
+            writer,
+            conversation["id"],
+            "assistant",
+            result["response"]
+        )
+        if not assistant_message:
+            logger.error(f"Error al guardar respuesta en streaming para conversación {conversation['id']}")
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(save_response)
+    )
@@ -1,85 +1,201 @@
+import json
 import logging
-from typing import List
-from fastapi import APIRouter, HTTPException
-from app.models.api import Lead, Ticket, Conversation
-from app.services.supabase_service import supabase_service
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from app.core.pagination import Cursor, decode_cursor, encode_cursor, iter_pages
+from app.models.api import Lead, Ticket, Conversation, Message
+from app.api.deps import get_supabase_service
+from app.api.errors import require_client, upstream_error
+from app.services.supabase_service import SupabaseService
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Tamaño de página usado en modo NDJSON si no se indica `limit`
+NDJSON_PAGE_SIZE = 500
+
+PageFetcher = Callable[[str, int, Optional[Cursor]], Awaitable[List[Dict[str, Any]]]]
+PageBuilder = Callable[[List[Dict[str, Any]]], Awaitable[List[BaseModel]]]
+
+def _parse_cursor(cursor: Optional[str]) -> Optional[Cursor]:
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+async def _paginated(
+    fetch_page: PageFetcher,
+    build: PageBuilder,
+    client_id: str,
+    response: Response,
+    limit: int,
+    cursor: Optional[str]
+) -> List[BaseModel]:
+    """
+    Devuelve una página y anuncia la siguiente en la cabecera `X-Next-Cursor`.
+    """
+    rows = await fetch_page(client_id, limit, _parse_cursor(cursor))
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1])
+    return await build(rows)
+
+def _ndjson(
+    fetch_page: PageFetcher,
+    build: PageBuilder,
+    client_id: str,
+    limit: Optional[int],
+    cursor: Optional[str],
+    endpoint: str
+) -> StreamingResponse:
+    """
+    Transmite todas las filas como NDJSON, leyendo de Supabase una página cada vez.
+    
+    Si falla a mitad de la respuesta (el código 200 ya se envió), la última
+    línea es {"error": ..., "cursor": ...}, con el cursor desde el que
+    reanudar la exportación; un stream completo nunca contiene esa clave.
+    """
+    after = _parse_cursor(cursor)
+    
+    async def lines() -> AsyncIterator[str]:
+        resume = cursor
+        try:
+            async for rows in iter_pages(fetch_page, client_id, limit or NDJSON_PAGE_SIZE, after):
+                for item in await build(rows):
+                    yield item.model_dump_json() + "\n"
+                resume = encode_cursor(rows[-1])
+        except Exception as e:
+            logger.error(f"Error en stream NDJSON de {endpoint}: {str(e)}")
+            yield json.dumps({"error": "Exportación interrumpida", "cursor": resume}) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+async def _build_leads(rows: List[Dict[str, Any]]) -> List[Lead]:
+    return [Lead(**lead) for lead in rows]
+
+async def _build_tickets(rows: List[Dict[str, Any]]) -> List[Ticket]:
+    return [Ticket(**ticket) for ticket in rows]
+
+async def _build_conversations(supabase: SupabaseService, rows: List[Dict[str, Any]]) -> List[Conversation]:
+    # Obtener los mensajes de todas las conversaciones en lotes
+    messages = await supabase.get_messages_for_conversations(
+        [conv["id"] for conv in rows]
+    )
+    
+    return [
+        Conversation(
+            **conv,
+            messages=[Message(**msg) for msg in messages.get(conv["id"], [])]
+        )
+        for conv in rows
+    ]
+
 @router.get("/leads/{client_id}", response_model=List[Lead])
-async def get_leads(client_id: str) -> List[Lead]:
+async def get_leads(
+    client_id: str,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Tamaño de página"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en X-Next-Cursor"),
+    output: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    supabase: SupabaseService = Depends(get_supabase_service)
+) -> List[Lead]:
     """
     Obtiene los leads capturados para un cliente.
+    
+    Con `limit` devuelve una página y el cursor de la siguiente en
+    `X-Next-Cursor`; con `format=ndjson` transmite todos los leads
+    y, si el stream se interrumpe, termina con una línea `{"error", "cursor"}`.
     """
     try:
         # Verificar que el cliente existe
-        client = await supabase_service.get_client(client_id)
-        if not client:
-            raise HTTPException(status_code=404, detail="Cliente no encontrado")
+        await require_client(supabase, client_id)
+        
+        if output == "ndjson":
+            return _ndjson(supabase.get_leads_page, _build_leads, client_id, limit, cursor, "/leads")
+        if limit:
+            return await _paginated(supabase.get_leads_page, _build_leads, client_id, response, limit, cursor)
         
         # Obtener leads
-        leads = await supabase_service.get_leads(client_id)
+        leads = await supabase.get_leads(client_id)
         return [Lead(**lead) for lead in leads]
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error en endpoint /leads: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail="Error interno al obtener leads"
-        )
+        raise upstream_error(e, "Error interno al obtener leads")
 
 @router.get("/tickets/{client_id}", response_model=List[Ticket])
-async def get_tickets(client_id: str) -> List[Ticket]:
+async def get_tickets(
+    client_id: str,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Tamaño de página"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en X-Next-Cursor"),
+    output: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    supabase: SupabaseService = Depends(get_supabase_service)
+) -> List[Ticket]:
     """
     Obtiene los tickets de soporte para un cliente.
+    
+    Con `limit` devuelve una página y el cursor de la siguiente en
+    `X-Next-Cursor`; con `format=ndjson` transmite todos los tickets
+    y, si el stream se interrumpe, termina con una línea `{"error", "cursor"}`.
     """
     try:
         # Verificar que el cliente existe
-        client = await supabase_service.get_client(client_id)
-        if not client:
-            raise HTTPException(status_code=404, detail="Cliente no encontrado")
+        await require_client(supabase, client_id)
+        
+        if output == "ndjson":
+            return _ndjson(supabase.get_tickets_page, _build_tickets, client_id, limit, cursor, "/tickets")
+        if limit:
+            return await _paginated(supabase.get_tickets_page, _build_tickets, client_id, response, limit, cursor)
         
         # Obtener tickets
-        tickets = await supabase_service.get_tickets(client_id)
+        tickets = await supabase.get_tickets(client_id)
         return [Ticket(**ticket) for ticket in tickets]
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error en endpoint /tickets: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail="Error interno al obtener tickets"
-        )
+        raise upstream_error(e, "Error interno al obtener tickets")
 
 @router.get("/conversations/{client_id}", response_model=List[Conversation])
-async def get_conversations(client_id: str) -> List[Conversation]:
+async def get_conversations(
+    client_id: str,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Tamaño de página"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en X-Next-Cursor"),
+    output: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    supabase: SupabaseService = Depends(get_supabase_service)
+) -> List[Conversation]:
     """
     Obtiene las conversaciones y mensajes para un cliente.
+    
+    Con `limit` devuelve una página y el cursor de la siguiente en
+    `X-Next-Cursor`; con `format=ndjson` transmite todas las conversaciones
+    y, si el stream se interrumpe, termina con una línea `{"error", "cursor"}`.
     """
+    build = partial(_build_conversations, supabase)
     try:
         # Verificar que el cliente existe
-        client = await supabase_service.get_client(client_id)
-        if not client:
-            raise HTTPException(status_code=404, detail="Cliente no encontrado")
+        await require_client(supabase, client_id)
         
-        # Obtener conversaciones
-        conversations = await supabase_service.get_conversations(client_id)
+        if output == "ndjson":
+            return _ndjson(supabase.get_conversations_page, build, client_id, limit, cursor, "/conversations")
+        if limit:
+            return await _paginated(supabase.get_conversations_page, build, client_id, response, limit, cursor)
         
-        # Obtener mensajes para cada conversación
-        result = []
-        for conv in conversations:
-            messages = await supabase_service.get_messages(conv["id"])
-            conversation = Conversation(
-                **conv,
-                messages=[Message(**msg) for msg in messages]
-            )
-            result.append(conversation)
-        
-        return result
+        # Obtener conversaciones
+        conversations = await supabase.get_conversations(client_id)
+        return await build(conversations)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error en endpoint /conversations: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail="Error interno al obtener conversaciones"
-        ) 
\ No newline at end of file
+        raise upstream_error(e, "Error interno al obtener conversaciones")
@@ -0,0 +1,88 @@
+from typing import Any, Dict, Tuple
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+from app.core.metrics import Counter, Gauge, registry
+from app.core.resilience import breaker_stats
+from app.services.admission import admission
+from app.services.answer_cache import answer_cache
+from app.services.assistant_registry import assistant_registry
+from app.services.language_service import language_service
+from app.services.message_writer import message_writer
+from app.services.openai_service import thread_store
+from app.services.run_waiter import run_waiter
+from app.services.supabase_service import supabase_service
+from app.services.thread_compactor import thread_compactor
+from app.services.thread_runs import thread_runs
+from app.services.train_jobs import train_jobs
+
+router = APIRouter()
+# Router montado en la raíz para que Prometheus lo encuentre en /metrics
+metrics_router = APIRouter()
+
+def _sections() -> Dict[str, Dict[str, Any]]:
+    return {
+        "thread_store": thread_store.stats(),
+        "assistant_registry": assistant_registry.stats(),
+        "run_waiter": run_waiter.stats(),
+        "client_cache": supabase_service.cache_stats(),
+        "active_conversations": supabase_service.active_conversation_stats(),
+        "message_writer": message_writer.stats(),
+        "language": language_service.stats(),
+        "train_jobs": train_jobs.stats(),
+        "thread_runs": thread_runs.stats(),
+        "answer_cache": answer_cache.stats(),
+        "compaction": thread_compactor.stats(),
+        "admission": admission.stats(),
+        "circuit_breakers": breaker_stats()
+    }
+
+def _collect(key: str) -> Dict[Tuple[str, ...], float]:
+    """Valor `key` de cada sección que lo tenga."""
+    return {
+        (section,): data[key]
+        for section, data in _sections().items()
+        if isinstance(data.get(key), (int, float))
+    }
+
+def _collect_internal() -> Dict[Tuple[str, ...], float]:
+    """Todos los valores numéricos de /stats, por sección y nombre."""
+    return {
+        (section, key): value
+        for section, data in _sections().items()
+        for key, value in data.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+
+class _CollectedCounter(Counter):
+    """Contador cuyo valor se lee de /stats al exportar."""
+    def __init__(self, name: str, documentation: str, key: str):
+        super().__init__(name, documentation, ("cache",))
+        self._key = key
+    
+    def render(self):
+        self._values = _collect(self._key)
+        return super().render()
+
+registry.register(_CollectedCounter("nnia_cache_hits_total", "Aciertos por caché", "hits"))
+registry.register(_CollectedCounter("nnia_cache_misses_total", "Fallos por caché", "misses"))
+registry.register(Gauge(
+    "nnia_internal",
+    "Contadores internos expuestos en /stats",
+    ("section", "name"),
+    collect=_collect_internal
+))
+
+@router.get("/stats")
+async def get_stats(request: Request) -> Dict[str, Any]:
+    """
+    Devuelve los contadores internos de cachés y esperas del proceso y los
+    tiempos de importación y arranque.
+    """
+    return {**_sections(), "startup": getattr(request.app.state, "startup", {})}
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics() -> PlainTextResponse:
+    """
+    Métricas del proceso en formato de texto de Prometheus.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,93 @@
+import logging
+from fastapi import APIRouter, Depends, HTTPException
+from app.models.api import (
+    TrainRequest,
+    TrainJob,
+    BulkTrainRequest,
+    BulkTrainResponse,
+    TrainBatchStatus
+)
+from app.api.deps import get_supabase_service, get_train_jobs
+from app.api.errors import require_client, upstream_error
+from app.services.job_queue import Job
+from app.services.supabase_service import SupabaseService
+from app.services.train_jobs import TrainJobManager
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+def _job_response(job: Job) -> TrainJob:
+    return TrainJob(
+        id=job.id,
+        client_id=job.payload["client_id"],
+        batch_id=job.batch_id,
+        status=job.status,
+        attempts=job.attempts,
+        result=job.result,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
+
+@router.post("/train", response_model=TrainJob, status_code=202)
+async def train_assistant(
+    request: TrainRequest,
+    supabase: SupabaseService = Depends(get_supabase_service),
+    jobs: TrainJobManager = Depends(get_train_jobs)
+) -> TrainJob:
+    """
+    Encola el reentrenamiento del assistant con la información actualizada
+    del cliente. El progreso se consulta en /train/jobs/{job_id}.
+    """
+    try:
+        # Verificar que el cliente existe
+        await require_client(supabase, request.client_id)
+        
+        job = await jobs.submit(request.client_id)
+        return _job_response(job)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error en endpoint /train: {str(e)}")
+        raise upstream_error(e, "Error interno al reentrenar el assistant")
+
+@router.post("/train/bulk", response_model=BulkTrainResponse, status_code=202)
+async def train_assistants(
+    request: BulkTrainRequest,
+    jobs: TrainJobManager = Depends(get_train_jobs)
+) -> BulkTrainResponse:
+    """
+    Encola el reentrenamiento de varios clientes. El progreso del lote se
+    consulta en /train/batches/{batch_id}.
+    """
+    try:
+        batch = await jobs.submit_many(request.client_ids)
+        return BulkTrainResponse(**batch)
+        
+    except Exception as e:
+        logger.error(f"Error en endpoint /train/bulk: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno al encolar los reentrenamientos"
+        )
+
+@router.get("/train/jobs/{job_id}", response_model=TrainJob)
+async def get_train_job(job_id: str, jobs: TrainJobManager = Depends(get_train_jobs)) -> TrainJob:
+    """
+    Obtiene el estado de un reentrenamiento.
+    """
+    job = await jobs.queue.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return _job_response(job)
+
+@router.get("/train/batches/{batch_id}", response_model=TrainBatchStatus)
+async def get_train_batch(batch_id: str, jobs: TrainJobManager = Depends(get_train_jobs)) -> TrainBatchStatus:
+    """
+    Obtiene el progreso de un lote de reentrenamientos.
+    """
+    progress = await jobs.batch_progress(batch_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Lote no encontrado")
+    return TrainBatchStatus(**progress)
@@ -0,0 +1,106 @@
+import logging
+from typing import Any
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from app.core.utils import format_sse
+from app.models.chat import ChatRequest, ChatResponse
+from app.api.deps import get_admission, get_openai_service
+from app.api.errors import upstream_error
+from app.services.admission import AdmissionController
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(
+    request: ChatRequest,
+    admission: AdmissionController = Depends(get_admission),
+    openai_service: Any = Depends(get_openai_service)
+) -> ChatResponse:
+    """
+    Endpoint para interactuar con NNIA.
+    
+    Args:
+        request: Datos de la petición validados por Pydantic
+        
+    Returns:
+        ChatResponse: Respuesta de NNIA
+        
+    Raises:
+        HTTPException: 503 con Retry-After si OpenAI no está disponible
+            temporalmente, 500 si ocurre otro error interno
+        AdmissionRejected: Si el worker o el widget no admiten más runs
+    """
+    tenant = f"widget:{request.widget_id}"
+    admitted_at = await admission.acquire(tenant)
+    try:
+        logger.info(f"Recibida petición de chat - Widget: {request.widget_id}, User: {request.user_id}")
+        
+        # Llamar a NNIA
+        response = await openai_service.ask_nnia(
+            message=request.message,
+            widget_id=request.widget_id,
+            user_id=request.user_id,
+            language=request.language,
+            engine=request.engine
+        )
+        
+        logger.info(f"Respuesta generada exitosamente para Widget: {request.widget_id}")
+        return ChatResponse(
+            response=response,
+            role="assistant",
+            finish_reason="stop",
+            language=request.language or "es"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error en endpoint /chat: {str(e)}")
+        raise upstream_error(e, "Error interno al procesar la petición")
+    finally:
+        admission.release(tenant, admitted_at)
+
+@router.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    admission: AdmissionController = Depends(get_admission),
+    openai_service: Any = Depends(get_openai_service)
+) -> StreamingResponse:
+    """
+    Variante en streaming de /chat usando Server-Sent Events.
+    
+    Emite eventos `delta` con cada fragmento, un evento `done` con la respuesta
+    completa o un evento `error` si falla la generación. El hueco del control
+    de admisión se mantiene hasta que termina el stream.
+    """
+    logger.info(f"Recibida petición de chat en streaming - Widget: {request.widget_id}, User: {request.user_id}")
+    tenant = f"widget:{request.widget_id}"
+    admitted_at = await admission.acquire(tenant)
+    
+    async def event_stream():
+        parts = []
+        try:
+            async for text in openai_service.ask_nnia_stream(
+                message=request.message,
+                widget_id=request.widget_id,
+                user_id=request.user_id,
+                language=request.language,
+                engine=request.engine
+            ):
+                parts.append(text)
+                yield format_sse("delta", {"text": text})
+            yield format_sse("done", {"response": "".join(parts)})
+        except Exception as e:
+            logger.error(f"Error en endpoint /chat/stream: {str(e)}")
+            yield format_sse("error", {"detail": "Error interno al procesar la petición"})
+        finally:
+            admission.release(tenant, admitted_at)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
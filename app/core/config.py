@@ -12,10 +12,111 @@ class Settings(BaseSettings):
     # OpenAI
     OPENAI_API_KEY: str
     ASSISTANT_ID: str
+    OPENAI_BASE_URL: Optional[str] = None  # p. ej. el servidor falso de benchmarks/
+    
+    # Espera de runs de OpenAI (segundos)
+    RUN_POLL_INITIAL_INTERVAL: float = 0.2
+    RUN_POLL_FAST_POLLS: int = 5
+    RUN_POLL_BACKOFF_FACTOR: float = 1.5
+    RUN_POLL_MAX_INTERVAL: float = 2.0
+    RUN_POLL_JITTER: float = 0.1
+    RUN_WAIT_TIMEOUT: float = 120.0
+    RUN_WAIT_SHARED_POLLER: bool = False
+    
+    # Registro de assistants por cliente
+    ASSISTANT_REGISTRY_TTL: float = 300.0
+    ASSISTANT_REGISTRY_MAX_SIZE: int = 1000
+    
+    # Almacenamiento de threads de /chat ("memory" o "supabase")
+    THREAD_STORE_BACKEND: str = "memory"
+    THREAD_STORE_TTL: float = 86400.0
+    THREAD_STORE_MAX_SIZE: int = 10000
+    
+    # Caché de clientes e información del negocio (segundos)
+    CLIENT_CACHE_TTL: float = 60.0
+    CLIENT_CACHE_NEGATIVE_TTL: float = 10.0
+    CLIENT_CACHE_MAX_SIZE: int = 1000
+    
+    # Caché de la conversación activa por (client_id, rol)
+    ACTIVE_CONVERSATION_CACHE_TTL: float = 300.0
+    ACTIVE_CONVERSATION_CACHE_MAX_SIZE: int = 10000
+    
+    # Escritura diferida de mensajes (write-behind)
+    MESSAGE_WRITE_BEHIND: bool = False
+    MESSAGE_WRITE_BATCH_SIZE: int = 100
+    MESSAGE_WRITE_FLUSH_INTERVAL: float = 0.5
+    MESSAGE_WRITE_QUEUE_SIZE: int = 10000
+    MESSAGE_WRITE_SPOOL_PATH: str = "message_spool.jsonl"
+    
+    # Detección de idioma
+    LANGUAGE_DEFAULT: str = "en"
+    LANGUAGE_CACHE_MAX_SIZE: int = 10000
+    LANGUAGE_PRELOAD: bool = True
+    
+    # Reentrenamientos en segundo plano
+    JOB_QUEUE_BACKEND: str = "memory"
+    TRAIN_WORKERS: int = 4
+    TRAIN_RATE_LIMIT: float = 5.0  # reentrenamientos por segundo
+    TRAIN_MAX_ATTEMPTS: int = 3
+    TRAIN_RETRY_DELAY: float = 5.0
+    
+    # Caché de respuestas por cliente
+    ANSWER_CACHE_ENABLED: bool = False
+    ANSWER_CACHE_ROLES: list[str] = ["ventas"]
+    ANSWER_CACHE_DISABLED_CLIENTS: list[str] = []
+    ANSWER_CACHE_TTL: float = 3600.0
+    ANSWER_CACHE_MAX_ENTRIES: int = 500  # por cliente
+    ANSWER_CACHE_MAX_CLIENTS: int = 1000
+    
+    # Motor de respuesta por defecto ("assistants" o "chat")
+    DEFAULT_ENGINE: str = "assistants"
+    CHAT_ENGINE_MODEL: str = "gpt-4-turbo-preview"
+    CHAT_ENGINE_HISTORY_LIMIT: int = 20
+    
+    # Arranque: precalentar antes de aceptar peticiones
+    PREWARM_CONNECTIONS: bool = False  # abrir los pools de Supabase y OpenAI
+    PREWARM_ASSISTANT_REGISTRY: int = 0  # registros de assistants a cargar en caché
+    
+    # Trazas por petición
+    TRACE_SLOW_REQUEST_THRESHOLD: float = 2.0  # segundos
+    TRACE_PROFILE_SAMPLE_RATE: int = 0  # perfilar 1 de cada N peticiones (0 = desactivado)
+    TRACE_PROFILE_DIR: str = "profiles"
+    
+    # Compactación del historial de los threads
+    COMPACTION_POLICY: str = "none"  # none, last_n, token_budget o summary
+    COMPACTION_PROMPT_TOKENS: int = 8000  # prompt tokens de un run a partir de los que se compacta
+    COMPACTION_KEEP_MESSAGES: int = 10
+    COMPACTION_TOKEN_BUDGET: int = 2000
+    COMPACTION_SUMMARY_MODEL: str = "gpt-3.5-turbo"
+    COMPACTION_MAX_MESSAGES: int = 200  # mensajes leídos del thread al compactar
+    COMPACTION_CACHE_TTL: float = 3600.0
+    COMPACTION_CACHE_MAX_SIZE: int = 10000
+    COMPACTION_MOVED_TTL: float = 10.0  # segundos que se recuerda que un thread no se ha compactado
+    
+    # Control de admisión de runs de OpenAI (por worker)
+    ADMISSION_MAX_CONCURRENT_RUNS: int = 50  # 0 = sin límite
+    ADMISSION_MAX_RUNS_PER_CLIENT: int = 10
+    ADMISSION_MAX_QUEUE: int = 100
+    ADMISSION_QUEUE_TIMEOUT: float = 10.0
+    
+    # Reintentos y circuit breakers de Supabase y OpenAI
+    RETRY_MAX_ATTEMPTS: int = 3  # intentos totales por llamada; 1 = sin reintentos
+    RETRY_BASE_DELAY: float = 0.2
+    RETRY_MAX_DELAY: float = 2.0
+    BREAKER_FAILURE_THRESHOLD: int = 5  # fallos seguidos para abrir; 0 = desactivado
+    BREAKER_RECOVERY_TIMEOUT: float = 30.0
+    BREAKER_HALF_OPEN_MAX_CALLS: int = 1
     
     # Supabase
     SUPABASE_URL: str
     SUPABASE_KEY: str
+    SUPABASE_TIMEOUT: float = 10.0
+    SUPABASE_CONNECT_TIMEOUT: float = 5.0
+    SUPABASE_POOL_MAX_CONNECTIONS: int = 100
+    SUPABASE_POOL_MAX_KEEPALIVE: int = 20
+    SUPABASE_KEEPALIVE_EXPIRY: float = 30.0
+    SUPABASE_HTTP2: bool = True
+    SUPABASE_MAX_ROWS: int = 1000  # max-rows del proyecto: filas por página de las lecturas paginadas
     
     # Environment
     ENVIRONMENT: str = "development"
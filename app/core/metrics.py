@@ -0,0 +1,192 @@
+import time
+import bisect
+import functools
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from app.core.tracing import span
+
+# Buckets de latencia en segundos
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class _Metric:
+    kind = ""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+    
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    """Contador monótono por combinación de etiquetas."""
+    kind = "counter"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+    
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+    
+    def render(self) -> List[str]:
+        lines = super().render()
+        for labelvalues, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+class Gauge(_Metric):
+    """
+    Valor instantáneo. Con `collect` el valor se calcula al exportar, sin
+    coste en el camino crítico.
+    """
+    kind = "gauge"
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        collect: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._collect = collect
+    
+    def set(self, value: float, *labelvalues: str) -> None:
+        self._values[labelvalues] = value
+    
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+    
+    def dec(self, *labelvalues: str, amount: float = 1.0) -> None:
+        self.inc(*labelvalues, amount=-amount)
+    
+    @contextmanager
+    def track(self, *labelvalues: str) -> Iterator[None]:
+        """Suma 1 mientras dura el bloque (p. ej. operaciones en curso)."""
+        self.inc(*labelvalues)
+        try:
+            yield
+        finally:
+            self.dec(*labelvalues)
+    
+    def render(self) -> List[str]:
+        lines = super().render()
+        values = self._collect() if self._collect else self._values
+        for labelvalues, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+class Histogram(_Metric):
+    """Histograma con buckets fijos por combinación de etiquetas."""
+    kind = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [conteos por bucket..., suma, total]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+    
+    def observe(self, value: float, *labelvalues: str) -> None:
+        data = self._values.get(labelvalues)
+        if data is None:
+            data = self._values[labelvalues] = [0.0] * (len(self.buckets) + 2)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            data[index] += 1
+        data[-2] += value
+        data[-1] += 1
+    
+    def render(self) -> List[str]:
+        lines = super().render()
+        for labelvalues, data in self._values.items():
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {data[-1]}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {data[-2]}")
+            lines.append(f"{self.name}_count{labels} {data[-1]}")
+        return lines
+
+class Registry:
+    """Conjunto de métricas exportadas en formato de texto de Prometheus."""
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+    
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Registro global y métricas comunes
+registry = Registry()
+
+stage_latency = registry.register(Histogram(
+    "nnia_stage_duration_seconds",
+    "Duración de cada etapa (consultas a Supabase, llamadas a OpenAI...)",
+    ("component", "operation")
+))
+stage_errors = registry.register(Counter(
+    "nnia_stage_errors_total",
+    "Errores por etapa",
+    ("component", "operation")
+))
+runs_in_flight = registry.register(Gauge(
+    "nnia_runs_in_flight",
+    "Runs de OpenAI en curso",
+    ("mode",)
+))
+
+@contextmanager
+def track_stage(component: str, operation: str) -> Iterator[None]:
+    """
+    Mide la duración de una etapa, cuenta sus errores y la añade al árbol
+    de etapas de la petición en curso como `component.operation`.
+    """
+    started = time.perf_counter()
+    try:
+        with span(f"{component}.{operation}"):
+            yield
+    except BaseException:
+        stage_errors.inc(component, operation)
+        raise
+    finally:
+        stage_latency.observe(time.perf_counter() - started, component, operation)
+
+def instrumented(component: str) -> Callable:
+    """Decorador de corrutinas que registra su duración como etapa `component`."""
+    def decorator(func: Callable) -> Callable:
+        operation = func.__name__
+        
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with track_stage(component, operation):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
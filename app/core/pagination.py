@@ -0,0 +1,42 @@
+import json
+import base64
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Posición de keyset: (created_at, id) de la última fila entregada
+Cursor = Tuple[str, str]
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Codifica la posición de una fila como cursor opaco."""
+    payload = json.dumps([row["created_at"], row["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+def decode_cursor(cursor: str) -> Cursor:
+    """
+    Decodifica un cursor generado por encode_cursor.
+    
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Cursor inválido")
+    return str(created_at), str(row_id)
+
+async def iter_pages(
+    fetch_page: Callable[[str, int, Optional[Cursor]], Awaitable[List[Dict[str, Any]]]],
+    client_id: str,
+    page_size: int,
+    after: Optional[Cursor] = None
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Recorre todas las filas de un cliente página a página, pidiendo la
+    siguiente solo cuando se consume la anterior.
+    """
+    while True:
+        page = await fetch_page(client_id, page_size, after)
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after = (page[-1]["created_at"], page[-1]["id"])
@@ -0,0 +1,281 @@
+import time
+import random
+import asyncio
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+import httpx
+from app.core.config import get_settings
+from app.core.metrics import Counter, Gauge, registry
+
+logger = logging.getLogger(__name__)
+
+# Estados del circuit breaker y su valor en la métrica nnia_circuit_state
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Métodos que se pueden repetir sin efectos duplicados
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Respuestas que indican un fallo pasajero del servicio
+TRANSIENT_STATUS = frozenset({500, 502, 503, 504})
+# Errores en los que la petición no llegó a enviarse: se reintentan con cualquier método
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+upstream_retries = registry.register(Counter(
+    "nnia_upstream_retries_total",
+    "Reintentos de llamadas a servicios externos",
+    ("upstream", "reason")
+))
+circuit_rejections = registry.register(Counter(
+    "nnia_circuit_rejected_total",
+    "Llamadas rechazadas sin enviarse por tener el circuito abierto",
+    ("upstream",)
+))
+circuit_transitions = registry.register(Counter(
+    "nnia_circuit_transitions_total",
+    "Cambios de estado de los circuit breakers",
+    ("upstream", "state")
+))
+
+class CircuitOpenError(Exception):
+    """El servicio externo está marcado como caído; la llamada no se envió."""
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"Circuito de {upstream} abierto")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Circuit breaker de un servicio externo.
+    
+    Tras `failure_threshold` fallos seguidos se abre y las llamadas fallan al
+    instante con CircuitOpenError. Pasados `recovery_timeout` segundos pasa a
+    semiabierto y deja pasar como mucho `half_open_max_calls` llamadas de
+    prueba: si una sale bien se cierra y si falla se vuelve a abrir.
+    """
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_started = 0.0
+        self._totals = {"opened": 0, "rejected": 0}
+    
+    @property
+    def enabled(self) -> bool:
+        return self.failure_threshold > 0
+    
+    def retry_after(self) -> float:
+        """Segundos hasta la próxima llamada de prueba."""
+        if self.state != OPEN:
+            return 0.0
+        return max(self._opened_at + self.recovery_timeout - time.monotonic(), 0.0)
+    
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        logger.warning(f"Circuito de {self.name}: {self.state} -> {state}")
+        self.state = state
+        circuit_transitions.inc(self.name, state)
+    
+    def before_call(self) -> None:
+        """
+        Comprueba si la llamada puede enviarse.
+        
+        Raises:
+            CircuitOpenError: Si el circuito está abierto o ya hay pruebas en curso
+        """
+        if not self.enabled or self.state == CLOSED:
+            return
+        now = time.monotonic()
+        # Una prueba que no terminó (p. ej. cancelada) no bloquea el circuito indefinidamente
+        if (self.state == OPEN and self.retry_after() == 0) or (
+            self.state == HALF_OPEN and now - self._probe_started >= self.recovery_timeout
+        ):
+            self._transition(HALF_OPEN)
+            self._probes = 0
+            self._probe_started = now
+        if self.state == HALF_OPEN and self._probes < self.half_open_max_calls:
+            self._probes += 1
+            return
+        self._totals["rejected"] += 1
+        circuit_rejections.inc(self.name)
+        raise CircuitOpenError(self.name, self.retry_after() or self.recovery_timeout)
+    
+    def record_success(self) -> None:
+        self._failures = 0
+        if self.state == HALF_OPEN:
+            self._transition(CLOSED)
+    
+    def record_failure(self) -> None:
+        if not self.enabled:
+            return
+        self._failures += 1
+        if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self._totals["opened"] += 1
+            self._transition(OPEN)
+            self._opened_at = time.monotonic()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._totals,
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "retry_after": round(self.retry_after(), 1)
+        }
+
+class RetryPolicy:
+    """
+    Reintentos con backoff exponencial y jitter completo: antes del intento
+    n+1 se espera un tiempo aleatorio entre 0 y min(max_delay, base_delay * 2^n).
+    """
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0):
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+    
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Espera antes del siguiente intento; respeta Retry-After hasta max_delay."""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """
+    Transporte que aplica a un servicio externo su circuit breaker y la
+    política de reintentos.
+    
+    Se reintentan los errores de conexión y los 429 con cualquier método (la
+    petición no se procesó) y los timeouts de lectura, errores de protocolo
+    y respuestas 5xx solo con métodos idempotentes. Cuentan como fallos del
+    circuito los errores de red y las respuestas 5xx.
+    """
+    def __init__(self, transport: httpx.AsyncBaseTransport, breaker: CircuitBreaker, policy: RetryPolicy):
+        self._transport = transport
+        self.breaker = breaker
+        self.policy = policy
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        idempotent = request.method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            last_attempt = attempt + 1 >= self.policy.max_attempts
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                if last_attempt or not (idempotent or isinstance(e, _NOT_SENT_ERRORS)):
+                    raise
+                reason, retry_after = type(e).__name__, None
+            else:
+                if response.status_code in TRANSIENT_STATUS:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                retryable = response.status_code == 429 or (idempotent and response.status_code in TRANSIENT_STATUS)
+                if last_attempt or not retryable:
+                    return response
+                reason, retry_after = str(response.status_code), _retry_after(response)
+                await response.aclose()
+            
+            upstream_retries.inc(self.breaker.name, reason)
+            delay = self.policy.delay(attempt, retry_after)
+            logger.info(f"Reintentando {request.method} {request.url.path} en {self.breaker.name} ({reason}) en {delay:.2f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+    
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+def is_transient(exc: BaseException) -> bool:
+    """
+    Indica si el error (o alguno de los que lo causaron) es una caída
+    pasajera de un servicio externo y no un fallo de la petición.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, (CircuitOpenError, httpx.TransportError)):
+            return True
+        status_code = getattr(exc, "status_code", None)
+        if isinstance(exc, httpx.HTTPStatusError):
+            status_code = exc.response.status_code
+        if status_code == 429 or status_code in TRANSIENT_STATUS:
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+def retry_after_for(exc: BaseException, default: int = 1) -> int:
+    """Retry-After sugerido al cliente para un error pasajero."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, CircuitOpenError):
+            return max(int(exc.retry_after + 0.5), default)
+        if isinstance(exc, httpx.HTTPStatusError):
+            retry_after = _retry_after(exc.response)
+            if retry_after is not None:
+                return max(int(retry_after + 0.5), default)
+        exc = exc.__cause__ or exc.__context__
+    return default
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Circuit breaker compartido de un servicio externo, creado en el primer uso."""
+    if name not in _breakers:
+        settings = get_settings()
+        _breakers[name] = CircuitBreaker(
+            name,
+            failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+            recovery_timeout=settings.BREAKER_RECOVERY_TIMEOUT,
+            half_open_max_calls=settings.BREAKER_HALF_OPEN_MAX_CALLS
+        )
+    return _breakers[name]
+
+def resilient_transport(name: str, transport: httpx.AsyncBaseTransport) -> ResilientTransport:
+    """Envuelve el transporte de un servicio externo con su breaker y la política configurada."""
+    settings = get_settings()
+    policy = RetryPolicy(
+        max_attempts=settings.RETRY_MAX_ATTEMPTS,
+        base_delay=settings.RETRY_BASE_DELAY,
+        max_delay=settings.RETRY_MAX_DELAY
+    )
+    return ResilientTransport(transport, get_breaker(name), policy)
+
+def breaker_stats() -> Dict[str, Any]:
+    return {name: breaker.stats() for name, breaker in _breakers.items()}
+
+registry.register(Gauge(
+    "nnia_circuit_state",
+    "Estado del circuit breaker de cada servicio externo (0 cerrado, 1 semiabierto, 2 abierto)",
+    ("upstream",),
+    collect=lambda: {(name,): _STATE_VALUES[breaker.state] for name, breaker in _breakers.items()}
+))
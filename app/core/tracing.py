@@ -0,0 +1,157 @@
+import os
+import re
+import json
+import time
+import cProfile
+import logging
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Span:
+    """Etapa de una petición con sus sub-etapas."""
+    name: str
+    start: float = field(default_factory=time.perf_counter)
+    duration: Optional[float] = None
+    children: List["Span"] = field(default_factory=list)
+    
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self.start
+    
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        data = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": round((self.duration or 0.0) * 1000, 2)
+        }
+        if self.children:
+            data["children"] = [child.to_dict(origin) for child in self.children]
+        return data
+
+# Span activo en el contexto actual; None fuera de una petición
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Registra el bloque como sub-etapa del span activo.
+    
+    Fuera de una petición trazada no hace nada.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield
+        return
+    child = Span(name)
+    parent.children.append(child)
+    token = _current.set(child)
+    try:
+        yield
+    finally:
+        child.finish()
+        _current.reset(token)
+
+def _totals(root: Span) -> Dict[str, List[float]]:
+    """Duración total y número de veces de cada etapa del árbol."""
+    totals: Dict[str, List[float]] = {}
+    pending = list(root.children)
+    while pending:
+        node = pending.pop()
+        entry = totals.setdefault(node.name, [0.0, 0])
+        entry[0] += node.duration or 0.0
+        entry[1] += 1
+        pending.extend(node.children)
+    return totals
+
+def server_timing(root: Span) -> str:
+    """Cabecera Server-Timing con el total y la duración agregada por etapa."""
+    metrics = [f"total;dur={(time.perf_counter() - root.start) * 1000:.1f}"]
+    for name, (duration, count) in _totals(root).items():
+        token = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+        metrics.append(f'{token};dur={duration * 1000:.1f};desc="x{count}"')
+    return ", ".join(metrics)
+
+class TimingMiddleware:
+    """
+    Middleware ASGI que construye el árbol de etapas de cada petición.
+    
+    - Añade la cabecera Server-Timing con las etapas completadas antes de
+      enviar la respuesta.
+    - Escribe una línea de log JSON con el árbol completo si la petición
+      supera TRACE_SLOW_REQUEST_THRESHOLD.
+    - Con TRACE_PROFILE_SAMPLE_RATE = N perfila una de cada N peticiones con
+      cProfile y guarda el volcado en TRACE_PROFILE_DIR. El perfilador mide
+      el hilo del event loop, así que incluye el trabajo de otras peticiones
+      concurrentes; sólo se perfila una petición a la vez.
+    """
+    def __init__(self, app):
+        self.app = app
+        settings = get_settings()
+        self.slow_threshold = settings.TRACE_SLOW_REQUEST_THRESHOLD
+        self.sample_rate = settings.TRACE_PROFILE_SAMPLE_RATE
+        self.profile_dir = settings.TRACE_PROFILE_DIR
+        self._requests = itertools.count(1)
+        self._profiling = False
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        root = Span(f"{scope['method']} {scope['path']}")
+        token = _current.set(root)
+        status = 500
+        profiler = self._start_profile()
+        
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(root).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            root.finish()
+            _current.reset(token)
+            if profiler:
+                self._stop_profile(profiler, scope["path"])
+            if root.duration >= self.slow_threshold:
+                logger.warning(json.dumps({
+                    "event": "slow_request",
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration_ms": round(root.duration * 1000, 2),
+                    "spans": [child.to_dict(root.start) for child in root.children]
+                }))
+    
+    def _start_profile(self) -> Optional[cProfile.Profile]:
+        if not self.sample_rate or self._profiling or next(self._requests) % self.sample_rate:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Ya hay otro perfilador activo en el proceso
+            return None
+        self._profiling = True
+        return profiler
+    
+    def _stop_profile(self, profiler: cProfile.Profile, path: str) -> None:
+        profiler.disable()
+        self._profiling = False
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+        filename = os.path.join(self.profile_dir, f"{int(time.time() * 1000)}-{name}.prof")
+        profiler.dump_stats(filename)
+        logger.info(f"Perfil guardado en {filename}")
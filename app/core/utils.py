@@ -0,0 +1,16 @@
+import json
+from typing import Any
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Formatea un evento Server-Sent Events.
+    
+    Args:
+        event: Nombre del evento
+        data: Contenido serializable a JSON
+        
+    Returns:
+        str: Evento listo para enviarse al cliente
+    """
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
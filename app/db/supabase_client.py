@@ -1,23 +1,66 @@
-from supabase import create_client, Client
+import importlib.util
+from functools import lru_cache
+import httpx
+from postgrest import AsyncPostgrestClient
 from app.core.config import get_settings
+from app.core.resilience import TRANSIENT_STATUS, resilient_transport
 
-class SupabaseClient:
-    _instance = None
-    _client: Client = None
+async def _raise_for_transient_status(response: httpx.Response) -> None:
+    """
+    postgrest convierte las respuestas de error en APIError con el código de
+    PostgREST y sin el estado HTTP. Las caídas pasajeras (429 y 5xx) se
+    lanzan como HTTPStatusError para que is_transient las reconozca.
+    """
+    if response.status_code == 429 or response.status_code in TRANSIENT_STATUS:
+        response.raise_for_status()
 
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(SupabaseClient, cls).__new__(cls)
-            settings = get_settings()
-            cls._client = create_client(
-                settings.supabase_url,
-                settings.supabase_key
-            )
-        return cls._instance
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """
+    Cliente asíncrono de PostgREST sobre un pool de conexiones httpx
+    configurable (keep-alive, HTTP/2 si está disponible y timeouts), con
+    reintentos y circuit breaker. Las respuestas 429 y 5xx que quedan tras
+    los reintentos se lanzan como httpx.HTTPStatusError.
+    """
+    def create_session(self, base_url, headers, *args, **kwargs) -> httpx.AsyncClient:
+        settings = get_settings()
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=settings.SUPABASE_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.SUPABASE_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.SUPABASE_KEEPALIVE_EXPIRY
+            ),
+            # HTTP/2 requiere el paquete h2 (httpx[http2])
+            http2=settings.SUPABASE_HTTP2 and importlib.util.find_spec("h2") is not None
+        )
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=httpx.Timeout(
+                settings.SUPABASE_TIMEOUT,
+                connect=settings.SUPABASE_CONNECT_TIMEOUT
+            ),
+            transport=resilient_transport("supabase", transport),
+            event_hooks={"response": [_raise_for_transient_status]}
+        )
 
-    @property
-    def client(self) -> Client:
-        return self._client
+@lru_cache()
+def get_supabase_client() -> PooledPostgrestClient:
+    """
+    Cliente de Supabase compartido por todo el proceso.
+    """
+    settings = get_settings()
+    return PooledPostgrestClient(
+        f"{settings.SUPABASE_URL.rstrip('/')}/rest/v1",
+        headers={
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "apikey": settings.SUPABASE_KEY,
+            "Authorization": f"Bearer {settings.SUPABASE_KEY}"
+        }
+    )
 
-# Instancia global para usar en toda la aplicación
-supabase = SupabaseClient().client 
\ No newline at end of file
+async def close_supabase_client() -> None:
+    """Cierra el pool de conexiones si llegó a crearse."""
+    if get_supabase_client.cache_info().currsize:
+        await get_supabase_client().aclose()
+        get_supabase_client.cache_clear()
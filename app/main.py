@@ -1,8 +1,24 @@
+import time
+_import_started = time.perf_counter()
+
+import asyncio
 import logging
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.core.config import get_settings
-from app.api.routes import chat, data
+from app.core.tracing import TimingMiddleware
+from app.api.routes import chat, data, stats, train, widget_chat
+from app.db.supabase_client import close_supabase_client
+from app.services.admission import AdmissionRejected
+from app.services.language_service import language_service
+from app.services.message_writer import message_writer
+from app.services.openai_client import close_openai_client, get_openai_client
+from app.services.assistant_registry import assistant_registry
+from app.services.run_waiter import run_waiter
+from app.services.supabase_service import supabase_service
+from app.services.train_jobs import train_jobs
 
 # Configuración de logging
 logging.basicConfig(
@@ -11,13 +27,63 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def _prewarm(name: str, step) -> None:
+    started = time.perf_counter()
+    try:
+        await step
+        logger.info(f"Precalentado {name} en {time.perf_counter() - started:.3f}s")
+    except Exception as e:
+        logger.warning(f"No se pudo precalentar {name}: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Ciclo de vida de la aplicación.
+    
+    Los servicios no abren conexiones al importarse; aquí se precalientan
+    opcionalmente (pools de conexiones, perfiles de idioma, registro de
+    assistants) antes de aceptar peticiones, se arrancan el write-behind de
+    mensajes y los workers de reentrenamiento y, al apagar, se detienen y se
+    liberan los pools de conexiones.
+    """
+    started = time.perf_counter()
+    steps = []
+    if settings.LANGUAGE_PRELOAD:
+        steps.append(_prewarm("perfiles de idioma", language_service.preload()))
+    if settings.PREWARM_CONNECTIONS:
+        steps.append(_prewarm("pool de Supabase", supabase_service.ping()))
+        steps.append(_prewarm("pool de OpenAI", get_openai_client().models.list()))
+    if settings.PREWARM_ASSISTANT_REGISTRY:
+        steps.append(_prewarm("registro de assistants", assistant_registry.preload(settings.PREWARM_ASSISTANT_REGISTRY)))
+    await asyncio.gather(*steps)
+    if settings.MESSAGE_WRITE_BEHIND:
+        await message_writer.start()
+    train_jobs.start()
+    
+    app.state.startup = {
+        "import_s": round(IMPORT_SECONDS, 3),
+        "startup_s": round(time.perf_counter() - started, 3)
+    }
+    logger.info(
+        f"Listo: importación {app.state.startup['import_s']}s, "
+        f"arranque {app.state.startup['startup_s']}s"
+    )
+    yield
+    await train_jobs.stop()
+    await message_writer.stop()
+    await run_waiter.close()
+    language_service.close()
+    await close_supabase_client()
+    await close_openai_client()
+
 # Configuración de la aplicación
 settings = get_settings()
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
     description="Backend para el sistema NNIA - Asistente de ventas y soporte",
-    debug=settings.DEBUG
+    debug=settings.DEBUG,
+    lifespan=lifespan
 )
 
 # Configuración de CORS
@@ -27,11 +93,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After"],
 )
 
+# Desglose de tiempos por petición (Server-Timing, log de peticiones lentas)
+app.add_middleware(TimingMiddleware)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected) -> JSONResponse:
+    """
+    Respuesta cuando el control de admisión no deja pasar la petición:
+    503 (worker saturado) o 429 (límite del cliente), con Retry-After.
+    """
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Incluir routers
 app.include_router(chat.router, prefix=settings.API_V1_STR)
+app.include_router(widget_chat.router, prefix=settings.API_V1_STR)
+app.include_router(train.router, prefix=settings.API_V1_STR)
 app.include_router(data.router, prefix=settings.API_V1_STR)
+app.include_router(stats.router, prefix=settings.API_V1_STR)
+app.include_router(stats.metrics_router)
+
+# Tiempo de importación de la aplicación y sus dependencias
+IMPORT_SECONDS = time.perf_counter() - _import_started
 
 @app.get("/")
 async def root():
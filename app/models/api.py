@@ -1,10 +1,11 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 
 class MessageRequest(BaseModel):
     client_id: str = Field(..., description="ID del cliente")
     role: str = Field(..., description="Rol de la conversación (ventas/soporte)")
     message: str = Field(..., description="Mensaje del usuario")
+    engine: Optional[Literal["assistants", "chat"]] = Field(None, description="Motor de respuesta (assistants/chat); por defecto el del cliente")
 
 class MessageResponse(BaseModel):
     thread_id: str = Field(..., description="ID del thread de la conversación")
@@ -16,6 +17,32 @@ class TrainRequest(BaseModel):
 class TrainResponse(BaseModel):
     success: bool = Field(..., description="Indica si el entrenamiento fue exitoso")
     message: str = Field(..., description="Mensaje descriptivo del resultado")
+    status: Optional[str] = Field(None, description="Resultado: unchanged, updated o created")
+
+class BulkTrainRequest(BaseModel):
+    client_ids: List[str] = Field(..., min_length=1, description="IDs de los clientes a reentrenar")
+
+class TrainJob(BaseModel):
+    id: str = Field(..., description="ID del job")
+    client_id: str = Field(..., description="ID del cliente")
+    batch_id: Optional[str] = Field(None, description="ID del lote, si se encoló en bloque")
+    status: str = Field(..., description="Estado: queued, running, succeeded o failed")
+    attempts: int = Field(..., description="Intentos realizados")
+    result: Optional[TrainResponse] = Field(None, description="Resultado del reentrenamiento")
+    error: Optional[str] = Field(None, description="Último error")
+    created_at: float = Field(..., description="Fecha de creación (epoch)")
+    updated_at: float = Field(..., description="Última actualización (epoch)")
+
+class BulkTrainResponse(BaseModel):
+    batch_id: str = Field(..., description="ID del lote")
+    job_ids: List[str] = Field(..., description="IDs de los jobs encolados")
+
+class TrainBatchStatus(BaseModel):
+    batch_id: str = Field(..., description="ID del lote")
+    total: int = Field(..., description="Número de jobs del lote")
+    counts: Dict[str, int] = Field(..., description="Jobs por estado")
+    done: bool = Field(..., description="Indica si todos los jobs terminaron")
+    failed_client_ids: List[str] = Field(default_factory=list, description="Clientes cuyo reentrenamiento falló")
 
 class Lead(BaseModel):
     id: str = Field(..., description="ID del lead")
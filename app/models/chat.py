@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Literal
 
 class Message(BaseModel):
     role: str = Field(..., description="Rol del mensaje (user, assistant, system)")
@@ -10,6 +10,7 @@ class ChatRequest(BaseModel):
     widget_id: str = Field(..., description="ID del widget")
     user_id: Optional[str] = Field(None, description="ID del usuario (opcional)")
     language: Optional[str] = Field("es", description="Idioma preferido del usuario")
+    engine: Optional[Literal["assistants", "chat"]] = Field(None, description="Motor de respuesta (assistants/chat)")
 
 class ChatResponse(BaseModel):
     response: str = Field(..., description="Respuesta de NNIA")
@@ -0,0 +1,216 @@
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict
+from app.core.config import get_settings
+from app.core.metrics import Counter, Gauge, Histogram, registry
+
+logger = logging.getLogger(__name__)
+
+admission_wait_seconds = registry.register(Histogram(
+    "nnia_admission_wait_seconds",
+    "Tiempo de espera en la cola de admisión de runs",
+    ("outcome",)
+))
+admission_rejections = registry.register(Counter(
+    "nnia_admission_rejected_total",
+    "Peticiones rechazadas por el control de admisión",
+    ("reason",)
+))
+
+class AdmissionRejected(Exception):
+    """La petición no se admitió: cola llena, cupo del cliente agotado o espera agotada."""
+    def __init__(self, reason: str, status_code: int, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+    
+    @property
+    def detail(self) -> str:
+        if self.reason == "tenant_limit":
+            return "Demasiadas peticiones simultáneas para este cliente"
+        return "Servicio saturado, inténtalo de nuevo en unos segundos"
+
+@dataclass
+class _Waiter:
+    tenant: str
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+class AdmissionController:
+    """
+    Limita los runs simultáneos del worker: como mucho `max_concurrent` en
+    total y `per_tenant` por cliente.
+    
+    Las peticiones que no caben esperan en una cola FIFO de hasta
+    `max_queue` entradas durante `queue_timeout` segundos; un cliente no
+    puede tener en cola más de `per_tenant` peticiones. Al liberar un hueco
+    se admite la primera petición en cola cuyo cliente esté por debajo de su
+    límite, de modo que un cliente saturado no bloquea a los demás.
+    
+    Si no se puede admitir se lanza AdmissionRejected con el código (503 si
+    el worker está saturado, 429 si lo está el cliente) y un Retry-After
+    estimado a partir de la duración media de los runs.
+    """
+    def __init__(
+        self,
+        max_concurrent: int = 50,
+        per_tenant: int = 10,
+        max_queue: int = 100,
+        queue_timeout: float = 10.0,
+        min_retry_after: int = 1
+    ):
+        self.max_concurrent = max_concurrent
+        self.per_tenant = per_tenant
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.min_retry_after = min_retry_after
+        self._active = 0
+        self._tenant_active: Dict[str, int] = {}
+        self._tenant_queued: Dict[str, int] = {}
+        self._queue: Deque[_Waiter] = deque()
+        # Media móvil de la duración de los runs admitidos
+        self._avg_hold = 5.0
+        self._totals = {"admitted": 0, "queued": 0, "rejected": 0, "timeouts": 0}
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrent > 0
+    
+    def _can_admit(self, tenant: str) -> bool:
+        return (
+            self._active < self.max_concurrent
+            and self._tenant_active.get(tenant, 0) < self.per_tenant
+        )
+    
+    def _admit(self, tenant: str) -> None:
+        self._active += 1
+        self._tenant_active[tenant] = self._tenant_active.get(tenant, 0) + 1
+        self._totals["admitted"] += 1
+    
+    def _retry_after(self) -> int:
+        """Segundos estimados hasta que se vacíe la cola actual."""
+        waves = len(self._queue) / self.max_concurrent + 1
+        return max(self.min_retry_after, math.ceil(self._avg_hold * waves))
+    
+    def _reject(self, reason: str, status_code: int) -> AdmissionRejected:
+        self._totals["rejected"] += 1
+        admission_rejections.inc(reason)
+        return AdmissionRejected(reason, status_code, self._retry_after())
+    
+    async def acquire(self, tenant: str) -> float:
+        """
+        Espera un hueco para ejecutar un run del cliente.
+        
+        Returns:
+            float: Momento de admisión, que se pasa a release()
+        
+        Raises:
+            AdmissionRejected: Si la cola está llena o se agota la espera
+        """
+        if not self.enabled:
+            return time.monotonic()
+        # Con hueco libre, lo que queda en cola está bloqueado por el límite de su cliente
+        if self._can_admit(tenant) and not self._tenant_queued.get(tenant):
+            self._admit(tenant)
+            admission_wait_seconds.observe(0.0, "admitted")
+            return time.monotonic()
+        
+        if len(self._queue) >= self.max_queue:
+            raise self._reject("queue_full", 503)
+        if self._tenant_queued.get(tenant, 0) >= self.per_tenant:
+            raise self._reject("tenant_limit", 429)
+        
+        waiter = _Waiter(tenant, asyncio.get_running_loop().create_future())
+        self._queue.append(waiter)
+        self._tenant_queued[tenant] = self._tenant_queued.get(tenant, 0) + 1
+        self._totals["queued"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Se admitió justo al agotarse la espera: devolver el hueco
+                self.release(tenant, time.monotonic())
+            else:
+                waiter.future.cancel()
+                self._queue.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._totals["timeouts"] += 1
+            admission_wait_seconds.observe(time.monotonic() - waiter.enqueued_at, "timeout")
+            raise self._reject("timeout", 503)
+        finally:
+            self._dequeued(tenant)
+        
+        admission_wait_seconds.observe(time.monotonic() - waiter.enqueued_at, "admitted")
+        return time.monotonic()
+    
+    def _dequeued(self, tenant: str) -> None:
+        remaining = self._tenant_queued.get(tenant, 0) - 1
+        if remaining > 0:
+            self._tenant_queued[tenant] = remaining
+        else:
+            self._tenant_queued.pop(tenant, None)
+    
+    def release(self, tenant: str, admitted_at: float) -> None:
+        """Libera el hueco y admite a los siguientes en cola que quepan."""
+        if not self.enabled:
+            return
+        self._avg_hold = 0.9 * self._avg_hold + 0.1 * (time.monotonic() - admitted_at)
+        self._active -= 1
+        remaining = self._tenant_active.get(tenant, 0) - 1
+        if remaining > 0:
+            self._tenant_active[tenant] = remaining
+        else:
+            self._tenant_active.pop(tenant, None)
+        
+        for waiter in list(self._queue):
+            if self._active >= self.max_concurrent:
+                break
+            if self._can_admit(waiter.tenant):
+                self._queue.remove(waiter)
+                self._admit(waiter.tenant)
+                waiter.future.set_result(None)
+    
+    @asynccontextmanager
+    async def slot(self, tenant: str) -> AsyncIterator[None]:
+        """Mantiene un hueco durante el bloque."""
+        admitted_at = await self.acquire(tenant)
+        try:
+            yield
+        finally:
+            self.release(tenant, admitted_at)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._totals,
+            "active": self._active,
+            "queue_depth": len(self._queue),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "avg_run_seconds": round(self._avg_hold, 3)
+        }
+
+# Instancia global para usar en toda la aplicación
+admission = AdmissionController(
+    max_concurrent=get_settings().ADMISSION_MAX_CONCURRENT_RUNS,
+    per_tenant=get_settings().ADMISSION_MAX_RUNS_PER_CLIENT,
+    max_queue=get_settings().ADMISSION_MAX_QUEUE,
+    queue_timeout=get_settings().ADMISSION_QUEUE_TIMEOUT
+)
+
+registry.register(Gauge(
+    "nnia_admission_queue_depth",
+    "Peticiones esperando hueco para un run",
+    collect=lambda: {(): admission.stats()["queue_depth"]}
+))
+registry.register(Gauge(
+    "nnia_admission_active_runs",
+    "Runs admitidos en curso",
+    collect=lambda: {(): admission.stats()["active"]}
+))
@@ -0,0 +1,121 @@
+import logging
+from typing import Any, Dict, List, Optional
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+from app.services.language_service import normalize_text
+
+logger = logging.getLogger(__name__)
+
+class AnswerCache:
+    """
+    Caché de respuestas por cliente para preguntas repetidas ("¿precio?",
+    "¿horario?"), indexada por el rol, el texto normalizado y el idioma.
+    
+    Solo se usa en los roles permitidos y puede desactivarse por cliente
+    con ANSWER_CACHE_DISABLED_CLIENTS o con `answer_cache_enabled = false`
+    en business_details. Cada respuesta guarda la huella de las instrucciones
+    con las que se generó y deja de servirse cuando cambian, aunque el
+    reentrenamiento lo haya hecho otro worker; /train además la invalida.
+    """
+    def __init__(
+        self,
+        enabled: bool = False,
+        roles: Optional[List[str]] = None,
+        disabled_clients: Optional[List[str]] = None,
+        ttl: float = 3600.0,
+        max_entries: int = 500,
+        max_clients: int = 1000
+    ):
+        self.enabled = enabled
+        self.roles = set(roles or [])
+        self.disabled_clients = set(disabled_clients or [])
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clients = TTLCache(maxsize=max_clients, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self.invalidations = 0
+        self.stale = 0
+    
+    def applies_to(self, client: Dict[str, Any], role: str) -> bool:
+        """Indica si la caché se usa para este cliente y rol."""
+        return (
+            self.enabled
+            and role in self.roles
+            and client.get("id") not in self.disabled_clients
+            and client.get("answer_cache_enabled", True) is not False
+        )
+    
+    def get(
+        self,
+        client_id: str,
+        role: str,
+        message: str,
+        language: str,
+        instructions_hash: Optional[str]
+    ) -> Optional[str]:
+        """Devuelve la respuesta cacheada, si existe y se generó con las instrucciones actuales."""
+        entries = self._clients.get(client_id)
+        key = (role, normalize_text(message), language)
+        entry = entries.get(key) if entries else None
+        if entry is not None and entry["instructions_hash"] != instructions_hash:
+            entries.pop(key)
+            self.stale += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.tokens_saved += entry["tokens"]
+        return entry["response"]
+    
+    def set(
+        self,
+        client_id: str,
+        role: str,
+        message: str,
+        language: str,
+        response: str,
+        instructions_hash: Optional[str],
+        tokens: int = 0
+    ) -> None:
+        """Guarda una respuesta junto con las instrucciones y los tokens con que se generó."""
+        entries = self._clients.get(client_id)
+        if entries is None:
+            entries = TTLCache(maxsize=self.max_entries, ttl=self.ttl)
+        # Cada escritura renueva el cliente: las entradas caducan por separado
+        self._clients.set(client_id, entries)
+        entries.set((role, normalize_text(message), language), {
+            "response": response,
+            "tokens": tokens,
+            "instructions_hash": instructions_hash
+        })
+    
+    def invalidate(self, client_id: str) -> None:
+        """Descarta todas las respuestas de un cliente."""
+        if self._clients.pop(client_id) is not None:
+            self.invalidations += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "clients": len(self._clients),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "tokens_saved": self.tokens_saved,
+            "invalidations": self.invalidations,
+            "stale": self.stale
+        }
+
+# Instancia global para usar en toda la aplicación
+answer_cache = AnswerCache(
+    enabled=get_settings().ANSWER_CACHE_ENABLED,
+    roles=get_settings().ANSWER_CACHE_ROLES,
+    disabled_clients=get_settings().ANSWER_CACHE_DISABLED_CLIENTS,
+    ttl=get_settings().ANSWER_CACHE_TTL,
+    max_entries=get_settings().ANSWER_CACHE_MAX_ENTRIES,
+    max_clients=get_settings().ANSWER_CACHE_MAX_CLIENTS
+)
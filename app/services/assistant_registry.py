@@ -0,0 +1,121 @@
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+from app.services.supabase_service import supabase_service
+
+logger = logging.getLogger(__name__)
+
+def hash_instructions(instructions: str) -> str:
+    """Huella de las instrucciones de un assistant."""
+    return hashlib.sha256(instructions.encode("utf-8")).hexdigest()
+
+class AssistantRegistry:
+    """
+    Registro client_id -> assistant_id compartido por todos los workers.
+    
+    Se persiste en la tabla `assistant_registry` (client_id único,
+    assistant_id, instructions_hash, version, updated_at; ver
+    migrations/001_assistant_registry.sql) y se cachea en
+    memoria con un LRU con TTL, de modo que un reentrenamiento hecho por otro
+    worker se ve como mucho tras ASSISTANT_REGISTRY_TTL segundos.
+    """
+    def __init__(self, ttl: float = 300.0, maxsize: int = 1000):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+    
+    async def get(self, client_id: str, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """Obtiene el registro del cliente, de la caché o de Supabase."""
+        if not refresh:
+            record = self.cache.get(client_id)
+            if record:
+                return record
+        
+        record = await supabase_service.get_assistant_record(client_id)
+        if record:
+            self.cache.set(client_id, record)
+        else:
+            self.cache.pop(client_id)
+        return record
+    
+    async def register(self, client_id: str, assistant_id: str, instructions_hash: str) -> Dict[str, Any]:
+        """
+        Registra un assistant nuevo si el cliente no tenía ninguno.
+        
+        Returns:
+            Dict[str, Any]: El registro vigente. Si otro worker registró uno
+            antes, se devuelve ese y el llamador debe descartar el suyo.
+        
+        Raises:
+            Exception: Si no se pudo persistir ni leer el registro; el
+            llamador debe descartar su assistant
+        """
+        data = {
+            "client_id": client_id,
+            "assistant_id": assistant_id,
+            "instructions_hash": instructions_hash,
+            "version": 1,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }
+        record = await supabase_service.insert_assistant_record(data)
+        if not record:
+            record = await supabase_service.get_assistant_record(client_id)
+        if not record:
+            raise Exception(f"No se pudo registrar el assistant de {client_id}")
+        
+        self.cache.set(client_id, record)
+        return record
+    
+    async def replace(
+        self,
+        client_id: str,
+        assistant_id: str,
+        instructions_hash: str,
+        expected_version: int
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Sustituye el assistant del cliente de forma atómica (compare-and-set
+        sobre `version`).
+        
+        Returns:
+            Optional[Dict[str, Any]]: El registro nuevo, o None si otro worker
+            lo modificó antes.
+        """
+        data = {
+            "assistant_id": assistant_id,
+            "instructions_hash": instructions_hash,
+            "version": expected_version + 1,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }
+        record = await supabase_service.update_assistant_record(client_id, expected_version, data)
+        if record:
+            self.cache.set(client_id, record)
+        else:
+            self.cache.pop(client_id)
+        return record
+    
+    async def preload(self, limit: int) -> int:
+        """
+        Carga en caché los `limit` registros más recientes para que las
+        primeras peticiones no vayan a Supabase.
+        
+        Returns:
+            int: Registros cargados
+        """
+        records = await supabase_service.get_assistant_records(limit)
+        for record in records:
+            self.cache.set(record["client_id"], record)
+        return len(records)
+    
+    def invalidate(self, client_id: str) -> None:
+        self.cache.pop(client_id)
+    
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+# Instancia global para usar en toda la aplicación
+assistant_registry = AssistantRegistry(
+    ttl=get_settings().ASSISTANT_REGISTRY_TTL,
+    maxsize=get_settings().ASSISTANT_REGISTRY_MAX_SIZE
+)
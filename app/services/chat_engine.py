@@ -0,0 +1,166 @@
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+from openai import AsyncOpenAI
+from app.core.config import get_settings
+from app.services.openai_assistant import openai_assistant
+from app.services.openai_client import get_openai_client
+from app.services.message_writer import message_writer
+from app.services.supabase_service import supabase_service
+
+logger = logging.getLogger(__name__)
+
+# Motores disponibles para responder mensajes
+ENGINE_ASSISTANTS = "assistants"
+ENGINE_CHAT = "chat"
+
+class ChatCompletionsEngine:
+    """
+    Motor alternativo a los runs de Assistants: responde con una sola
+    llamada a Chat Completions a partir de las instrucciones del cliente y
+    del historial reciente guardado en la tabla `messages`, más los turnos
+    que el write-behind aún no ha escrito.
+    
+    Ofrece la misma interfaz que OpenAIAssistantService (send_message y
+    stream_message con {thread_id, response}), pero no crea threads: el
+    thread_id recibido se devuelve tal cual.
+    """
+    def __init__(self, model: str = "gpt-4-turbo-preview", history_limit: int = 20):
+        self.model = model
+        self.history_limit = history_limit
+    
+    @property
+    def client(self) -> AsyncOpenAI:
+        """Cliente de OpenAI, creado en el primer uso."""
+        return get_openai_client()
+    
+    def _build_messages(
+        self,
+        instructions: str,
+        history: List[Dict[str, Any]],
+        message: str
+    ) -> List[Dict[str, str]]:
+        messages = [{"role": "system", "content": instructions}]
+        messages.extend(
+            {"role": item["role"], "content": item["content"]}
+            for item in history
+            if item.get("role") in ("user", "assistant")
+        )
+        messages.append({"role": "user", "content": message})
+        return messages
+    
+    async def complete(self, instructions: str, history: List[Dict[str, Any]], message: str) -> Dict[str, Any]:
+        """
+        Genera la respuesta con una llamada a Chat Completions.
+        
+        Returns:
+            Dict[str, Any]: {"response": ..., "tokens": ...}
+        """
+        completion = await self.client.chat.completions.create(
+            model=self.model,
+            messages=self._build_messages(instructions, history, message)
+        )
+        return {
+            "response": completion.choices[0].message.content or "",
+            "tokens": completion.usage.total_tokens if completion.usage else 0
+        }
+    
+    async def stream(self, instructions: str, history: List[Dict[str, Any]], message: str) -> AsyncIterator[str]:
+        """
+        Genera la respuesta en streaming y produce los fragmentos de texto.
+        """
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=self._build_messages(instructions, history, message),
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    async def _load_history(self, conversation_id: Optional[str], message: str) -> List[Dict[str, Any]]:
+        if not conversation_id:
+            return []
+        history = await supabase_service.get_recent_messages(conversation_id, self.history_limit)
+        # Con write-behind, los últimos turnos pueden seguir en la cola del writer
+        written = {row.get("id") for row in history}
+        history += [row for row in message_writer.unwritten(conversation_id) if row["id"] not in written]
+        history = history[-self.history_limit:]
+        # El mensaje actual ya puede estar guardado; no enviarlo dos veces
+        if history and history[-1]["role"] == "user" and history[-1]["content"] == message:
+            history = history[:-1]
+        return history
+    
+    async def send_message(
+        self,
+        client_id: str,
+        message: str,
+        thread_id: Optional[str] = None,
+        conversation_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Envía un mensaje y obtiene la respuesta.
+        """
+        try:
+            _, instructions = await openai_assistant.load_instructions(client_id)
+            history = await self._load_history(conversation_id, message)
+            result = await self.complete(instructions, history, message)
+            return {"thread_id": thread_id or "", **result}
+            
+        except Exception as e:
+            logger.error(f"Error al enviar mensaje con Chat Completions: {str(e)}")
+            raise
+    
+    async def stream_message(
+        self,
+        client_id: str,
+        message: str,
+        thread_id: Optional[str] = None,
+        conversation_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Envía un mensaje y produce la respuesta a medida que se genera, con
+        los mismos eventos que OpenAIAssistantService.stream_message.
+        """
+        try:
+            _, instructions = await openai_assistant.load_instructions(client_id)
+            history = await self._load_history(conversation_id, message)
+            
+            parts: List[str] = []
+            async for text in self.stream(instructions, history, message):
+                parts.append(text)
+                yield {"type": "delta", "text": text}
+            
+            yield {
+                "type": "done",
+                "thread_id": thread_id or "",
+                "response": "".join(parts)
+            }
+            
+        except Exception as e:
+            logger.error(f"Error al enviar mensaje en streaming con Chat Completions: {str(e)}")
+            raise
+
+# Instancia global para usar en toda la aplicación
+chat_engine = ChatCompletionsEngine(
+    model=get_settings().CHAT_ENGINE_MODEL,
+    history_limit=get_settings().CHAT_ENGINE_HISTORY_LIMIT
+)
+
+ENGINES = {
+    ENGINE_ASSISTANTS: openai_assistant,
+    ENGINE_CHAT: chat_engine
+}
+
+def resolve_engine(requested: Optional[str] = None, client: Optional[Dict[str, Any]] = None):
+    """
+    Elige el motor: el de la petición, si no el configurado para el cliente
+    (columna `engine` de business_details) y si no DEFAULT_ENGINE.
+    
+    Raises:
+        ValueError: Si el motor pedido no existe
+    """
+    name = requested or (client or {}).get("engine") or get_settings().DEFAULT_ENGINE
+    engine = ENGINES.get(name)
+    if engine is None:
+        raise ValueError(f"Motor desconocido: {name}")
+    return engine
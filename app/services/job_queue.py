@@ -0,0 +1,112 @@
+import time
+import uuid
+import asyncio
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from app.core.cache import TTLCache
+
+# Estados de un job
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+@dataclass
+class Job:
+    """Trabajo en segundo plano."""
+    kind: str
+    payload: Dict[str, Any]
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    batch_id: Optional[str] = None
+    status: str = JOB_QUEUED
+    attempts: int = 0
+    max_attempts: int = 3
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+class JobQueue(ABC):
+    """
+    Interfaz de la cola de jobs. Un backend externo (Redis, tabla de
+    Supabase...) solo tiene que implementar estos métodos.
+    """
+    @abstractmethod
+    async def put(self, job: Job, delay: float = 0.0) -> None:
+        """Encola un job, opcionalmente tras `delay` segundos."""
+        ...
+    
+    @abstractmethod
+    async def get(self) -> Job:
+        """Espera y devuelve el siguiente job pendiente."""
+        ...
+    
+    @abstractmethod
+    async def save(self, job: Job) -> None:
+        """Persiste el estado actual de un job."""
+        ...
+    
+    @abstractmethod
+    async def get_job(self, job_id: str) -> Optional[Job]:
+        ...
+    
+    @abstractmethod
+    async def get_batch(self, batch_id: str) -> List[Job]:
+        ...
+    
+    @abstractmethod
+    def depth(self) -> int:
+        """Jobs pendientes de ejecutar."""
+        ...
+
+class InMemoryJobQueue(JobQueue):
+    """
+    Cola de jobs en memoria del proceso. Los jobs terminados se conservan
+    `retention` segundos para poder consultar su estado.
+    """
+    def __init__(self, retention: float = 86400.0, max_jobs: int = 100000):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._jobs = TTLCache(maxsize=max_jobs, ttl=retention)
+        self._batches = TTLCache(maxsize=max_jobs, ttl=retention)
+        self._delayed: set = set()
+    
+    async def put(self, job: Job, delay: float = 0.0) -> None:
+        job.status = JOB_QUEUED
+        await self.save(job)
+        if job.batch_id:
+            batch = self._batches.get(job.batch_id)
+            if batch is None:
+                batch = []
+                self._batches.set(job.batch_id, batch)
+            if job.id not in batch:
+                batch.append(job.id)
+        
+        if delay <= 0:
+            self._queue.put_nowait(job)
+            return
+        
+        async def put_later():
+            await asyncio.sleep(delay)
+            self._queue.put_nowait(job)
+        
+        task = asyncio.create_task(put_later())
+        self._delayed.add(task)
+        task.add_done_callback(self._delayed.discard)
+    
+    async def get(self) -> Job:
+        return await self._queue.get()
+    
+    async def save(self, job: Job) -> None:
+        job.updated_at = time.time()
+        self._jobs.set(job.id, job)
+    
+    async def get_job(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+    
+    async def get_batch(self, batch_id: str) -> List[Job]:
+        job_ids = self._batches.get(batch_id) or []
+        return [job for job in (self._jobs.get(job_id) for job_id in job_ids) if job]
+    
+    def depth(self) -> int:
+        return self._queue.qsize() + len(self._delayed)
@@ -1,11 +1,121 @@
-from typing import Optional
+import re
+import time
+import asyncio
+import logging
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
 from fastapi import Request
-from langdetect import detect
+from langdetect import DetectorFactory, detect
+from langdetect.detector_factory import init_factory
 from langdetect.lang_detect_exception import LangDetectException
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Semilla fija: langdetect es aleatorio y sin ella el mismo texto puede dar idiomas distintos
+DetectorFactory.seed = 0
+
+# Saludos y mensajes cortos frecuentes que no merece la pena analizar
+SHORT_TEXTS: Dict[str, str] = {
+    "hola": "es", "buenas": "es", "buenos dias": "es", "buenas tardes": "es",
+    "buenas noches": "es", "gracias": "es", "muchas gracias": "es", "adios": "es",
+    "hello": "en", "hi": "en", "hey": "en", "thanks": "en", "thank you": "en",
+    "good morning": "en", "good afternoon": "en", "good evening": "en", "bye": "en",
+    "bonjour": "fr", "bonsoir": "fr", "merci": "fr", "salut": "fr",
+    "ola": "pt", "oi": "pt", "obrigado": "pt", "obrigada": "pt", "bom dia": "pt",
+    "ciao": "it", "grazie": "it", "buongiorno": "it",
+    "hallo": "de", "danke": "de", "guten tag": "de"
+}
+
+# Longitud máxima del texto que se analiza (y que se usa como clave de caché)
+MAX_DETECT_LENGTH = 1000
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sin signos de puntuación y con espacios colapsados."""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())[:MAX_DETECT_LENGTH]
+
+def _strip_accents(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
 
 class LanguageService:
-    @staticmethod
+    """
+    Detección de idioma determinista, cacheada y fuera del event loop.
+    
+    El determinismo lo da `DetectorFactory.seed`: cada Detector de langdetect
+    crea su propio generador aleatorio a partir de esa semilla. Las
+    detecciones van a un único hilo dedicado por rendimiento: son Python puro
+    ligado a CPU, así que más hilos no aumentan el throughput y solo
+    competirían con el event loop por el GIL.
+    """
+    def __init__(
+        self,
+        default_language: str = "en",
+        min_length: int = 4,
+        cache_size: int = 10000,
+        cache_ttl: float = 86400.0
+    ):
+        self.default_language = default_language
+        self.min_length = min_length
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="langdetect")
+        self._loaded = False
+        self.fast_path_hits = 0
+    
+    async def preload(self) -> float:
+        """
+        Carga los perfiles de idioma (langdetect lo hace en la primera
+        detección). Devuelve los segundos empleados.
+        """
+        if self._loaded:
+            return 0.0
+        started = time.perf_counter()
+        await asyncio.get_running_loop().run_in_executor(self._executor, init_factory)
+        self._loaded = True
+        elapsed = time.perf_counter() - started
+        logger.info(f"Perfiles de idioma cargados en {elapsed * 1000:.0f} ms")
+        return elapsed
+    
+    def _detect_sync(self, text: str) -> str:
+        try:
+            return detect(text)
+        except LangDetectException:
+            return self.default_language
+    
+    async def detect(self, text: str) -> str:
+        """
+        Detecta el idioma de un texto.
+        
+        Returns:
+            Código de idioma (es, en, etc.)
+        """
+        normalized = normalize_text(text)
+        
+        # Camino rápido: saludos conocidos y textos demasiado cortos para analizarlos
+        short = SHORT_TEXTS.get(_strip_accents(normalized))
+        if short:
+            self.fast_path_hits += 1
+            return short
+        if len(normalized) < self.min_length:
+            self.fast_path_hits += 1
+            return self.default_language
+        
+        language = self.cache.get(normalized)
+        if language:
+            return language
+        
+        language = await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._detect_sync, normalized
+        )
+        self._loaded = True
+        self.cache.set(normalized, language)
+        return language
+    
     async def detect_language(
+        self,
         text: str,
         preferred_language: Optional[str] = None,
         request: Optional[Request] = None
@@ -35,10 +145,16 @@ class LanguageService:
                     return preferred[:2].lower()
         
         # Si no hay preferencia, detectar el idioma
-        try:
-            return detect(text)
-        except LangDetectException:
-            return "en"  # Default a inglés si no se puede detectar
+        return await self.detect(text)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"fast_path_hits": self.fast_path_hits, "preloaded": self._loaded, **self.cache.stats()}
+    
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
 
 # Instancia global para usar en toda la aplicación
-language_service = LanguageService() 
\ No newline at end of file
+language_service = LanguageService(
+    default_language=get_settings().LANGUAGE_DEFAULT,
+    cache_size=get_settings().LANGUAGE_CACHE_MAX_SIZE
+)
@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+import asyncio
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+from app.core.config import get_settings
+from app.services.supabase_service import supabase_service
+
+logger = logging.getLogger(__name__)
+
+class MessageWriter:
+    """
+    Persistencia diferida de mensajes (write-behind).
+    
+    Los mensajes se encolan en memoria y una tarea en segundo plano los
+    inserta en `messages` por lotes, al llenarse un lote o cada
+    `flush_interval` segundos. Si Supabase no responde, el lote se añade a
+    un fichero de spool (JSON lines) que se reintenta en el siguiente
+    arranque o tras la siguiente escritura correcta. Los workers que
+    comparten el spool lo leen y escriben con un bloqueo de fichero.
+    
+    Cada mensaje lleva un id generado aquí: el spool se reintenta con un
+    upsert que ignora los ids ya guardados, así que un lote que Supabase
+    llegó a escribir antes de fallar no se duplica. Mientras un mensaje no se
+    ha escrito, `unwritten` lo devuelve para que el historial no lo pierda.
+    """
+    def __init__(
+        self,
+        batch_size: int = 100,
+        flush_interval: float = 0.5,
+        max_queue: int = 10000,
+        spool_path: str = "message_spool.jsonl"
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.spool_path = spool_path
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # conversation_id -> mensajes encolados aún no escritos, por id
+        self._unwritten: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._counters = {
+            "enqueued": 0,
+            "rejected": 0,
+            "written": 0,
+            "insert_round_trips": 0,
+            "spooled": 0,
+            "replayed": 0,
+            "dropped": 0
+        }
+        self._flush_time = 0.0
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    async def start(self) -> None:
+        """Arranca la tarea de escritura y reintenta el spool pendiente."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        await self._replay_spool()
+        self._task = asyncio.create_task(self._run())
+    
+    def enqueue(self, conversation_id: str, role: str, content: str) -> bool:
+        """
+        Encola un mensaje. Devuelve False si el writer no está activo o la
+        cola está llena, en cuyo caso el llamador debe guardarlo directamente.
+        """
+        if not self.running or self._stopping:
+            return False
+        message = {
+            "id": str(uuid.uuid4()),
+            "conversation_id": conversation_id,
+            "role": role,
+            "content": content,
+            # Fecha de llegada para conservar el orden dentro de la conversación
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self._counters["rejected"] += 1
+            return False
+        self._unwritten.setdefault(conversation_id, {})[message["id"]] = message
+        self._counters["enqueued"] += 1
+        return True
+    
+    def unwritten(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """Mensajes de la conversación encolados que aún no se han escrito, en orden de llegada."""
+        return list(self._unwritten.get(conversation_id, {}).values())
+    
+    def _forget(self, batch: List[Dict[str, Any]]) -> None:
+        for message in batch:
+            pending = self._unwritten.get(message["conversation_id"])
+            if pending is None:
+                continue
+            pending.pop(message["id"], None)
+            if not pending:
+                del self._unwritten[message["conversation_id"]]
+    
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            message = await self._queue.get()
+            if message is None:
+                return
+            batch = [message]
+            try:
+                deadline = loop.time() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        message = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    if message is None:
+                        stopping = True
+                        break
+                    batch.append(message)
+                await self._flush(batch)
+            except Exception as e:
+                # La tarea no debe morir: los mensajes siguientes se seguirían encolando sin escribirse
+                logger.error(f"Error inesperado en el writer de mensajes: {str(e)}")
+    
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        started = time.perf_counter()
+        try:
+            await supabase_service.save_messages(batch)
+        except Exception as e:
+            logger.error(f"No se pudo escribir un lote de {len(batch)} mensajes, se guarda en spool: {str(e)}")
+            await self._spool(batch)
+            return
+        finally:
+            # Escrito o en el spool: el historial ya no lo lee de la cola
+            self._forget(batch)
+            self._counters["insert_round_trips"] += 1
+            self._flush_time += time.perf_counter() - started
+        
+        self._counters["written"] += len(batch)
+        if os.path.exists(self.spool_path):
+            await self._replay_spool()
+    
+    async def _spool(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            await asyncio.to_thread(self._append_spool, batch)
+        except Exception as e:
+            self._counters["dropped"] += len(batch)
+            logger.error(f"No se pudo escribir el spool; se pierden {len(batch)} mensajes: {str(e)}")
+            return
+        self._counters["spooled"] += len(batch)
+    
+    @contextmanager
+    def _spool_lock(self) -> Iterator[None]:
+        """Bloqueo exclusivo del spool entre los procesos que lo comparten."""
+        with open(f"{self.spool_path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    
+    def _append_spool(self, batch: List[Dict[str, Any]]) -> None:
+        with self._spool_lock(), open(self.spool_path, "a", encoding="utf-8") as spool:
+            for message in batch:
+                spool.write(json.dumps(message, ensure_ascii=False) + "\n")
+    
+    def _take_spool(self) -> List[Dict[str, Any]]:
+        with self._spool_lock():
+            if not os.path.exists(self.spool_path):
+                return []
+            with open(self.spool_path, encoding="utf-8") as spool:
+                messages = [json.loads(line) for line in spool if line.strip()]
+            os.remove(self.spool_path)
+        # Los spools anteriores a los ids generados aquí no los traen
+        for message in messages:
+            message.setdefault("id", str(uuid.uuid4()))
+        return messages
+    
+    async def _replay_spool(self) -> None:
+        try:
+            messages = await asyncio.to_thread(self._take_spool)
+        except Exception as e:
+            logger.error(f"No se pudo leer el spool de mensajes: {str(e)}")
+            return
+        for start in range(0, len(messages), self.batch_size):
+            batch = messages[start:start + self.batch_size]
+            try:
+                await supabase_service.save_messages(batch, ignore_existing=True)
+                self._counters["replayed"] += len(batch)
+            except Exception as e:
+                logger.error(f"Supabase sigue sin responder; {len(messages) - start} mensajes vuelven al spool: {str(e)}")
+                await self._spool(messages[start:])
+                return
+            finally:
+                self._counters["insert_round_trips"] += 1
+    
+    async def stop(self) -> None:
+        """Detiene la tarea tras escribir todo lo que quede en la cola."""
+        if self._task is None:
+            return
+        self._stopping = True
+        # El marcador None indica a la tarea que termine tras vaciar la cola
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._stopping = False
+        
+        remaining: List[Dict[str, Any]] = []
+        while not self._queue.empty():
+            message = self._queue.get_nowait()
+            if message is not None:
+                remaining.append(message)
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start:start + self.batch_size])
+    
+    def stats(self) -> Dict[str, Any]:
+        round_trips = self._counters["insert_round_trips"]
+        return {
+            **self._counters,
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "avg_flush_seconds": self._flush_time / round_trips if round_trips else 0.0,
+            "rows_per_insert": self._counters["written"] / round_trips if round_trips else 0.0
+        }
+
+# Instancia global para usar en toda la aplicación
+message_writer = MessageWriter(
+    batch_size=get_settings().MESSAGE_WRITE_BATCH_SIZE,
+    flush_interval=get_settings().MESSAGE_WRITE_FLUSH_INTERVAL,
+    max_queue=get_settings().MESSAGE_WRITE_QUEUE_SIZE,
+    spool_path=get_settings().MESSAGE_WRITE_SPOOL_PATH
+)
@@ -1,51 +1,115 @@
-import os
-import time
+import asyncio
 import logging
-from typing import Optional, Dict, Any, List
-from openai import OpenAI
-from app.core.config import get_settings
+from typing import Optional, Dict, Any, List, AsyncIterator, Tuple
+from openai import AsyncOpenAI, NotFoundError
+from app.services.assistant_registry import assistant_registry, hash_instructions
+from app.services.openai_client import get_openai_client, run_options, stream_run_text
+from app.services.run_waiter import run_waiter
 from app.services.supabase_service import supabase_service
+from app.services.thread_compactor import thread_compactor
+from app.services.thread_runs import thread_runs
 
 logger = logging.getLogger(__name__)
 
+# Resultados de train_assistant
+TRAIN_UNCHANGED = "unchanged"
+TRAIN_UPDATED = "updated"
+TRAIN_CREATED = "created"
+
 class OpenAIAssistantService:
-    def __init__(self):
-        settings = get_settings()
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        self.assistant_store: Dict[str, str] = {}  # client_id -> assistant_id
+    @property
+    def client(self) -> AsyncOpenAI:
+        """Cliente de OpenAI, creado en el primer uso."""
+        return get_openai_client()
     
     async def get_or_create_assistant(self, client_id: str) -> str:
         """
         Obtiene o crea un assistant para el cliente.
         """
-        if client_id in self.assistant_store:
-            return self.assistant_store[client_id]
+        record = await assistant_registry.get(client_id)
+        if record:
+            return record["assistant_id"]
+        
+        client, instructions = await self.load_instructions(client_id)
+        assistant_id = await self._create_assistant(client_id, client, instructions)
+        
+        try:
+            record = await assistant_registry.register(client_id, assistant_id, hash_instructions(instructions))
+        except Exception:
+            # Sin registro quedaría huérfano en OpenAI
+            await self._delete_assistant(assistant_id)
+            raise
+        if record["assistant_id"] != assistant_id:
+            # Otro worker registró un assistant antes; descartar el nuestro
+            await self._delete_assistant(assistant_id)
+        return record["assistant_id"]
+    
+    async def load_instructions(self, client_id: str) -> Tuple[Dict[str, Any], str]:
+        """
+        Obtiene la información del cliente y construye sus instrucciones.
+        """
+        # Las tres lecturas son independientes: se piden en paralelo
+        results = await asyncio.gather(
+            supabase_service.get_client(client_id, strict=True),
+            supabase_service.get_business_info(client_id, strict=True),
+            supabase_service.get_business_documents(client_id, strict=True),
+            return_exceptions=True
+        )
+        
+        # No crear un assistant con información incompleta
+        failed = [
+            source
+            for source, result in zip(("business_details", "business_info", "business_documents"), results)
+            if isinstance(result, BaseException)
+        ]
+        if failed:
+            raise Exception(f"No se pudo obtener {', '.join(failed)} para {client_id}")
         
-        # Obtener información del cliente
-        client = await supabase_service.get_client(client_id)
+        client, business_info, business_docs = results
         if not client:
             raise Exception(f"Cliente {client_id} no encontrado")
         
-        # Obtener información del negocio
-        business_info = await supabase_service.get_business_info(client_id)
-        business_docs = await supabase_service.get_business_documents(client_id)
-        
-        # Crear el assistant
+        return client, self._create_instructions(client, business_info, business_docs)
+    
+    def _assistant_name(self, client: Dict[str, Any]) -> str:
+        return f"NNIA Assistant - {client.get('name', 'Cliente')}"
+    
+    async def _create_assistant(self, client_id: str, client: Dict[str, Any], instructions: str) -> str:
+        """
+        Crea el assistant en OpenAI y devuelve su ID.
+        """
         try:
-            assistant = self.client.beta.assistants.create(
-                name=f"NNIA Assistant - {client.get('name', 'Cliente')}",
-                instructions=self._create_instructions(client, business_info, business_docs),
+            assistant = await self.client.beta.assistants.create(
+                name=self._assistant_name(client),
+                instructions=instructions,
                 model="gpt-4-turbo-preview",
                 tools=[{"type": "retrieval"}]
             )
-            
-            self.assistant_store[client_id] = assistant.id
             return assistant.id
             
         except Exception as e:
             logger.error(f"Error al crear assistant para {client_id}: {str(e)}")
             raise
     
+    async def _delete_assistant(self, assistant_id: str) -> None:
+        """
+        Elimina un assistant de OpenAI sin propagar errores.
+        """
+        try:
+            await self.client.beta.assistants.delete(assistant_id)
+        except Exception as e:
+            logger.warning(f"No se pudo eliminar assistant {assistant_id}: {str(e)}")
+    
+    async def _refresh_assistant_id(self, client_id: str, stale_id: str) -> Optional[str]:
+        """
+        Relee el registro cuando el assistant cacheado ya no existe en OpenAI
+        (otro worker lo reemplazó). Devuelve None si no hay uno más reciente.
+        """
+        record = await assistant_registry.get(client_id, refresh=True)
+        if not record or record["assistant_id"] == stale_id:
+            return None
+        return record["assistant_id"]
+    
     def _create_instructions(
         self,
         client: Dict[str, Any],
@@ -74,32 +138,81 @@ class OpenAIAssistantService:
         
         return "\n".join(instructions)
     
-    async def train_assistant(self, client_id: str) -> bool:
+    async def train_assistant(self, client_id: str) -> Optional[str]:
         """
         Reentrena el assistant con la información actualizada del cliente.
+        
+        Si las instrucciones no cambiaron no se llama a OpenAI; si cambiaron se
+        actualiza el assistant existente conservando su ID. El registro se
+        actualiza de forma atómica, así que todos los workers lo ven.
+        
+        Returns:
+            Optional[str]: TRAIN_UNCHANGED, TRAIN_UPDATED o TRAIN_CREATED, o None si falla
         """
         try:
-            # Eliminar assistant existente si hay uno
-            if client_id in self.assistant_store:
-                await self.client.beta.assistants.delete(self.assistant_store[client_id])
-                del self.assistant_store[client_id]
+            record = await assistant_registry.get(client_id, refresh=True)
+            client, instructions = await self.load_instructions(client_id)
+            instructions_hash = hash_instructions(instructions)
+            
+            if not record:
+                assistant_id = await self._create_assistant(client_id, client, instructions)
+                try:
+                    registered = await assistant_registry.register(client_id, assistant_id, instructions_hash)
+                except Exception:
+                    await self._delete_assistant(assistant_id)
+                    raise
+                if registered["assistant_id"] != assistant_id:
+                    await self._delete_assistant(assistant_id)
+                return TRAIN_CREATED
             
-            # Crear nuevo assistant
-            await self.get_or_create_assistant(client_id)
-            return True
+            if record.get("instructions_hash") == instructions_hash:
+                return TRAIN_UNCHANGED
+            
+            try:
+                await self.client.beta.assistants.update(
+                    record["assistant_id"],
+                    name=self._assistant_name(client),
+                    instructions=instructions
+                )
+                assistant_id = record["assistant_id"]
+                status = TRAIN_UPDATED
+            except NotFoundError:
+                # El assistant ya no existe en OpenAI: crear uno nuevo
+                assistant_id = await self._create_assistant(client_id, client, instructions)
+                status = TRAIN_CREATED
+            
+            updated = await assistant_registry.replace(
+                client_id,
+                assistant_id,
+                instructions_hash,
+                expected_version=record["version"]
+            )
+            if not updated:
+                # Otro worker reentrenó al mismo tiempo con datos igual de recientes
+                logger.info(f"Reentrenamiento concurrente para {client_id}")
+                if status == TRAIN_CREATED:
+                    await self._delete_assistant(assistant_id)
+            return status
             
         except Exception as e:
             logger.error(f"Error al reentrenar assistant para {client_id}: {str(e)}")
-            return False
+            return None
     
     async def send_message(
         self,
         client_id: str,
         message: str,
-        thread_id: Optional[str] = None
+        thread_id: Optional[str] = None,
+        conversation_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Envía un mensaje al assistant y obtiene la respuesta.
+        
+        Los runs de una misma conversación (`conversation_id`, o el thread si
+        no se indica) se serializan: si ya hay uno en curso, el mensaje se
+        responde junto con los que lleguen mientras tanto en un único run
+        posterior (la respuesta lleva `batched=True` para todos los mensajes
+        del grupo y `coalesced=True` para todos salvo el último).
         """
         try:
             # Obtener o crear assistant
@@ -107,54 +220,144 @@ class OpenAIAssistantService:
             
             # Crear o usar thread existente
             if not thread_id:
-                thread = self.client.beta.threads.create()
+                thread = await self.client.beta.threads.create()
                 thread_id = thread.id
+            thread_id = await thread_compactor.current(thread_id)
+            
+            async def execute(messages: List[str]) -> Dict[str, Any]:
+                return await self._run_turn(client_id, assistant_id, thread_id, messages)
+            
+            return await thread_runs.submit(conversation_id or thread_id, message, execute)
             
-            # Enviar mensaje
-            self.client.beta.threads.messages.create(
+        except Exception as e:
+            logger.error(f"Error al enviar mensaje: {str(e)}")
+            raise
+    
+    async def _run_turn(
+        self,
+        client_id: str,
+        assistant_id: str,
+        thread_id: str,
+        messages: List[str]
+    ) -> Dict[str, Any]:
+        """
+        Añade los mensajes al thread, ejecuta un run y devuelve la respuesta.
+        
+        Si el thread superó el umbral de compactación, el turno se ejecuta en
+        un thread nuevo y la respuesta lleva su ID.
+        """
+        thread_id, context = await thread_compactor.prepare(thread_id, client_id)
+        
+        # Enviar mensajes
+        for message in messages:
+            await self.client.beta.threads.messages.create(
                 thread_id=thread_id,
                 role="user",
                 content=message
             )
-            
-            # Ejecutar assistant
-            run = self.client.beta.threads.runs.create(
+        
+        # Ejecutar assistant
+        try:
+            run = await self.client.beta.threads.runs.create(
                 thread_id=thread_id,
-                assistant_id=assistant_id
+                assistant_id=assistant_id,
+                **run_options(context)
             )
+        except NotFoundError:
+            assistant_id = await self._refresh_assistant_id(client_id, assistant_id)
+            if not assistant_id:
+                raise
+            run = await self.client.beta.threads.runs.create(
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                **run_options(context)
+            )
+        
+        # Esperar respuesta
+        run, _ = await run_waiter.wait(self.client, thread_id, run.id)
+        thread_compactor.observe(thread_id, client_id, run)
+        
+        # Obtener respuesta
+        response_messages = await self.client.beta.threads.messages.list(
+            thread_id=thread_id,
+            order="desc",
+            limit=1
+        )
+        
+        if not response_messages.data:
+            raise Exception("No se encontró respuesta")
+        
+        response = response_messages.data[0]
+        return {
+            "thread_id": thread_id,
+            "response": response.content[0].text.value,
+            "tokens": run.usage.total_tokens if getattr(run, "usage", None) else 0
+        }
+    
+    async def stream_message(
+        self,
+        client_id: str,
+        message: str,
+        thread_id: Optional[str] = None,
+        conversation_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Envía un mensaje al assistant y produce la respuesta a medida que se genera.
+        
+        Emite eventos {"type": "delta", "text": ...} por cada fragmento y un
+        evento final {"type": "done", "thread_id": ..., "response": ...}.
+        Espera a que terminen los runs en curso de la conversación
+        (`conversation_id`, o el thread si no se indica).
+        """
+        try:
+            # Obtener o crear assistant
+            assistant_id = await self.get_or_create_assistant(client_id)
             
-            # Esperar respuesta
-            while True:
-                run_status = self.client.beta.threads.runs.retrieve(
+            # Crear o usar thread existente
+            if not thread_id:
+                thread = await self.client.beta.threads.create()
+                thread_id = thread.id
+            
+            thread_id = await thread_compactor.current(thread_id)
+            
+            parts: List[str] = []
+            # Esperar a que termine cualquier run en curso de la conversación
+            async with thread_runs.lock(conversation_id or thread_id):
+                thread_id, context = await thread_compactor.prepare(thread_id, client_id)
+                
+                # Enviar mensaje
+                await self.client.beta.threads.messages.create(
                     thread_id=thread_id,
-                    run_id=run.id
+                    role="user",
+                    content=message
                 )
                 
-                if run_status.status == "completed":
-                    break
-                elif run_status.status in ["failed", "cancelled", "expired"]:
-                    raise Exception(f"Run {run_status.status}")
-                
-                time.sleep(1)
+                # Ejecutar assistant y reenviar los fragmentos
+                while True:
+                    try:
+                        async for text in stream_run_text(
+                            self.client,
+                            thread_id,
+                            assistant_id,
+                            additional_instructions=context,
+                            on_completed=lambda run: thread_compactor.observe(thread_id, client_id, run)
+                        ):
+                            parts.append(text)
+                            yield {"type": "delta", "text": text}
+                        break
+                    except NotFoundError:
+                        assistant_id = None if parts else await self._refresh_assistant_id(client_id, assistant_id)
+                        if not assistant_id:
+                            raise
             
-            # Obtener respuesta
-            messages = self.client.beta.threads.messages.list(
-                thread_id=thread_id,
-                order="desc",
-                limit=1
-            )
-            
-            if not messages.data:
-                raise Exception("No se encontró respuesta")
-            
-            response = messages.data[0]
-            return {
+            yield {
+                "type": "done",
                 "thread_id": thread_id,
-                "response": response.content[0].text.value
+                "response": "".join(parts)
             }
             
         except Exception as e:
-            logger.error(f"Error al enviar mensaje: {str(e)}")
+            logger.error(f"Error al enviar mensaje en streaming: {str(e)}")
             raise
 
 # Instancia global para usar en toda la aplicación
@@ -0,0 +1,124 @@
+import re
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+import httpx
+from openai import AsyncOpenAI
+from app.core.config import get_settings
+from app.core.metrics import runs_in_flight, stage_errors, track_stage
+from app.core.resilience import resilient_transport
+
+# Eventos de streaming que indican que el run no terminó correctamente
+RUN_FAILED_EVENTS = ("thread.run.failed", "thread.run.cancelled", "thread.run.expired")
+
+# Segmentos de ruta que son identificadores (thread_..., run_..., asst_...)
+_ID_SEGMENT = re.compile(r"^(thread|run|asst|msg|step|file|vs|batch)_[A-Za-z0-9]+$")
+
+_ACTIONS = {"GET": "list", "POST": "create", "DELETE": "delete"}
+_ITEM_ACTIONS = {"GET": "retrieve", "POST": "update", "DELETE": "delete"}
+# Rutas que son acciones sobre un objeto, p. ej. runs/{id}/cancel
+_OBJECT_ACTIONS = ("cancel", "submit_tool_outputs")
+
+def _operation(request: httpx.Request) -> str:
+    """
+    Nombre estable de la operación al estilo del SDK a partir de la ruta,
+    p. ej. POST /v1/threads/thread_x/runs -> threads.runs.create.
+    """
+    segments = [segment for segment in request.url.path.split("/") if segment and segment != "v1"]
+    resources = [segment for segment in segments if not _ID_SEGMENT.match(segment)]
+    if not segments or segments[-1] in _OBJECT_ACTIONS:
+        return ".".join(resources)
+    if _ID_SEGMENT.match(segments[-1]):
+        return ".".join(resources + [_ITEM_ACTIONS.get(request.method, request.method.lower())])
+    return ".".join(resources + [_ACTIONS.get(request.method, request.method.lower())])
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    Transporte que mide cada llamada a la API de OpenAI como una etapa.
+    
+    En las respuestas en streaming mide el tiempo hasta las cabeceras.
+    """
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        operation = _operation(request)
+        with track_stage("openai", operation):
+            response = await self._transport.handle_async_request(request)
+        if response.status_code >= 400:
+            stage_errors.inc("openai", operation)
+        return response
+    
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+@lru_cache()
+def get_openai_client() -> AsyncOpenAI:
+    """
+    Cliente asíncrono de OpenAI compartido por todos los servicios.
+    
+    Se crea una sola vez por proceso para reutilizar el pool de conexiones.
+    Los reintentos del SDK se desactivan: los aplica el transporte, solo en
+    las llamadas que se pueden repetir y respetando el circuit breaker.
+    """
+    settings = get_settings()
+    # Mismos límites y timeouts que el cliente por defecto del SDK
+    http_client = httpx.AsyncClient(
+        transport=resilient_transport("openai", InstrumentedTransport(httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=1000, max_keepalive_connections=100)
+        ))),
+        timeout=httpx.Timeout(600.0, connect=5.0),
+        follow_redirects=True
+    )
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        http_client=http_client,
+        max_retries=0
+    )
+
+async def close_openai_client() -> None:
+    """Cierra el pool de conexiones si llegó a crearse."""
+    if get_openai_client.cache_info().currsize:
+        await get_openai_client().close()
+        get_openai_client.cache_clear()
+
+def run_options(additional_instructions: Optional[str]) -> Dict[str, Any]:
+    """Parámetros opcionales de runs.create; se omiten los que no tienen valor."""
+    return {"additional_instructions": additional_instructions} if additional_instructions else {}
+
+async def stream_run_text(
+    client: AsyncOpenAI,
+    thread_id: str,
+    assistant_id: str,
+    additional_instructions: Optional[str] = None,
+    on_completed: Optional[Callable[[Any], None]] = None
+) -> AsyncIterator[str]:
+    """
+    Lanza un run en modo streaming y produce los fragmentos de texto del assistant.
+    
+    Args:
+        client: Cliente de OpenAI
+        thread_id: ID del thread
+        assistant_id: ID del assistant
+        additional_instructions: Instrucciones añadidas solo a este run
+        on_completed: Se llama con el run completado (p. ej. para leer `usage`)
+        
+    Yields:
+        str: Fragmentos de texto a medida que se generan
+    """
+    with runs_in_flight.track("stream"):
+        stream = await client.beta.threads.runs.create(
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+            stream=True,
+            **run_options(additional_instructions)
+        )
+        async for event in stream:
+            if event.event == "thread.message.delta":
+                for block in event.data.delta.content or []:
+                    if block.type == "text" and block.text and block.text.value:
+                        yield block.text.value
+            elif event.event == "thread.run.completed" and on_completed:
+                on_completed(event.data)
+            elif event.event in RUN_FAILED_EVENTS:
+                raise Exception(f"Run {event.data.status}")
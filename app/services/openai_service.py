@@ -1,81 +1,90 @@
-import os
-import time
 import logging
-from typing import Optional, Dict, Tuple
-from openai import OpenAI
-from dotenv import load_dotenv
+from typing import Any, Optional, Tuple, AsyncIterator, Dict, List
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+from app.services.chat_engine import chat_engine, ENGINE_CHAT
+from app.services.openai_client import get_openai_client, run_options, stream_run_text
+from app.services.run_waiter import run_waiter
+from app.services.thread_compactor import thread_compactor
+from app.services.thread_runs import thread_runs
+from app.services.thread_store import create_thread_store
 
-# Configuración de logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Constantes
-ASSISTANT_ID = "asst_..."  # TODO: Reemplazar con el ID real del Assistant
-MAX_RETRIES = 10
-RETRY_DELAY = 1  # segundos
+# Assistant compartido por los widgets de /chat
+ASSISTANT_ID = get_settings().ASSISTANT_ID
 
-# Inicialización del cliente
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Almacenamiento de threads por (user_id, widget_id)
+thread_store = create_thread_store()
 
-# Simulación de almacenamiento de threads (TODO: Reemplazar con persistencia real)
-thread_store: Dict[str, str] = {}
+# Historial reciente por (user_id, widget_id) para el motor de Chat Completions
+NNIA_INSTRUCTIONS = "Eres NNIA, un asistente de ventas y soporte para negocios."
+chat_history = TTLCache(
+    maxsize=get_settings().THREAD_STORE_MAX_SIZE,
+    ttl=get_settings().THREAD_STORE_TTL
+)
 
-async def get_or_create_thread(user_id: Optional[str], widget_id: str) -> Tuple[str, str]:
+def _uses_chat_engine(engine: Optional[str]) -> bool:
+    return (engine or get_settings().DEFAULT_ENGINE) == ENGINE_CHAT
+
+def _remember_turn(key: Tuple[str, str], history: List[Dict[str, str]], message: str, response: str) -> None:
+    history = history + [
+        {"role": "user", "content": message},
+        {"role": "assistant", "content": response}
+    ]
+    chat_history.set(key, history[-chat_engine.history_limit:])
+
+def _conversation_key(user_id: Optional[str], widget_id: str, thread_id: str) -> str:
+    """
+    Clave con la que se serializan los runs de una conversación: el usuario
+    y el widget, que no cambian al compactar el thread. Los anónimos tienen
+    un thread nuevo en cada petición.
+    """
+    return f"{widget_id}:{user_id}" if user_id else thread_id
+
+async def get_or_create_thread(user_id: Optional[str], widget_id: str) -> str:
     """
     Obtiene o crea un thread para el usuario y widget dados.
     
+    Los usuarios anónimos no pueden volver a su thread, así que reciben uno
+    nuevo en cada petición y no se guarda.
+    
     Args:
         user_id: ID del usuario (opcional)
         widget_id: ID del widget
         
     Returns:
-        Tuple[str, str]: (thread_id, user_id)
+        str: ID del thread
     """
-    # Generar user_id temporal si no se proporciona
-    if not user_id:
-        user_id = f"temp_{int(time.time())}"
-    
-    # Crear clave única para el par user_id-widget_id
-    store_key = f"{user_id}_{widget_id}"
-    
     # Si ya existe un thread, retornarlo
-    if store_key in thread_store:
-        return thread_store[store_key], user_id
+    if user_id:
+        thread_id = await thread_store.get(user_id, widget_id)
+        if thread_id:
+            return thread_id
     
     # Crear nuevo thread
     try:
-        thread = client.beta.threads.create()
-        thread_store[store_key] = thread.id
-        return thread.id, user_id
+        thread = await get_openai_client().beta.threads.create()
+        if user_id:
+            await thread_store.set(user_id, widget_id, thread.id)
+        return thread.id
     except Exception as e:
         logger.error(f"Error al crear thread: {str(e)}")
         raise
 
-async def wait_for_run(thread_id: str, run_id: str) -> None:
+async def wait_for_run(thread_id: str, run_id: str) -> Any:
     """
     Espera a que un run se complete.
     
     Args:
         thread_id: ID del thread
         run_id: ID del run
-    """
-    for _ in range(MAX_RETRIES):
-        run = client.beta.threads.runs.retrieve(
-            thread_id=thread_id,
-            run_id=run_id
-        )
         
-        if run.status == "completed":
-            return
-        elif run.status == "failed":
-            raise Exception(f"Run falló: {run.last_error}")
-        elif run.status in ["cancelled", "expired"]:
-            raise Exception(f"Run {run.status}")
-            
-        time.sleep(RETRY_DELAY)
-    
-    raise Exception("Tiempo de espera agotado para el run")
+    Returns:
+        Any: El run completado
+    """
+    run, _ = await run_waiter.wait(get_openai_client(), thread_id, run_id)
+    return run
 
 async def get_last_assistant_message(thread_id: str) -> str:
     """
@@ -87,7 +96,7 @@ async def get_last_assistant_message(thread_id: str) -> str:
     Returns:
         str: Contenido del último mensaje
     """
-    messages = client.beta.threads.messages.list(
+    messages = await get_openai_client().beta.threads.messages.list(
         thread_id=thread_id,
         order="desc",
         limit=1
@@ -104,11 +113,53 @@ async def get_last_assistant_message(thread_id: str) -> str:
     content = message.content[0].text.value
     return content
 
+def _tenant(widget_id: str) -> str:
+    return f"widget:{widget_id}"
+
+async def _run_turn(thread_id: str, widget_id: str, messages: List[str]) -> Dict[str, str]:
+    """
+    Añade los mensajes al thread, lanza un run y devuelve la respuesta.
+    
+    Args:
+        thread_id: ID del thread
+        widget_id: ID del widget
+        messages: Mensajes del usuario pendientes de respuesta
+        
+    Returns:
+        Dict[str, str]: {"thread_id": ..., "response": ...}; el thread
+        cambia si se compactó el historial
+    """
+    thread_id, context = await thread_compactor.prepare(thread_id, _tenant(widget_id))
+    
+    # Enviar mensajes al thread
+    for message in messages:
+        await get_openai_client().beta.threads.messages.create(
+            thread_id=thread_id,
+            role="user",
+            content=message
+        )
+    
+    # Lanzar run
+    run = await get_openai_client().beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=ASSISTANT_ID,
+        **run_options(context)
+    )
+    
+    # Esperar a que el run termine
+    run = await wait_for_run(thread_id, run.id)
+    thread_compactor.observe(thread_id, _tenant(widget_id), run)
+    
+    # Obtener la respuesta
+    response = await get_last_assistant_message(thread_id)
+    return {"thread_id": thread_id, "response": response}
+
 async def ask_nnia(
     message: str,
     widget_id: str,
     user_id: Optional[str] = None,
-    language: str = "es"
+    language: str = "es",
+    engine: Optional[str] = None
 ) -> str:
     """
     Función principal para interactuar con NNIA usando OpenAI Assistants.
@@ -118,39 +169,118 @@ async def ask_nnia(
         widget_id: ID del widget
         user_id: ID del usuario (opcional)
         language: Idioma de la conversación
+        engine: Motor de respuesta (assistants/chat); por defecto DEFAULT_ENGINE
         
     Returns:
         str: Respuesta de NNIA
     """
     try:
+        if _uses_chat_engine(engine):
+            # Sin user_id no hay historial que recordar
+            key = (user_id, widget_id)
+            history = (chat_history.get(key) or []) if user_id else []
+            result = await chat_engine.complete(
+                f"{NNIA_INSTRUCTIONS}\nIdioma preferido: {language}",
+                history,
+                message
+            )
+            if user_id:
+                _remember_turn(key, history, message, result["response"])
+            return result["response"]
+        
         # 1. Obtener o crear thread
-        thread_id, user_id = await get_or_create_thread(user_id, widget_id)
+        stored_thread_id = await get_or_create_thread(user_id, widget_id)
+        thread_id = await thread_compactor.current(stored_thread_id)
         
-        # 2. Enviar mensaje al thread
-        client.beta.threads.messages.create(
-            thread_id=thread_id,
-            role="user",
-            content=message
+        # 2-5. Enviar mensajes, lanzar el run y obtener la respuesta. Los
+        # mensajes que lleguen mientras hay un run en curso se responden
+        # juntos en el siguiente run de la conversación
+        result = await thread_runs.submit(
+            _conversation_key(user_id, widget_id, stored_thread_id),
+            message,
+            lambda messages: _run_turn(thread_id, widget_id, messages)
         )
         
-        # 3. Lanzar run
-        run = client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=ASSISTANT_ID
-        )
+        # Si el historial se compactó, seguir en el thread nuevo
+        if user_id and result["thread_id"] != stored_thread_id:
+            await thread_store.set(user_id, widget_id, result["thread_id"])
+        return result["response"]
+        
+    except Exception as e:
+        logger.error(f"Error en ask_nnia: {str(e)}")
+        raise
+
+async def ask_nnia_stream(
+    message: str,
+    widget_id: str,
+    user_id: Optional[str] = None,
+    language: str = "es",
+    engine: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Variante de ask_nnia que produce la respuesta a medida que se genera.
+    
+    Args:
+        message: Mensaje del usuario
+        widget_id: ID del widget
+        user_id: ID del usuario (opcional)
+        language: Idioma de la conversación
+        engine: Motor de respuesta (assistants/chat); por defecto DEFAULT_ENGINE
         
-        # 4. Esperar a que el run termine
-        await wait_for_run(thread_id, run.id)
+    Yields:
+        str: Fragmentos de la respuesta de NNIA
+    """
+    try:
+        if _uses_chat_engine(engine):
+            # Sin user_id no hay historial que recordar
+            key = (user_id, widget_id)
+            history = (chat_history.get(key) or []) if user_id else []
+            parts: List[str] = []
+            async for text in chat_engine.stream(
+                f"{NNIA_INSTRUCTIONS}\nIdioma preferido: {language}",
+                history,
+                message
+            ):
+                parts.append(text)
+                yield text
+            if user_id:
+                _remember_turn(key, history, message, "".join(parts))
+            return
+        
+        # 1. Obtener o crear thread
+        stored_thread_id = await get_or_create_thread(user_id, widget_id)
+        thread_id = await thread_compactor.current(stored_thread_id)
+        tenant = _tenant(widget_id)
         
-        # 5. Obtener y retornar la respuesta
-        response = await get_last_assistant_message(thread_id)
-        return response
+        # Esperar a que termine cualquier run en curso de la conversación
+        async with thread_runs.lock(_conversation_key(user_id, widget_id, stored_thread_id)):
+            thread_id, context = await thread_compactor.prepare(thread_id, tenant)
+            if user_id and thread_id != stored_thread_id:
+                await thread_store.set(user_id, widget_id, thread_id)
+            
+            # 2. Enviar mensaje al thread
+            await get_openai_client().beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=message
+            )
+            
+            # 3. Lanzar run en streaming y reenviar los fragmentos
+            async for text in stream_run_text(
+                get_openai_client(),
+                thread_id,
+                ASSISTANT_ID,
+                additional_instructions=context,
+                on_completed=lambda run: thread_compactor.observe(thread_id, tenant, run)
+            ):
+                yield text
         
     except Exception as e:
-        logger.error(f"Error en ask_nnia: {str(e)}")
+        logger.error(f"Error en ask_nnia_stream: {str(e)}")
         raise
 
 # Instancia global para usar en toda la aplicación
 openai_service = type('OpenAIService', (), {
-    'ask_nnia': ask_nnia
+    'ask_nnia': staticmethod(ask_nnia),
+    'ask_nnia_stream': staticmethod(ask_nnia_stream)
 })() 
\ No newline at end of file
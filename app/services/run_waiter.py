@@ -0,0 +1,251 @@
+import time
+import random
+import asyncio
+import contextvars
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from openai import AsyncOpenAI
+from app.core.config import get_settings
+from app.core.metrics import Histogram, registry, runs_in_flight
+from app.core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Estados en los que un run ya no va a cambiar
+FAILED_STATUSES = ("failed", "cancelled", "expired", "requires_action")
+
+run_wait_seconds = registry.register(Histogram(
+    "nnia_run_wait_seconds",
+    "Tiempo de espera hasta que un run termina",
+    ("status",)
+))
+run_wait_polls = registry.register(Histogram(
+    "nnia_run_wait_polls",
+    "Sondeos necesarios por run",
+    ("status",),
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55)
+))
+
+@dataclass
+class PollSchedule:
+    """
+    Calendario de sondeo: unos sondeos rápidos iniciales y después backoff
+    exponencial con jitter hasta un intervalo máximo, con un plazo global.
+    """
+    initial_interval: float = 0.2
+    fast_polls: int = 5
+    backoff_factor: float = 1.5
+    max_interval: float = 2.0
+    jitter: float = 0.1
+    timeout: float = 120.0
+    
+    @classmethod
+    def from_settings(cls) -> "PollSchedule":
+        settings = get_settings()
+        return cls(
+            initial_interval=settings.RUN_POLL_INITIAL_INTERVAL,
+            fast_polls=settings.RUN_POLL_FAST_POLLS,
+            backoff_factor=settings.RUN_POLL_BACKOFF_FACTOR,
+            max_interval=settings.RUN_POLL_MAX_INTERVAL,
+            jitter=settings.RUN_POLL_JITTER,
+            timeout=settings.RUN_WAIT_TIMEOUT
+        )
+    
+    def interval(self, poll: int) -> float:
+        """Segundos a esperar antes del sondeo número `poll` (empezando en 1)."""
+        if poll <= self.fast_polls:
+            delay = self.initial_interval
+        else:
+            delay = min(
+                self.initial_interval * self.backoff_factor ** (poll - self.fast_polls),
+                self.max_interval
+            )
+        if self.jitter:
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        return max(delay, 0.0)
+
+@dataclass
+class RunWaitStats:
+    """Estadísticas de la espera de un run."""
+    run_id: str
+    polls: int = 0
+    elapsed: float = 0.0
+    wasted: float = 0.0  # Tiempo entre que el run terminó y lo detectamos
+    status: Optional[str] = None
+
+class RunWaitError(Exception):
+    """El run terminó sin completarse o se agotó el plazo de espera."""
+    def __init__(self, message: str, stats: RunWaitStats):
+        super().__init__(message)
+        self.stats = stats
+
+class _PendingRun:
+    def __init__(self, client: AsyncOpenAI, thread_id: str, run_id: str, deadline: float, future: asyncio.Future):
+        self.client = client
+        self.thread_id = thread_id
+        self.run_id = run_id
+        self.deadline = deadline
+        self.future = future
+        self.stats = RunWaitStats(run_id=run_id)
+        self.started = time.monotonic()
+        self.next_poll_at = 0.0
+        self.last_interval = 0.0
+
+class RunWaiter:
+    """
+    Espera a que los runs de OpenAI terminen siguiendo un PollSchedule.
+    
+    En modo compartido una única tarea en segundo plano sondea todos los
+    runs pendientes en el mismo bucle en lugar de un bucle por petición.
+    """
+    def __init__(self, schedule: Optional[PollSchedule] = None, shared: bool = False):
+        self.schedule = schedule or PollSchedule()
+        self.shared = shared
+        self._pending: Dict[Tuple[str, str], _PendingRun] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._totals = {"runs": 0, "polls": 0, "failures": 0, "timeouts": 0, "elapsed": 0.0, "wasted": 0.0}
+    
+    async def wait(self, client: AsyncOpenAI, thread_id: str, run_id: str) -> Tuple[Any, RunWaitStats]:
+        """
+        Espera a que el run termine.
+        
+        Returns:
+            Tuple[Any, RunWaitStats]: (run completado, estadísticas de la espera)
+            
+        Raises:
+            RunWaitError: Si el run falla, se cancela, expira o se agota el plazo
+        """
+        with runs_in_flight.track("poll"), span("openai.run.wait"):
+            return await self._wait(client, thread_id, run_id)
+    
+    async def _wait(self, client: AsyncOpenAI, thread_id: str, run_id: str) -> Tuple[Any, RunWaitStats]:
+        if self.shared:
+            return await self._wait_shared(client, thread_id, run_id)
+        
+        pending = _PendingRun(client, thread_id, run_id, time.monotonic() + self.schedule.timeout, None)
+        while True:
+            delay = self._schedule_next(pending)
+            await asyncio.sleep(delay)
+            run = await client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+            if self._check(pending, run):
+                return run, pending.stats
+    
+    async def _wait_shared(self, client: AsyncOpenAI, thread_id: str, run_id: str) -> Tuple[Any, RunWaitStats]:
+        loop = asyncio.get_running_loop()
+        pending = _PendingRun(client, thread_id, run_id, time.monotonic() + self.schedule.timeout, loop.create_future())
+        self._schedule_next(pending)
+        self._pending[(thread_id, run_id)] = pending
+        
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            # Contexto vacío: los sondeos compartidos no pertenecen a la petición que los arrancó
+            self._task = asyncio.create_task(self._poll_loop(), context=contextvars.Context())
+        
+        try:
+            return await pending.future
+        finally:
+            self._pending.pop((thread_id, run_id), None)
+    
+    async def _poll_loop(self) -> None:
+        while self._pending:
+            now = time.monotonic()
+            due = [p for p in self._pending.values() if p.next_poll_at <= now and not p.future.done()]
+            if due:
+                await asyncio.gather(*(self._poll_one(p) for p in due))
+                continue
+            
+            waiting = [p.next_poll_at for p in self._pending.values() if not p.future.done()]
+            if not waiting:
+                # Quedan runs cuyos solicitantes ya no esperan; se limpian al salir de wait()
+                await asyncio.sleep(0)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(min(waiting) - now, 0))
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _poll_one(self, pending: _PendingRun) -> None:
+        try:
+            run = await pending.client.beta.threads.runs.retrieve(
+                thread_id=pending.thread_id,
+                run_id=pending.run_id
+            )
+            if self._check(pending, run):
+                if not pending.future.done():
+                    pending.future.set_result((run, pending.stats))
+            else:
+                self._schedule_next(pending)
+        except Exception as e:
+            if not pending.future.done():
+                pending.future.set_exception(e)
+    
+    def _schedule_next(self, pending: _PendingRun) -> float:
+        """Calcula la espera hasta el siguiente sondeo respetando el plazo global."""
+        delay = self.schedule.interval(pending.stats.polls + 1)
+        now = time.monotonic()
+        if now + delay > pending.deadline:
+            self._finish(pending, "timeout")
+            self._totals["timeouts"] += 1
+            raise RunWaitError("Tiempo de espera agotado para el run", pending.stats)
+        pending.last_interval = delay
+        pending.next_poll_at = now + delay
+        return delay
+    
+    def _check(self, pending: _PendingRun, run: Any) -> bool:
+        """Registra un sondeo y devuelve True si el run se completó."""
+        pending.stats.polls += 1
+        if run.status == "completed":
+            completed_at = getattr(run, "completed_at", None)
+            if completed_at:
+                pending.stats.wasted = min(max(time.time() - completed_at, 0.0), pending.last_interval)
+            self._finish(pending, run.status)
+            return True
+        if run.status in FAILED_STATUSES:
+            self._finish(pending, run.status)
+            self._totals["failures"] += 1
+            if run.status == "failed":
+                raise RunWaitError(f"Run falló: {run.last_error}", pending.stats)
+            raise RunWaitError(f"Run {run.status}", pending.stats)
+        return False
+    
+    def _finish(self, pending: _PendingRun, status: str) -> None:
+        stats = pending.stats
+        stats.status = status
+        stats.elapsed = time.monotonic() - pending.started
+        self._totals["runs"] += 1
+        self._totals["polls"] += stats.polls
+        self._totals["elapsed"] += stats.elapsed
+        self._totals["wasted"] += stats.wasted
+        run_wait_seconds.observe(stats.elapsed, status)
+        run_wait_polls.observe(stats.polls, status)
+        logger.debug(
+            f"Run {stats.run_id} {status}: {stats.polls} sondeos, "
+            f"{stats.elapsed:.2f}s de espera, {stats.wasted:.2f}s desperdiciados"
+        )
+    
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas acumuladas de todas las esperas."""
+        runs = self._totals["runs"]
+        return {
+            **self._totals,
+            "pending": len(self._pending),
+            "avg_polls": self._totals["polls"] / runs if runs else 0.0
+        }
+    
+    async def close(self) -> None:
+        """Detiene la tarea de sondeo compartida, si existe."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+# Instancia global para usar en toda la aplicación
+run_waiter = RunWaiter(PollSchedule.from_settings(), shared=get_settings().RUN_WAIT_SHARED_POLLER)
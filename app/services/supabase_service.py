@@ -1,45 +1,129 @@
-from typing import List, Dict, Any, Optional
-from supabase import create_client, Client
+import asyncio
+import weakref
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
+from app.db.supabase_client import PooledPostgrestClient, get_supabase_client
+from app.core.cache import MISSING, TTLCache
 from app.core.config import get_settings
+from app.core.metrics import instrumented, track_stage
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Máximo de IDs por filtro `in` para no exceder la longitud de URL de PostgREST
+IN_QUERY_CHUNK_SIZE = 100
+
+def _after(query: Any, after: Optional[Tuple[str, str]]) -> Any:
+    """Filtro keyset: filas posteriores a la posición (created_at, id)."""
+    if not after:
+        return query
+    created_at, row_id = after
+    return query.or_(
+        f'created_at.gt."{created_at}",and(created_at.eq."{created_at}",id.gt."{row_id}")'
+    )
+
 class SupabaseService:
     def __init__(self):
         settings = get_settings()
-        self.client: Client = create_client(
-            supabase_url=settings.SUPABASE_URL,
-            supabase_key=settings.SUPABASE_KEY
+        # Caché de get_client, get_business_info y get_business_documents
+        self.cache = TTLCache(maxsize=settings.CLIENT_CACHE_MAX_SIZE, ttl=settings.CLIENT_CACHE_TTL)
+        self.negative_ttl = settings.CLIENT_CACHE_NEGATIVE_TTL
+        # Conversación activa por (client_id, rol) y locks para crearla una sola vez
+        self.active_conversations = TTLCache(
+            maxsize=settings.ACTIVE_CONVERSATION_CACHE_MAX_SIZE,
+            ttl=settings.ACTIVE_CONVERSATION_CACHE_TTL
         )
+        self._conversation_locks: "weakref.WeakValueDictionary[Tuple[str, str], asyncio.Lock]" = weakref.WeakValueDictionary()
+    
+    @property
+    def client(self) -> PooledPostgrestClient:
+        """Cliente de PostgREST, creado en el primer uso."""
+        return get_supabase_client()
     
-    async def get_client(self, client_id: str) -> Optional[Dict[str, Any]]:
-        """Obtiene información de un cliente."""
+    @instrumented("supabase")
+    async def ping(self) -> None:
+        """Consulta mínima para abrir las conexiones del pool antes de la primera petición."""
+        await self.client.table("business_details").select("id").limit(1).execute()
+    
+    @instrumented("supabase")
+    async def get_client(self, client_id: str, strict: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene información de un cliente.
+        Con `strict` los errores se propagan en lugar de devolver None.
+        """
+        cached = self.cache.get(("client", client_id), MISSING)
+        if cached is not MISSING:
+            return cached
+        
         try:
-            response = self.client.table("business_details").select("*").eq("id", client_id).single().execute()
-            return response.data
+            response = await self.client.table("business_details").select("*").eq("id", client_id).limit(1).execute()
         except Exception as e:
             logger.error(f"Error al obtener cliente {client_id}: {str(e)}")
+            if strict:
+                raise
             return None
+        
+        # Los IDs inexistentes también se cachean, con un TTL más corto
+        client = response.data[0] if response.data else None
+        self.cache.set(("client", client_id), client, ttl=None if client else self.negative_ttl)
+        return client
     
-    async def get_business_info(self, client_id: str) -> List[Dict[str, Any]]:
-        """Obtiene la información del negocio."""
+    @instrumented("supabase")
+    async def get_business_info(self, client_id: str, strict: bool = False) -> List[Dict[str, Any]]:
+        """
+        Obtiene la información del negocio.
+        Con `strict` los errores se propagan en lugar de devolver [].
+        """
+        cached = self.cache.get(("business_info", client_id), MISSING)
+        if cached is not MISSING:
+            return cached
+        
         try:
-            response = self.client.table("business_info").select("*").eq("client_id", client_id).execute()
-            return response.data
+            response = await self.client.table("business_info").select("*").eq("client_id", client_id).execute()
         except Exception as e:
             logger.error(f"Error al obtener business_info para {client_id}: {str(e)}")
+            if strict:
+                raise
             return []
+        
+        self.cache.set(("business_info", client_id), response.data)
+        return response.data
     
-    async def get_business_documents(self, client_id: str) -> List[Dict[str, Any]]:
-        """Obtiene los documentos del negocio."""
+    @instrumented("supabase")
+    async def get_business_documents(self, client_id: str, strict: bool = False) -> List[Dict[str, Any]]:
+        """
+        Obtiene los documentos del negocio.
+        Con `strict` los errores se propagan en lugar de devolver [].
+        """
+        cached = self.cache.get(("business_documents", client_id), MISSING)
+        if cached is not MISSING:
+            return cached
+        
         try:
-            response = self.client.table("business_documents").select("*").eq("client_id", client_id).execute()
-            return response.data
+            response = await self.client.table("business_documents").select("*").eq("client_id", client_id).execute()
         except Exception as e:
             logger.error(f"Error al obtener business_documents para {client_id}: {str(e)}")
+            if strict:
+                raise
             return []
+        
+        self.cache.set(("business_documents", client_id), response.data)
+        return response.data
+    
+    def invalidate_client(self, client_id: str) -> None:
+        """Descarta los datos cacheados de un cliente (p. ej. al reentrenar)."""
+        for kind in ("client", "business_info", "business_documents"):
+            self.cache.pop((kind, client_id))
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Contadores de la caché de clientes."""
+        return self.cache.stats()
     
+    def active_conversation_stats(self) -> Dict[str, Any]:
+        """Contadores de la caché de conversaciones activas."""
+        return self.active_conversations.stats()
+    
+    @instrumented("supabase")
     async def save_message(self, conversation_id: str, role: str, content: str) -> Optional[Dict[str, Any]]:
         """Guarda un mensaje en la conversación."""
         try:
@@ -48,12 +132,33 @@ class SupabaseService:
                 "role": role,
                 "content": content
             }
-            response = self.client.table("messages").insert(data).execute()
+            response = await self.client.table("messages").insert(data).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Error al guardar mensaje: {str(e)}")
             return None
     
+    @instrumented("supabase")
+    async def save_messages(self, messages: List[Dict[str, Any]], ignore_existing: bool = False) -> List[Dict[str, Any]]:
+        """
+        Guarda varios mensajes en una sola inserción.
+        A diferencia de save_message, los errores se propagan.
+        
+        Con `ignore_existing` se omiten los mensajes cuyo id ya está guardado
+        (p. ej. al reintentar un lote que llegó a escribirse).
+        """
+        try:
+            table = self.client.table("messages")
+            if ignore_existing:
+                response = await table.upsert(messages, ignore_duplicates=True, on_conflict="id").execute()
+            else:
+                response = await table.insert(messages).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error al guardar {len(messages)} mensajes: {str(e)}")
+            raise
+    
+    @instrumented("supabase")
     async def create_conversation(self, client_id: str, role: str) -> Optional[Dict[str, Any]]:
         """Crea una nueva conversación."""
         try:
@@ -62,47 +167,392 @@ class SupabaseService:
                 "role": role,
                 "status": "active"
             }
-            response = self.client.table("conversations").insert(data).execute()
+            response = await self.client.table("conversations").insert(data).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Error al crear conversación: {str(e)}")
             return None
     
+    @instrumented("supabase")
+    async def get_active_conversation(self, client_id: str, role: str) -> Optional[Dict[str, Any]]:
+        """Obtiene la conversación activa de un cliente para un rol."""
+        response = await (
+            self.client.table("conversations")
+            .select("*")
+            .eq("client_id", client_id)
+            .eq("role", role)
+            .eq("status", "active")
+            .order("created_at", desc=True)
+            .limit(1)
+            .execute()
+        )
+        return response.data[0] if response.data else None
+    
+    async def get_or_create_active_conversation(self, client_id: str, role: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene la conversación activa del cliente para el rol o la crea.
+        
+        Dentro del proceso un lock por (client_id, rol) evita crearla dos veces;
+        entre workers lo evita el índice único parcial sobre
+        conversations(client_id, role) where status = 'active': si la
+        inserción falla se relee la conversación creada por el otro worker.
+        """
+        key = (client_id, role)
+        conversation = self.active_conversations.get(key)
+        if conversation:
+            return conversation
+        
+        lock = self._conversation_locks.get(key)
+        if lock is None:
+            lock = self._conversation_locks[key] = asyncio.Lock()
+        
+        async with lock:
+            conversation = self.active_conversations.get(key)
+            if conversation:
+                return conversation
+            
+            try:
+                conversation = await self.get_active_conversation(client_id, role)
+                if not conversation:
+                    conversation = await self.create_conversation(client_id, role)
+                if not conversation:
+                    conversation = await self.get_active_conversation(client_id, role)
+            except Exception as e:
+                logger.error(f"Error al obtener conversación activa para {client_id}/{role}: {str(e)}")
+                return None
+            
+            if conversation:
+                self.active_conversations.set(key, conversation)
+            return conversation
+    
+    @instrumented("supabase")
+    async def set_conversation_thread(self, conversation: Dict[str, Any], thread_id: str) -> None:
+        """Asocia un thread de OpenAI a la conversación y actualiza la caché."""
+        try:
+            await (
+                self.client.table("conversations")
+                .update({"thread_id": thread_id})
+                .eq("id", conversation["id"])
+                .execute()
+            )
+        except Exception as e:
+            logger.error(f"Error al guardar thread de la conversación {conversation['id']}: {str(e)}")
+            return
+        
+        key = (conversation["client_id"], conversation["role"])
+        cached = self.active_conversations.get(key)
+        if cached and cached["id"] == conversation["id"]:
+            self.active_conversations.set(key, {**cached, "thread_id": thread_id})
+    
+    def invalidate_active_conversation(self, client_id: str, role: str) -> None:
+        """Descarta la conversación activa cacheada (p. ej. al cerrarla)."""
+        self.active_conversations.pop((client_id, role))
+    
+    @instrumented("supabase")
     async def get_conversations(self, client_id: str) -> List[Dict[str, Any]]:
-        """Obtiene las conversaciones de un cliente."""
+        """
+        Obtiene las conversaciones de un cliente.
+        Los errores se propagan para no confundirlos con una lista vacía.
+        """
         try:
-            response = self.client.table("conversations").select("*").eq("client_id", client_id).execute()
+            response = await self.client.table("conversations").select("*").eq("client_id", client_id).execute()
             return response.data
         except Exception as e:
             logger.error(f"Error al obtener conversaciones para {client_id}: {str(e)}")
-            return []
+            raise
     
+    @instrumented("supabase")
     async def get_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
         """Obtiene los mensajes de una conversación."""
         try:
-            response = self.client.table("messages").select("*").eq("conversation_id", conversation_id).execute()
+            response = await self.client.table("messages").select("*").eq("conversation_id", conversation_id).execute()
             return response.data
         except Exception as e:
             logger.error(f"Error al obtener mensajes para conversación {conversation_id}: {str(e)}")
             return []
     
+    @instrumented("supabase")
+    async def get_messages_for_conversations(
+        self,
+        conversation_ids: List[str],
+        chunk_size: int = IN_QUERY_CHUNK_SIZE
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Obtiene los mensajes de varias conversaciones con consultas `in` por
+        lotes. Cada lote se lee en páginas de SUPABASE_MAX_ROWS filas, ya que
+        PostgREST recorta en silencio las respuestas más largas.
+        
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: conversation_id -> mensajes ordenados por fecha
+        """
+        page_size = get_settings().SUPABASE_MAX_ROWS
+        
+        async def fetch_chunk(chunk: List[str]) -> List[Dict[str, Any]]:
+            rows: List[Dict[str, Any]] = []
+            after = None
+            try:
+                while True:
+                    query = self.client.table("messages").select("*").in_("conversation_id", chunk)
+                    response = await _after(query, after).order("created_at,id").limit(page_size).execute()
+                    rows.extend(response.data)
+                    if len(response.data) < page_size:
+                        return rows
+                    after = (rows[-1]["created_at"], rows[-1]["id"])
+            except Exception as e:
+                logger.error(f"Error al obtener mensajes para {len(chunk)} conversaciones: {str(e)}")
+                raise
+        
+        # Los lotes se piden en paralelo sobre el pool de conexiones
+        chunks = [conversation_ids[i:i + chunk_size] for i in range(0, len(conversation_ids), chunk_size)]
+        results = await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks))
+        
+        grouped: Dict[str, List[Dict[str, Any]]] = {conversation_id: [] for conversation_id in conversation_ids}
+        for rows in results:
+            for message in rows:
+                grouped.setdefault(message["conversation_id"], []).append(message)
+        return grouped
+    
+    @instrumented("supabase")
+    async def get_recent_messages(self, conversation_id: str, limit: int) -> List[Dict[str, Any]]:
+        """Obtiene los últimos mensajes de una conversación en orden cronológico."""
+        try:
+            response = await (
+                self.client.table("messages")
+                .select("*")
+                .eq("conversation_id", conversation_id)
+                .order("created_at", desc=True)
+                .limit(limit)
+                .execute()
+            )
+            return list(reversed(response.data))
+        except Exception as e:
+            logger.error(f"Error al obtener mensajes recientes para conversación {conversation_id}: {str(e)}")
+            return []
+    
+    @instrumented("supabase")
     async def get_leads(self, client_id: str) -> List[Dict[str, Any]]:
-        """Obtiene los leads capturados."""
+        """
+        Obtiene los leads capturados.
+        Los errores se propagan para no confundirlos con una lista vacía.
+        """
         try:
-            response = self.client.table("captured_leads").select("*").eq("client_id", client_id).execute()
+            response = await self.client.table("captured_leads").select("*").eq("client_id", client_id).execute()
             return response.data
         except Exception as e:
             logger.error(f"Error al obtener leads para {client_id}: {str(e)}")
-            return []
+            raise
     
+    @instrumented("supabase")
     async def get_tickets(self, client_id: str) -> List[Dict[str, Any]]:
-        """Obtiene los tickets de soporte."""
+        """
+        Obtiene los tickets de soporte.
+        Los errores se propagan para no confundirlos con una lista vacía.
+        """
         try:
-            response = self.client.table("support_tickets").select("*").eq("client_id", client_id).execute()
+            response = await self.client.table("support_tickets").select("*").eq("client_id", client_id).execute()
             return response.data
         except Exception as e:
             logger.error(f"Error al obtener tickets para {client_id}: {str(e)}")
+            raise
+    
+    @instrumented("supabase")
+    async def get_assistant_record(self, client_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene el assistant registrado para un cliente.
+        Los errores se propagan: un fallo de lectura no equivale a que el
+        cliente no tenga assistant.
+        """
+        try:
+            response = await self.client.table("assistant_registry").select("*").eq("client_id", client_id).limit(1).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error al obtener assistant registrado para {client_id}: {str(e)}")
+            raise
+    
+    @instrumented("supabase")
+    async def get_assistant_records(self, limit: int) -> List[Dict[str, Any]]:
+        """Obtiene los assistants registrados más recientes."""
+        try:
+            response = await (
+                self.client.table("assistant_registry")
+                .select("*")
+                .order("updated_at", desc=True)
+                .limit(limit)
+                .execute()
+            )
+            return response.data
+        except Exception as e:
+            logger.error(f"Error al obtener assistants registrados: {str(e)}")
             return []
+    
+    @instrumented("supabase")
+    async def insert_assistant_record(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Registra el assistant de un cliente. Devuelve None si ya existía un registro."""
+        try:
+            response = await self.client.table("assistant_registry").insert(data).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.warning(f"No se pudo registrar assistant para {data.get('client_id')}: {str(e)}")
+            return None
+    
+    @instrumented("supabase")
+    async def update_assistant_record(
+        self,
+        client_id: str,
+        expected_version: int,
+        data: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Actualiza el registro solo si sigue en la versión esperada.
+        Devuelve None si otro proceso lo modificó antes.
+        """
+        try:
+            response = await (
+                self.client.table("assistant_registry")
+                .update(data)
+                .eq("client_id", client_id)
+                .eq("version", expected_version)
+                .execute()
+            )
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error al actualizar assistant registrado para {client_id}: {str(e)}")
+            return None
+    
+    @instrumented("supabase")
+    async def get_widget_thread(self, user_id: str, widget_id: str) -> Optional[Dict[str, Any]]:
+        """Obtiene el thread asociado a un usuario y widget."""
+        try:
+            response = await (
+                self.client.table("widget_threads")
+                .select("*")
+                .eq("user_id", user_id)
+                .eq("widget_id", widget_id)
+                .limit(1)
+                .execute()
+            )
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error al obtener thread para {user_id}/{widget_id}: {str(e)}")
+            return None
+    
+    @instrumented("supabase")
+    async def save_widget_thread(self, user_id: str, widget_id: str, thread_id: str) -> Optional[Dict[str, Any]]:
+        """Guarda o actualiza el thread asociado a un usuario y widget."""
+        try:
+            data = {
+                "user_id": user_id,
+                "widget_id": widget_id,
+                "thread_id": thread_id,
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }
+            response = await self.client.table("widget_threads").upsert(data, on_conflict="user_id,widget_id").execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error al guardar thread para {user_id}/{widget_id}: {str(e)}")
+            return None
+    
+    @instrumented("supabase")
+    async def get_thread_context(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """Obtiene el contexto compactado con el que se inició un thread."""
+        try:
+            response = await (
+                self.client.table("thread_contexts")
+                .select("*")
+                .eq("thread_id", thread_id)
+                .limit(1)
+                .execute()
+            )
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error al obtener contexto del thread {thread_id}: {str(e)}")
+            return None
+    
+    @instrumented("supabase")
+    async def get_thread_successor(self, source_thread_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene el contexto del thread al que se compactó `source_thread_id`.
+        Los errores se propagan: un fallo de lectura no equivale a que el
+        thread no se haya compactado.
+        """
+        try:
+            response = await (
+                self.client.table("thread_contexts")
+                .select("*")
+                .eq("source_thread_id", source_thread_id)
+                .limit(1)
+                .execute()
+            )
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error al obtener el thread compactado de {source_thread_id}: {str(e)}")
+            raise
+    
+    @instrumented("supabase")
+    async def save_thread_context(
+        self,
+        thread_id: str,
+        source_thread_id: str,
+        client_id: str,
+        policy: str,
+        context: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Guarda el contexto compactado de un thread nuevo y el thread del que
+        procede. Devuelve None si no se pudo guardar, p. ej. porque otro worker
+        ya compactó el mismo thread.
+        """
+        try:
+            data = {
+                "thread_id": thread_id,
+                "source_thread_id": source_thread_id,
+                "client_id": client_id,
+                "policy": policy,
+                "context": context,
+                "created_at": datetime.now(timezone.utc).isoformat()
+            }
+            response = await self.client.table("thread_contexts").insert(data).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error al guardar contexto del thread {thread_id}: {str(e)}")
+            return None
+    
+    async def _get_page(
+        self,
+        table: str,
+        client_id: str,
+        limit: int,
+        after: Optional[Tuple[str, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Obtiene una página de filas de un cliente ordenadas por (created_at, id),
+        empezando después de la posición `after` (paginación keyset).
+        
+        Solo este método hace la consulta, así que es el único que registra la
+        etapa; la operación lleva la tabla para distinguir leads, tickets y
+        conversaciones.
+        """
+        query = _after(self.client.table(table).select("*").eq("client_id", client_id), after)
+        try:
+            # Un solo parámetro order: PostgREST no combina varios y el desempate por id es necesario
+            with track_stage("supabase", f"get_{table}_page"):
+                response = await query.order("created_at,id").limit(limit).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error al obtener página de {table} para {client_id}: {str(e)}")
+            raise
+    
+    async def get_leads_page(self, client_id: str, limit: int, after: Optional[Tuple[str, str]] = None) -> List[Dict[str, Any]]:
+        """Obtiene una página de leads capturados."""
+        return await self._get_page("captured_leads", client_id, limit, after)
+    
+    async def get_tickets_page(self, client_id: str, limit: int, after: Optional[Tuple[str, str]] = None) -> List[Dict[str, Any]]:
+        """Obtiene una página de tickets de soporte."""
+        return await self._get_page("support_tickets", client_id, limit, after)
+    
+    async def get_conversations_page(self, client_id: str, limit: int, after: Optional[Tuple[str, str]] = None) -> List[Dict[str, Any]]:
+        """Obtiene una página de conversaciones."""
+        return await self._get_page("conversations", client_id, limit, after)
 
 # Instancia global para usar en toda la aplicación
 supabase_service = SupabaseService() 
\ No newline at end of file
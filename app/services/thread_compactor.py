@@ -0,0 +1,305 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from openai import AsyncOpenAI
+from app.core.cache import MISSING, TTLCache
+from app.core.config import get_settings
+from app.services.openai_client import get_openai_client
+from app.services.supabase_service import supabase_service
+
+logger = logging.getLogger(__name__)
+
+# Políticas de compactación
+POLICY_NONE = "none"
+POLICY_LAST_N = "last_n"
+POLICY_TOKEN_BUDGET = "token_budget"
+POLICY_SUMMARY = "summary"
+POLICIES = (POLICY_NONE, POLICY_LAST_N, POLICY_TOKEN_BUDGET, POLICY_SUMMARY)
+
+SUMMARY_PROMPT = (
+    "Resume la conversación entre un cliente y el asistente de un negocio. "
+    "Conserva los datos del cliente, lo que pidió, lo que se le respondió y "
+    "lo que quedó pendiente. Responde solo con el resumen, en el idioma de la conversación."
+)
+
+# Compactaciones encadenadas que se siguen como mucho para encontrar el thread vigente
+MAX_MOVES = 20
+
+def estimate_tokens(text: str) -> int:
+    """Estimación rápida de tokens (~4 caracteres por token)."""
+    return len(text) // 4 + 4
+
+def _format(messages: List[Tuple[str, str]]) -> str:
+    return "\n".join(f"{'Cliente' if role == 'user' else 'Asistente'}: {text}" for role, text in messages)
+
+class ThreadCompactor:
+    """
+    Limita el contexto que cada run vuelve a leer de un thread.
+    
+    Tras cada run se anota `usage.prompt_tokens`; si supera el umbral, antes
+    del siguiente turno la conversación pasa a un thread nuevo y vacío, y lo
+    que se conserva del anterior se envía en cada run como
+    `additional_instructions` (los threads de Assistants v1 solo admiten
+    mensajes de usuario, así que no se pueden copiar las respuestas):
+    
+    - last_n: los últimos COMPACTION_KEEP_MESSAGES mensajes
+    - token_budget: los mensajes más recientes que caben en COMPACTION_TOKEN_BUDGET
+    - summary: un resumen acumulado, regenerado en cada compactación a partir
+      del resumen anterior y de los mensajes del thread, más los últimos
+      COMPACTION_KEEP_MESSAGES mensajes
+    
+    El contexto se guarda en la tabla `thread_contexts` (thread_id y
+    source_thread_id únicos, client_id, policy, context, created_at) y se
+    cachea en memoria. La fila también marca el thread antiguo como
+    sustituido, de modo que cualquier worker sigue la conversación en el
+    thread nuevo; que un thread no se ha compactado se recuerda solo
+    `moved_ttl` segundos. El ahorro se mide por cliente comparando los prompt
+    tokens del último run del thread antiguo con los del primer run del nuevo.
+    """
+    def __init__(
+        self,
+        policy: str = POLICY_NONE,
+        prompt_tokens_threshold: int = 8000,
+        keep_messages: int = 10,
+        token_budget: int = 2000,
+        summary_model: str = "gpt-3.5-turbo",
+        max_messages: int = 200,
+        ttl: float = 3600.0,
+        maxsize: int = 10000,
+        moved_ttl: float = 10.0
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"COMPACTION_POLICY desconocida: {policy}")
+        self.policy = policy
+        self.prompt_tokens_threshold = prompt_tokens_threshold
+        self.keep_messages = keep_messages
+        self.token_budget = token_budget
+        self.summary_model = summary_model
+        self.max_messages = max_messages
+        self.moved_ttl = moved_ttl
+        # thread_id -> contexto ("" si el thread no tiene)
+        self._contexts = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Threads que superaron el umbral -> prompt tokens del último run
+        self._over_threshold = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Thread antiguo -> thread compactado ("" si no se ha compactado)
+        self._moved = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Thread nuevo -> (cliente, prompt tokens antes de compactar)
+        self._pending_savings = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._tenants: Dict[str, Dict[str, int]] = {}
+    
+    @property
+    def client(self) -> AsyncOpenAI:
+        return get_openai_client()
+    
+    @property
+    def enabled(self) -> bool:
+        return self.policy != POLICY_NONE
+    
+    async def current(self, thread_id: str) -> str:
+        """
+        Thread vigente: el compactado si el thread ya se sustituyó, lo haya
+        hecho este worker u otro.
+        """
+        if not self.enabled:
+            return thread_id
+        for _ in range(MAX_MOVES):
+            successor = await self._successor(thread_id)
+            if not successor:
+                break
+            thread_id = successor
+        return thread_id
+    
+    async def _successor(self, thread_id: str) -> Optional[str]:
+        successor = self._moved.get(thread_id, MISSING)
+        if successor is MISSING:
+            try:
+                record = await supabase_service.get_thread_successor(thread_id)
+            except Exception:
+                # Sin poder consultarlo se sigue en el thread conocido
+                return None
+            successor = record["thread_id"] if record else ""
+            self._moved.set(thread_id, successor, ttl=None if successor else self.moved_ttl)
+            if record:
+                self._contexts.set(successor, record["context"])
+        return successor or None
+    
+    async def prepare(self, thread_id: str, tenant: str) -> Tuple[str, Optional[str]]:
+        """
+        Devuelve el thread en el que debe ejecutarse el siguiente turno y las
+        instrucciones adicionales para sus runs, compactando si hace falta.
+        
+        Returns:
+            Tuple[str, Optional[str]]: (thread_id, additional_instructions)
+        """
+        if not self.enabled:
+            return thread_id, None
+        
+        thread_id = await self.current(thread_id)
+        before = self._over_threshold.pop(thread_id)
+        if before is not None:
+            try:
+                return await self._compact(thread_id, tenant, before)
+            except Exception as e:
+                # Si falla se sigue en el thread actual; se reintentará tras el próximo run
+                logger.error(f"Error al compactar thread {thread_id}: {str(e)}")
+        return thread_id, await self._context(thread_id)
+    
+    def observe(self, thread_id: str, tenant: str, run: Any) -> None:
+        """Anota el tamaño del prompt del run recién terminado."""
+        if not self.enabled:
+            return
+        usage = getattr(run, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        if prompt_tokens is None:
+            return
+        
+        pending = self._pending_savings.pop(thread_id)
+        if pending is not None:
+            client_id, before = pending
+            stats = self._tenant(client_id)
+            stats["prompt_tokens_before"] += before
+            stats["prompt_tokens_after"] += prompt_tokens
+            stats["tokens_saved"] += max(before - prompt_tokens, 0)
+        
+        if prompt_tokens >= self.prompt_tokens_threshold:
+            self._over_threshold.set(thread_id, prompt_tokens)
+    
+    async def _context(self, thread_id: str) -> Optional[str]:
+        context = self._contexts.get(thread_id, MISSING)
+        if context is MISSING:
+            record = await supabase_service.get_thread_context(thread_id)
+            context = record["context"] if record else ""
+            self._contexts.set(thread_id, context)
+        return context or None
+    
+    async def _compact(self, thread_id: str, tenant: str, before: int) -> Tuple[str, Optional[str]]:
+        messages = await self._read_messages(thread_id)
+        if self.policy == POLICY_LAST_N:
+            context = "Mensajes anteriores de la conversación:\n" + _format(self._split(messages)[1])
+        elif self.policy == POLICY_TOKEN_BUDGET:
+            context = "Mensajes anteriores de la conversación:\n" + _format(self._fit_budget(messages))
+        else:
+            context = await self._summarize(thread_id, messages)
+        
+        thread = await self.client.beta.threads.create()
+        saved = await supabase_service.save_thread_context(thread.id, thread_id, tenant, self.policy, context)
+        if not saved:
+            # Otro worker pudo compactar el mismo thread a la vez: se sigue en el suyo
+            winner = await self._winner(thread_id, thread.id)
+            if winner:
+                return winner
+        self._contexts.set(thread.id, context)
+        self._moved.set(thread_id, thread.id)
+        self._pending_savings.set(thread.id, (tenant, before))
+        self._tenant(tenant)["compactions"] += 1
+        logger.info(
+            f"Thread {thread_id} de {tenant} compactado en {thread.id} "
+            f"({self.policy}, {before} prompt tokens, contexto de ~{estimate_tokens(context)})"
+        )
+        return thread.id, context
+    
+    async def _winner(self, thread_id: str, own_thread_id: str) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Si otro worker ya guardó la compactación de `thread_id`, descarta el
+        thread propio y devuelve (thread_id, additional_instructions) del suyo.
+        """
+        try:
+            record = await supabase_service.get_thread_successor(thread_id)
+        except Exception:
+            return None
+        if not record or record["thread_id"] == own_thread_id:
+            return None
+        try:
+            await self.client.beta.threads.delete(own_thread_id)
+        except Exception as e:
+            logger.warning(f"No se pudo eliminar thread {own_thread_id}: {str(e)}")
+        self._moved.set(thread_id, record["thread_id"])
+        self._contexts.set(record["thread_id"], record["context"])
+        logger.info(f"Thread {thread_id} ya compactado por otro worker en {record['thread_id']}")
+        return record["thread_id"], record["context"] or None
+    
+    async def _read_messages(self, thread_id: str) -> List[Tuple[str, str]]:
+        """Lee los mensajes del thread (como mucho max_messages) en orden cronológico."""
+        limit = self.keep_messages if self.policy == POLICY_LAST_N else self.max_messages
+        messages: List[Tuple[str, str]] = []
+        async for message in self.client.beta.threads.messages.list(
+            thread_id=thread_id,
+            order="desc",
+            limit=min(limit, 100)
+        ):
+            text = "".join(block.text.value for block in message.content if block.type == "text")
+            messages.append((message.role, text))
+            if len(messages) >= limit:
+                break
+        messages.reverse()
+        return messages
+    
+    def _split(self, messages: List[Tuple[str, str]]) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+        """Separa los mensajes en (anteriores, últimos keep_messages)."""
+        cut = max(len(messages) - self.keep_messages, 0)
+        return messages[:cut], messages[cut:]
+    
+    def _fit_budget(self, messages: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        kept: List[Tuple[str, str]] = []
+        used = 0
+        for role, text in reversed(messages):
+            used += estimate_tokens(text)
+            if used > self.token_budget:
+                break
+            kept.append((role, text))
+        kept.reverse()
+        return kept
+    
+    async def _summarize(self, thread_id: str, messages: List[Tuple[str, str]]) -> str:
+        older, recent = self._split(messages)
+        previous = await self._context(thread_id)
+        
+        summary = ""
+        if older or previous:
+            source = _format(older)
+            if previous:
+                source = f"{previous}\n\n{source}"
+            completion = await self.client.chat.completions.create(
+                model=self.summary_model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": source}
+                ]
+            )
+            summary = completion.choices[0].message.content or ""
+        
+        context = f"Resumen de la conversación hasta ahora:\n{summary}" if summary else ""
+        if recent:
+            context += ("\n\n" if context else "") + "Últimos mensajes:\n" + _format(recent)
+        return context
+    
+    def _tenant(self, client_id: str) -> Dict[str, int]:
+        if client_id not in self._tenants:
+            self._tenants[client_id] = {
+                "compactions": 0,
+                "prompt_tokens_before": 0,
+                "prompt_tokens_after": 0,
+                "tokens_saved": 0
+            }
+        return self._tenants[client_id]
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "compactions": sum(t["compactions"] for t in self._tenants.values()),
+            "tokens_saved": sum(t["tokens_saved"] for t in self._tenants.values()),
+            "pending": len(self._over_threshold),
+            "tenants": self._tenants
+        }
+
+# Instancia global para usar en toda la aplicación
+thread_compactor = ThreadCompactor(
+    policy=get_settings().COMPACTION_POLICY,
+    prompt_tokens_threshold=get_settings().COMPACTION_PROMPT_TOKENS,
+    keep_messages=get_settings().COMPACTION_KEEP_MESSAGES,
+    token_budget=get_settings().COMPACTION_TOKEN_BUDGET,
+    summary_model=get_settings().COMPACTION_SUMMARY_MODEL,
+    max_messages=get_settings().COMPACTION_MAX_MESSAGES,
+    ttl=get_settings().COMPACTION_CACHE_TTL,
+    maxsize=get_settings().COMPACTION_CACHE_MAX_SIZE,
+    moved_ttl=get_settings().COMPACTION_MOVED_TTL
+)
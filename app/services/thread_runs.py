@@ -0,0 +1,127 @@
+import heapq
+import asyncio
+import logging
+import contextvars
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Ejecuta un run con los mensajes indicados y devuelve su respuesta
+RunExecutor = Callable[[List[str]], Awaitable[Dict[str, Any]]]
+
+class _ThreadState:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending: List[Tuple[str, asyncio.Future, RunExecutor]] = []
+        self.task: "asyncio.Task | None" = None
+        # Quienes tienen o esperan el candado; mientras haya alguno el estado no se borra
+        self.users = 0
+
+class ThreadRunCoordinator:
+    """
+    Serializa los runs de cada thread de OpenAI, que no admite un run nuevo
+    mientras otro está activo.
+    
+    Los mensajes que llegan mientras un run está en curso se acumulan y se
+    responden juntos con un único run posterior. La clave es la conversación
+    y no el thread: la compactación la mueve a un thread nuevo y los turnos
+    de antes y de después deben seguir compartiendo la misma cola.
+    """
+    def __init__(self):
+        self._threads: Dict[str, _ThreadState] = {}
+        self.runs = 0
+        self.coalesced = 0
+        self.max_depth = 0
+    
+    def _state(self, key: str) -> _ThreadState:
+        state = self._threads.get(key)
+        if state is None:
+            state = self._threads[key] = _ThreadState()
+        return state
+    
+    def _discard(self, key: str, state: _ThreadState) -> None:
+        """Olvida el estado de la clave si nadie lo usa, espera ni tiene mensajes pendientes."""
+        idle = state.task is None or state.task.done() or state.task is asyncio.current_task()
+        if state.users == 0 and not state.pending and idle and self._threads.get(key) is state:
+            del self._threads[key]
+    
+    async def submit(self, key: str, message: str, execute: RunExecutor) -> Dict[str, Any]:
+        """
+        Encola un mensaje de la conversación `key` y espera la respuesta del
+        run que lo incluya. Si el run respondió a varios mensajes, todos los
+        solicitantes reciben la misma respuesta con `batched=True`, y todos
+        salvo el último con `coalesced=True`.
+        """
+        state = self._state(key)
+        future = asyncio.get_running_loop().create_future()
+        state.pending.append((message, future, execute))
+        self.max_depth = max(self.max_depth, len(state.pending))
+        
+        # La tarea que vacía la cola es independiente de la petición que la
+        # lanzó, así que una desconexión no deja colgados a los demás. Se crea
+        # en un contexto vacío para no heredar la traza de esa petición.
+        if state.task is None or state.task.done():
+            state.task = asyncio.create_task(self._drain(key, state), context=contextvars.Context())
+        return await future
+    
+    async def _drain(self, key: str, state: _ThreadState) -> None:
+        try:
+            while state.pending:
+                state.users += 1
+                try:
+                    async with state.lock:
+                        batch, state.pending = state.pending, []
+                        # El último executor es el más reciente (p. ej. assistant recién reentrenado)
+                        execute = batch[-1][2]
+                        try:
+                            result = await execute([message for message, _, _ in batch])
+                        except Exception as e:
+                            for _, future, _ in batch:
+                                if not future.done():
+                                    future.set_exception(e)
+                            continue
+                        
+                        self.runs += 1
+                        self.coalesced += len(batch) - 1
+                        for i, (_, future, _) in enumerate(batch):
+                            if not future.done():
+                                future.set_result({
+                                **result,
+                                "coalesced": i < len(batch) - 1,
+                                "batched": len(batch) > 1
+                            })
+                finally:
+                    state.users -= 1
+        finally:
+            self._discard(key, state)
+    
+    @asynccontextmanager
+    async def lock(self, key: str) -> AsyncIterator[None]:
+        """Acceso exclusivo a la conversación (p. ej. para un run en streaming)."""
+        state = self._state(key)
+        state.users += 1
+        try:
+            async with state.lock:
+                yield
+        finally:
+            state.users -= 1
+            self._discard(key, state)
+    
+    def deepest(self, limit: int = 5) -> Dict[str, int]:
+        """Las `limit` conversaciones con más mensajes esperando run."""
+        depths = ((key, len(state.pending)) for key, state in self._threads.items() if state.pending)
+        return dict(heapq.nlargest(limit, depths, key=lambda item: item[1]))
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_threads": len(self._threads),
+            "queued_messages": sum(len(state.pending) for state in self._threads.values()),
+            "deepest": self.deepest(),
+            "max_depth": self.max_depth,
+            "runs": self.runs,
+            "coalesced": self.coalesced
+        }
+
+# Instancia global para usar en toda la aplicación
+thread_runs = ThreadRunCoordinator()
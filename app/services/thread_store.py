@@ -0,0 +1,115 @@
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+from app.services.supabase_service import supabase_service
+
+logger = logging.getLogger(__name__)
+
+class ThreadStore(ABC):
+    """
+    Interfaz del almacenamiento de threads de /chat, indexado por (user_id, widget_id).
+    """
+    @abstractmethod
+    async def get(self, user_id: str, widget_id: str) -> Optional[str]:
+        ...
+    
+    @abstractmethod
+    async def set(self, user_id: str, widget_id: str, thread_id: str) -> None:
+        ...
+    
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+class MemoryThreadStore(ThreadStore):
+    """
+    Threads en memoria del proceso, con TTL y tamaño máximo (LRU).
+    """
+    def __init__(self, ttl: float = 86400.0, maxsize: int = 10000):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+    
+    async def get(self, user_id: str, widget_id: str) -> Optional[str]:
+        return self.cache.get((user_id, widget_id))
+    
+    async def set(self, user_id: str, widget_id: str, thread_id: str) -> None:
+        self.cache.set((user_id, widget_id), thread_id)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", **self.cache.stats()}
+
+class SupabaseThreadStore(ThreadStore):
+    """
+    Threads persistidos en la tabla `widget_threads` (user_id, widget_id,
+    thread_id, updated_at; ver migrations/002_widget_threads.sql), visibles
+    para todos los workers y tras reinicios.
+    Un MemoryThreadStore local evita la consulta en los accesos repetidos.
+    """
+    def __init__(self, ttl: float = 86400.0, maxsize: int = 10000):
+        self.ttl = ttl
+        self.local = MemoryThreadStore(ttl=ttl, maxsize=maxsize)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+    
+    async def get(self, user_id: str, widget_id: str) -> Optional[str]:
+        thread_id = await self.local.get(user_id, widget_id)
+        if thread_id:
+            self.hits += 1
+            return thread_id
+        
+        record = await supabase_service.get_widget_thread(user_id, widget_id)
+        if not record:
+            self.misses += 1
+            return None
+        
+        if self._is_expired(record):
+            self.expired += 1
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        await self.local.set(user_id, widget_id, record["thread_id"])
+        return record["thread_id"]
+    
+    async def set(self, user_id: str, widget_id: str, thread_id: str) -> None:
+        await self.local.set(user_id, widget_id, thread_id)
+        await supabase_service.save_widget_thread(user_id, widget_id, thread_id)
+    
+    def _is_expired(self, record: Dict[str, Any]) -> bool:
+        updated_at = record.get("updated_at")
+        if not updated_at:
+            return False
+        try:
+            updated = datetime.fromisoformat(updated_at)
+        except (TypeError, ValueError):
+            return False
+        # Una fecha sin zona horaria se interpreta como UTC
+        if updated.tzinfo is None:
+            updated = updated.replace(tzinfo=timezone.utc)
+        return (datetime.now(timezone.utc) - updated).total_seconds() > self.ttl
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "supabase",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "local": self.local.stats()
+        }
+
+def create_thread_store() -> ThreadStore:
+    """Crea el almacenamiento de threads configurado en THREAD_STORE_BACKEND."""
+    settings = get_settings()
+    backends = {
+        "memory": MemoryThreadStore,
+        "supabase": SupabaseThreadStore
+    }
+    backend = backends.get(settings.THREAD_STORE_BACKEND)
+    if backend is None:
+        raise ValueError(f"THREAD_STORE_BACKEND desconocido: {settings.THREAD_STORE_BACKEND}")
+    return backend(ttl=settings.THREAD_STORE_TTL, maxsize=settings.THREAD_STORE_MAX_SIZE)
@@ -0,0 +1,189 @@
+import uuid
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from app.core.config import get_settings
+from app.core.rate_limit import TokenBucket
+from app.services.answer_cache import answer_cache
+from app.services.job_queue import (
+    Job,
+    JobQueue,
+    InMemoryJobQueue,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    JOB_FAILED
+)
+from app.services.openai_assistant import (
+    openai_assistant,
+    TRAIN_UNCHANGED,
+    TRAIN_UPDATED,
+    TRAIN_CREATED
+)
+from app.services.supabase_service import supabase_service
+
+logger = logging.getLogger(__name__)
+
+TRAIN_MESSAGES = {
+    TRAIN_UNCHANGED: "La información no cambió; el assistant ya estaba actualizado",
+    TRAIN_UPDATED: "Assistant reentrenado exitosamente",
+    TRAIN_CREATED: "Assistant creado exitosamente"
+}
+
+class TrainJobManager:
+    """
+    Reentrenamientos en segundo plano.
+    
+    Un pool de `workers` tareas consume la cola con un límite global de
+    `rate` reentrenamientos por segundo. Los jobs fallidos se reintentan
+    con backoff exponencial hasta `max_attempts` veces.
+    """
+    def __init__(
+        self,
+        queue: JobQueue,
+        workers: int = 4,
+        rate: float = 5.0,
+        max_attempts: int = 3,
+        retry_delay: float = 5.0
+    ):
+        self.queue = queue
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.limiter = TokenBucket(rate=rate, burst=workers)
+        self._tasks: List[asyncio.Task] = []
+    
+    async def submit(self, client_id: str, batch_id: Optional[str] = None) -> Job:
+        """Encola el reentrenamiento de un cliente."""
+        job = Job(
+            kind="train",
+            payload={"client_id": client_id},
+            batch_id=batch_id,
+            max_attempts=self.max_attempts
+        )
+        await self.queue.put(job)
+        return job
+    
+    async def submit_many(self, client_ids: List[str]) -> Dict[str, Any]:
+        """Encola el reentrenamiento de varios clientes como un lote."""
+        batch_id = uuid.uuid4().hex
+        jobs = [await self.submit(client_id, batch_id) for client_id in dict.fromkeys(client_ids)]
+        return {"batch_id": batch_id, "job_ids": [job.id for job in jobs]}
+    
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+    
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    async def _worker(self, number: int) -> None:
+        while True:
+            job = await self.queue.get()
+            await self.limiter.acquire()
+            try:
+                await self._run(job)
+            except Exception as e:
+                # Un error inesperado no debe tumbar el worker ni dejar el job en running
+                logger.error(f"Error inesperado en el reentrenamiento de {job.payload.get('client_id')}: {str(e)}")
+                await self._fail(job, "Error inesperado al reentrenar el assistant")
+    
+    async def _fail(self, job: Job, error: str) -> None:
+        job.status = JOB_FAILED
+        job.error = error
+        try:
+            await self.queue.save(job)
+        except Exception as e:
+            logger.error(f"No se pudo guardar el estado del job {job.id}: {str(e)}")
+    
+    async def _run(self, job: Job) -> None:
+        client_id = job.payload["client_id"]
+        job.status = JOB_RUNNING
+        job.attempts += 1
+        await self.queue.save(job)
+        
+        # Descartar datos cacheados para entrenar con la información actual
+        supabase_service.invalidate_client(client_id)
+        try:
+            client = await supabase_service.get_client(client_id, strict=True)
+        except Exception as e:
+            # Supabase no respondió: se reintenta como un fallo del reentrenamiento
+            logger.warning(f"No se pudo leer el cliente {client_id}: {str(e)}")
+            await self._retry(job, "Error al obtener el cliente")
+            return
+        if not client:
+            # Un cliente inexistente no se arregla reintentando
+            job.status = JOB_FAILED
+            job.error = "Cliente no encontrado"
+            await self.queue.save(job)
+            return
+        
+        status = await openai_assistant.train_assistant(client_id)
+        if status and status != TRAIN_UNCHANGED:
+            # Las respuestas cacheadas se generaron con las instrucciones anteriores
+            answer_cache.invalidate(client_id)
+        if status:
+            job.status = JOB_SUCCEEDED
+            job.error = None
+            job.result = {"success": True, "message": TRAIN_MESSAGES[status], "status": status}
+            await self.queue.save(job)
+            return
+        
+        await self._retry(job, "Error al reentrenar el assistant")
+    
+    async def _retry(self, job: Job, error: str) -> None:
+        """Reencola el job con backoff o lo marca como fallido si agotó los intentos."""
+        client_id = job.payload["client_id"]
+        job.error = error
+        if job.attempts >= job.max_attempts:
+            logger.error(f"Reentrenamiento de {client_id} fallido tras {job.attempts} intentos")
+            job.status = JOB_FAILED
+            await self.queue.save(job)
+            return
+        
+        delay = self.retry_delay * 2 ** (job.attempts - 1)
+        logger.warning(f"Reentrenamiento de {client_id} fallido; reintento {job.attempts + 1} en {delay:.0f}s")
+        await self.queue.put(job, delay=delay)
+    
+    async def batch_progress(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Resumen del estado de los jobs de un lote."""
+        jobs = await self.queue.get_batch(batch_id)
+        if not jobs:
+            return None
+        counts: Dict[str, int] = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        finished = counts.get(JOB_SUCCEEDED, 0) + counts.get(JOB_FAILED, 0)
+        return {
+            "batch_id": batch_id,
+            "total": len(jobs),
+            "counts": counts,
+            "done": finished == len(jobs),
+            "failed_client_ids": [job.payload["client_id"] for job in jobs if job.status == JOB_FAILED]
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": len(self._tasks), "queue_depth": self.queue.depth()}
+
+def create_job_queue() -> JobQueue:
+    """Crea la cola de jobs configurada en JOB_QUEUE_BACKEND."""
+    settings = get_settings()
+    backends = {
+        "memory": InMemoryJobQueue
+    }
+    backend = backends.get(settings.JOB_QUEUE_BACKEND)
+    if backend is None:
+        raise ValueError(f"JOB_QUEUE_BACKEND desconocido: {settings.JOB_QUEUE_BACKEND}")
+    return backend()
+
+# Instancia global para usar en toda la aplicación
+train_jobs = TrainJobManager(
+    create_job_queue(),
+    workers=get_settings().TRAIN_WORKERS,
+    rate=get_settings().TRAIN_RATE_LIMIT,
+    max_attempts=get_settings().TRAIN_MAX_ATTEMPTS,
+    retry_delay=get_settings().TRAIN_RETRY_DELAY
+)
@@ -0,0 +1,102 @@
+"""
+Mide GET /api/v1/conversations/{client_id} frente al número de
+conversaciones del cliente, contra el PostgREST falso.
+
+Para cada tamaño se siembra un cliente con ese número de conversaciones y se
+informa de las consultas a PostgREST por petición (frente a las N + 1 que
+haría cargar los mensajes conversación a conversación) y de la latencia.
+
+Uso:
+    python -m benchmarks.conversations --counts 10,100,500,2000 --db-latency 0.005
+"""
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from typing import Any, Dict, List
+import httpx
+from benchmarks.fake_openai import FakeOpenAI
+from benchmarks.fake_postgrest import FakePostgrest
+from benchmarks.run import backend_env, serve, start_backend, wait_ready
+from benchmarks.upstream import UpstreamProfile
+
+async def measure_count(
+    client: httpx.AsyncClient,
+    fake_postgrest: FakePostgrest,
+    conversations: int,
+    messages: int,
+    repeat: int
+) -> Dict[str, Any]:
+    client_id = fake_postgrest.seed(
+        clients=1,
+        rows_per_client=conversations,
+        messages_per_conversation=messages,
+        prefix=f"sweep-{conversations}"
+    )[0]
+    path = f"/api/v1/conversations/{client_id}"
+    
+    # La primera petición llena la caché de clientes; no se cuenta
+    (await client.get(path)).raise_for_status()
+    fake_postgrest.reset_calls()
+    
+    latencies: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+    
+    report = fake_postgrest.upstream.report()
+    return {
+        "conversations": conversations,
+        "messages": conversations * messages,
+        "round_trips": report["total"] / repeat,
+        "naive_round_trips": conversations + 1,
+        "latency_ms": {
+            "p50": round(statistics.median(latencies) * 1000, 2),
+            "max": round(max(latencies) * 1000, 2)
+        }
+    }
+
+async def main(args) -> Dict[str, Any]:
+    fake_openai = FakeOpenAI()
+    fake_postgrest = FakePostgrest(UpstreamProfile(args.db_latency))
+    servers = [
+        await serve(fake_openai.app, args.openai_port),
+        await serve(fake_postgrest.app, args.postgrest_port)
+    ]
+    backend = start_backend(args.port, backend_env(args.openai_port, args.postgrest_port))
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout) as client:
+            await wait_ready(client)
+            results = [
+                await measure_count(client, fake_postgrest, int(count), args.messages, args.repeat)
+                for count in args.counts.split(",")
+            ]
+    finally:
+        backend.terminate()
+        backend.wait()
+        for server, _ in servers:
+            server.should_exit = True
+        await asyncio.gather(*(task for _, task in servers))
+    
+    return {
+        "config": vars(args),
+        "results": results
+    }
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Latencia de /conversations según el número de conversaciones")
+    parser.add_argument("--counts", default="10,100,500,2000", help="Números de conversaciones separados por comas")
+    parser.add_argument("--messages", type=int, default=6, help="Mensajes por conversación")
+    parser.add_argument("--repeat", type=int, default=5, help="Peticiones medidas por tamaño")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--openai-port", type=int, default=8101)
+    parser.add_argument("--postgrest-port", type=int, default=8102)
+    parser.add_argument("--db-latency", type=float, default=0.005)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(main(parse_args())), indent=2))
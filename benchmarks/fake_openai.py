@@ -0,0 +1,280 @@
+import json
+import time
+import uuid
+import random
+import asyncio
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from benchmarks.upstream import Upstream, UpstreamProfile
+
+# Assistant compartido de /chat (ASSISTANT_ID del backend), que existe desde el arranque
+SHARED_ASSISTANT_ID = "asst_bench"
+
+REPLY = "Gracias por tu mensaje. Con gusto te ayudo con la información de nuestros productos."
+
+def _id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+def _usage() -> Dict[str, int]:
+    return {"prompt_tokens": 120, "completion_tokens": 30, "total_tokens": 150}
+
+class FakeOpenAI:
+    """
+    Servidor falso con el subconjunto de la API de OpenAI que usa el backend:
+    assistants, threads, messages, runs (con y sin streaming) y chat
+    completions.
+    
+    Los runs pasan a `completed` `run_duration` segundos después de crearse
+    (o a `failed` con probabilidad `run_failure_rate`), igual que los reales
+    vistos desde el sondeo. Como la API real, rechaza con un 400 crear un run
+    en un thread que ya tiene uno activo; esos rechazos se cuentan en
+    `run_conflicts`.
+    """
+    def __init__(
+        self,
+        profile: Optional[UpstreamProfile] = None,
+        run_duration: float = 1.0,
+        run_failure_rate: float = 0.0
+    ):
+        self.upstream = Upstream("openai", profile or UpstreamProfile())
+        self.run_duration = run_duration
+        self.run_failure_rate = run_failure_rate
+        self.assistants: Dict[str, Dict[str, Any]] = {
+            SHARED_ASSISTANT_ID: {
+                "id": SHARED_ASSISTANT_ID,
+                "object": "assistant",
+                "created_at": int(time.time()),
+                "name": "NNIA",
+                "model": "gpt-4-turbo-preview",
+                "instructions": "",
+                "tools": [],
+                "metadata": {}
+            }
+        }
+        self.threads: Dict[str, Dict[str, Any]] = {}
+        self.run_conflicts = 0
+        self.app = self._build_app()
+    
+    def _build_app(self) -> FastAPI:
+        router = APIRouter(prefix="/v1", dependencies=[Depends(self.upstream.handle)])
+        
+        @router.get("/models")
+        async def list_models():
+            return {"object": "list", "data": [{"id": "gpt-4-turbo-preview", "object": "model", "created": 0, "owned_by": "openai"}]}
+        
+        @router.post("/assistants")
+        async def create_assistant(request: Request):
+            body = await request.json()
+            assistant = {
+                "id": _id("asst"),
+                "object": "assistant",
+                "created_at": int(time.time()),
+                "tools": [],
+                "metadata": {},
+                **body
+            }
+            self.assistants[assistant["id"]] = assistant
+            return assistant
+        
+        @router.get("/assistants/{assistant_id}")
+        async def retrieve_assistant(assistant_id: str):
+            return self._assistant(assistant_id)
+        
+        @router.post("/assistants/{assistant_id}")
+        async def update_assistant(assistant_id: str, request: Request):
+            assistant = self._assistant(assistant_id)
+            assistant.update(await request.json())
+            return assistant
+        
+        @router.delete("/assistants/{assistant_id}")
+        async def delete_assistant(assistant_id: str):
+            self.assistants.pop(assistant_id, None)
+            return {"id": assistant_id, "object": "assistant.deleted", "deleted": True}
+        
+        @router.post("/threads")
+        async def create_thread():
+            thread = {"id": _id("thread"), "object": "thread", "created_at": int(time.time()), "metadata": {}}
+            self.threads[thread["id"]] = {"thread": thread, "messages": [], "runs": {}}
+            return thread
+        
+        @router.delete("/threads/{thread_id}")
+        async def delete_thread(thread_id: str):
+            self.threads.pop(thread_id, None)
+            return {"id": thread_id, "object": "thread.deleted", "deleted": True}
+        
+        @router.post("/threads/{thread_id}/messages")
+        async def create_message(thread_id: str, request: Request):
+            body = await request.json()
+            return self._add_message(thread_id, body.get("role", "user"), body.get("content", ""))
+        
+        @router.get("/threads/{thread_id}/messages")
+        async def list_messages(thread_id: str, order: str = "desc", limit: int = 20):
+            messages = list(self._thread(thread_id)["messages"])
+            if order == "desc":
+                messages.reverse()
+            data = messages[:limit]
+            return {
+                "object": "list",
+                "data": data,
+                "first_id": data[0]["id"] if data else None,
+                "last_id": data[-1]["id"] if data else None,
+                "has_more": len(messages) > limit
+            }
+        
+        @router.post("/threads/{thread_id}/runs")
+        async def create_run(thread_id: str, request: Request):
+            body = await request.json()
+            if body.get("assistant_id") not in self.assistants:
+                raise HTTPException(status_code=404, detail="No assistant found")
+            active = self._active_run(thread_id)
+            if active:
+                self.run_conflicts += 1
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Thread {thread_id} already has an active run {active['id']}."
+                )
+            run = self._new_run(thread_id, body["assistant_id"])
+            if body.get("stream"):
+                return StreamingResponse(self._stream_run(run), media_type="text/event-stream")
+            return run
+        
+        @router.get("/threads/{thread_id}/runs/{run_id}")
+        async def retrieve_run(thread_id: str, run_id: str):
+            run = self._thread(thread_id)["runs"].get(run_id)
+            if run is None:
+                raise HTTPException(status_code=404, detail="No run found")
+            return self._advance(run)
+        
+        @router.post("/chat/completions")
+        async def chat_completions(request: Request):
+            body = await request.json()
+            await asyncio.sleep(self.run_duration)
+            completion_id = _id("chatcmpl")
+            if body.get("stream"):
+                return StreamingResponse(self._stream_completion(completion_id, body), media_type="text/event-stream")
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", ""),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": REPLY},
+                    "finish_reason": "stop"
+                }],
+                "usage": _usage()
+            }
+        
+        app = FastAPI()
+        app.include_router(router)
+        return app
+    
+    def _assistant(self, assistant_id: str) -> Dict[str, Any]:
+        assistant = self.assistants.get(assistant_id)
+        if assistant is None:
+            raise HTTPException(status_code=404, detail="No assistant found")
+        return assistant
+    
+    def _thread(self, thread_id: str) -> Dict[str, Any]:
+        thread = self.threads.get(thread_id)
+        if thread is None:
+            raise HTTPException(status_code=404, detail="No thread found")
+        return thread
+    
+    def _add_message(self, thread_id: str, role: str, content: str, run_id: Optional[str] = None) -> Dict[str, Any]:
+        message = {
+            "id": _id("msg"),
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "role": role,
+            "status": "completed",
+            "content": [{"type": "text", "text": {"value": content, "annotations": []}}],
+            "assistant_id": None,
+            "run_id": run_id,
+            "attachments": [],
+            "metadata": {}
+        }
+        self._thread(thread_id)["messages"].append(message)
+        return message
+    
+    def _new_run(self, thread_id: str, assistant_id: str) -> Dict[str, Any]:
+        run = {
+            "id": _id("run"),
+            "object": "thread.run",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "assistant_id": assistant_id,
+            "status": "queued",
+            "model": self.assistants[assistant_id].get("model", ""),
+            "instructions": "",
+            "tools": [],
+            "metadata": {},
+            "last_error": None,
+            "completed_at": None,
+            "usage": None,
+            "_finishes_at": time.time() + self.run_duration,
+            "_fails": random.random() < self.run_failure_rate
+        }
+        self._thread(thread_id)["runs"][run["id"]] = run
+        return self._public(run)
+    
+    def _active_run(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        for run in self._thread(thread_id)["runs"].values():
+            if self._advance(run)["status"] in ("queued", "in_progress"):
+                return run
+        return None
+    
+    def _advance(self, run: Dict[str, Any]) -> Dict[str, Any]:
+        """Actualiza el estado del run según el tiempo transcurrido."""
+        if run["status"] in ("queued", "in_progress"):
+            if time.time() < run["_finishes_at"]:
+                run["status"] = "in_progress"
+            elif run["_fails"]:
+                run["status"] = "failed"
+                run["last_error"] = {"code": "server_error", "message": "Fallo inyectado"}
+            else:
+                run["status"] = "completed"
+                run["completed_at"] = int(run["_finishes_at"])
+                run["usage"] = _usage()
+                self._add_message(run["thread_id"], "assistant", REPLY, run["id"])
+        return self._public(run)
+    
+    @staticmethod
+    def _public(run: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in run.items() if not key.startswith("_")}
+    
+    async def _stream_run(self, run: Dict[str, Any]):
+        yield _sse("thread.run.created", run)
+        stored = self._thread(run["thread_id"])["runs"][run["id"]]
+        await asyncio.sleep(max(stored["_finishes_at"] - time.time(), 0))
+        if not stored["_fails"]:
+            for word in REPLY.split(" "):
+                yield _sse("thread.message.delta", {
+                    "id": run["id"],
+                    "object": "thread.message.delta",
+                    "delta": {"content": [{"index": 0, "type": "text", "text": {"value": word + " "}}]}
+                })
+        final = self._advance(stored)
+        yield _sse(f"thread.run.{final['status']}", final)
+        yield "event: done\ndata: [DONE]\n\n"
+    
+    async def _stream_completion(self, completion_id: str, body: Dict[str, Any]):
+        for word in REPLY.split(" "):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", ""),
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+    
+    def reset_calls(self) -> None:
+        self.upstream.reset()
+        self.run_conflicts = 0
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,231 @@
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request
+from benchmarks.upstream import Upstream, UpstreamProfile
+
+Row = Dict[str, Any]
+Predicate = Callable[[Row], bool]
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+def _compare(op: str, value: str) -> Callable[[Any], bool]:
+    if op == "in":
+        options = {_unquote(item) for item in value.strip("()").split(",")}
+        return lambda field: field is not None and str(field) in options
+    if op == "is":
+        expected = {"null": None, "true": True, "false": False}[value]
+        return lambda field: field is expected
+    value = _unquote(value)
+    operators = {
+        "eq": lambda field: field is not None and str(field) == value,
+        "neq": lambda field: field is None or str(field) != value,
+        "gt": lambda field: field is not None and str(field) > value,
+        "gte": lambda field: field is not None and str(field) >= value,
+        "lt": lambda field: field is not None and str(field) < value,
+        "lte": lambda field: field is not None and str(field) <= value
+    }
+    if op not in operators:
+        raise HTTPException(status_code=400, detail=f"Operador no soportado: {op}")
+    return operators[op]
+
+def _split_top_level(text: str) -> List[str]:
+    """Separa por comas que no estén entre paréntesis ni comillas."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    if current:
+        parts.append(current)
+    return parts
+
+def _logic(text: str) -> Predicate:
+    """Filtro de `or=(...)` / `and(...)` en la sintaxis de PostgREST."""
+    for name, combine in (("and", all), ("or", any)):
+        if text.startswith(f"{name}("):
+            predicates = [_logic(part) for part in _split_top_level(text[len(name) + 1:-1])]
+            return lambda row, predicates=predicates, combine=combine: combine(p(row) for p in predicates)
+    column, op, value = text.split(".", 2)
+    compare = _compare(op, value)
+    return lambda row: compare(row.get(column))
+
+def _filters(request: Request) -> List[Predicate]:
+    predicates = []
+    for key, value in request.query_params.multi_items():
+        if key in ("select", "order", "limit", "offset", "on_conflict", "columns"):
+            continue
+        if key in ("or", "and"):
+            predicates.append(_logic(f"{key}{value}"))
+            continue
+        op, _, operand = value.partition(".")
+        compare = _compare(op, operand)
+        predicates.append(lambda row, key=key, compare=compare: compare(row.get(key)))
+    return predicates
+
+def _order(request: Request) -> List[Tuple[str, bool]]:
+    # Como PostgREST, solo cuenta un parámetro order (columnas separadas por comas)
+    value = request.query_params.get("order")
+    order = []
+    for item in value.split(",") if value else []:
+        column, *modifiers = item.split(".")
+        order.append((column, "desc" in modifiers))
+    return order
+
+class FakePostgrest:
+    """
+    Servidor falso con el subconjunto de PostgREST que usa SupabaseService:
+    select con filtros eq/neq/gt/lt/in/is y or/and, order, limit, insert,
+    upsert (on_conflict) y update.
+    
+    Las tablas viven en memoria y se rellenan con `seed`. `inserts` cuenta
+    las peticiones de inserción recibidas por tabla. Como el max-rows de
+    Supabase, `max_rows` recorta en silencio las lecturas más largas.
+    """
+    def __init__(self, profile: Optional[UpstreamProfile] = None, max_rows: Optional[int] = None):
+        self.upstream = Upstream("postgrest", profile or UpstreamProfile())
+        self.max_rows = max_rows
+        self.tables: Dict[str, List[Row]] = {}
+        self.inserts: Counter = Counter()
+        self.app = self._build_app()
+    
+    def _build_app(self) -> FastAPI:
+        router = APIRouter(prefix="/rest/v1", dependencies=[Depends(self.upstream.handle)])
+        
+        @router.get("/{table}")
+        async def select(table: str, request: Request):
+            rows = self._match(table, request)
+            for column, desc in reversed(_order(request)):
+                rows.sort(key=lambda row: (row.get(column) is None, str(row.get(column))), reverse=desc)
+            offset = int(request.query_params.get("offset", 0))
+            limit = request.query_params.get("limit")
+            limits = [int(value) for value in (limit, self.max_rows) if value]
+            return rows[offset:offset + min(limits) if limits else None]
+        
+        @router.post("/{table}")
+        async def insert(table: str, request: Request):
+            body = await request.json()
+            rows = body if isinstance(body, list) else [body]
+            self.inserts[table] += 1
+            conflict = request.query_params.get("on_conflict")
+            prefer = request.headers.get("prefer", "")
+            if conflict and "ignore-duplicates" in prefer:
+                # Como PostgREST, las filas que ya existen se omiten y no se devuelven
+                columns = conflict.split(",")
+                existing = {tuple(row.get(column) for column in columns) for row in self.tables.get(table, [])}
+                rows = [row for row in rows if tuple(row.get(column) for column in columns) not in existing]
+                return [self._upsert(table, row, None) for row in rows]
+            merge = conflict and "merge-duplicates" in prefer
+            return [self._upsert(table, row, conflict.split(",") if merge else None) for row in rows]
+        
+        @router.patch("/{table}")
+        async def update(table: str, request: Request):
+            changes = await request.json()
+            rows = self._match(table, request)
+            for row in rows:
+                row.update(changes)
+            return rows
+        
+        app = FastAPI()
+        app.include_router(router)
+        return app
+    
+    def _match(self, table: str, request: Request) -> List[Row]:
+        predicates = _filters(request)
+        return [row for row in self.tables.get(table, []) if all(p(row) for p in predicates)]
+    
+    def _upsert(self, table: str, row: Row, conflict: Optional[List[str]]) -> Row:
+        rows = self.tables.setdefault(table, [])
+        if conflict:
+            for existing in rows:
+                if all(existing.get(column) == row.get(column) for column in conflict):
+                    existing.update(row)
+                    return existing
+        stored = {"id": str(uuid.uuid4()), "created_at": _now(), **row}
+        rows.append(stored)
+        return stored
+    
+    def seed(
+        self,
+        clients: int = 10,
+        rows_per_client: int = 50,
+        messages_per_conversation: int = 6,
+        prefix: str = "bench-client"
+    ) -> List[str]:
+        """
+        Crea clientes con su información de negocio, documentos, leads,
+        tickets y conversaciones con mensajes.
+        
+        Returns:
+            List[str]: IDs de los clientes creados
+        """
+        self.tables = {}
+        start = datetime.now(timezone.utc) - timedelta(days=30)
+        client_ids = []
+        for c in range(clients):
+            client_id = f"{prefix}-{c}"
+            client_ids.append(client_id)
+            self._upsert("business_details", {"id": client_id, "name": f"Negocio {c}", "lang": "es"}, None)
+            for i in range(3):
+                self._upsert("business_info", {
+                    "client_id": client_id,
+                    "title": f"Sección {i}",
+                    "content": "Horario de lunes a viernes de 9 a 18. Envíos a todo el país."
+                }, None)
+            for i in range(2):
+                self._upsert("business_documents", {
+                    "client_id": client_id,
+                    "title": f"Catálogo {i}",
+                    "summary": "Listado de productos y precios vigentes."
+                }, None)
+            for i in range(rows_per_client):
+                created_at = (start + timedelta(minutes=i)).isoformat()
+                self._upsert("captured_leads", {
+                    "client_id": client_id,
+                    "name": f"Lead {i}",
+                    "email": f"lead{i}@example.com",
+                    "phone": None,
+                    "status": "new",
+                    "created_at": created_at
+                }, None)
+                self._upsert("support_tickets", {
+                    "client_id": client_id,
+                    "title": f"Ticket {i}",
+                    "description": "No puedo acceder a mi cuenta.",
+                    "status": "open",
+                    "priority": "medium",
+                    "created_at": created_at
+                }, None)
+                conversation = self._upsert("conversations", {
+                    "client_id": client_id,
+                    "role": "soporte",
+                    "status": "closed",
+                    "created_at": created_at
+                }, None)
+                for m in range(messages_per_conversation):
+                    self._upsert("messages", {
+                        "conversation_id": conversation["id"],
+                        "role": "user" if m % 2 == 0 else "assistant",
+                        "content": f"Mensaje {m}",
+                        "created_at": (start + timedelta(minutes=i, seconds=m)).isoformat()
+                    }, None)
+        return client_ids
+    
+    def reset_calls(self) -> None:
+        self.upstream.reset()
+        self.inserts.clear()
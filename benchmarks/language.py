@@ -0,0 +1,117 @@
+"""
+Mide la detección de idioma de LanguageService.
+
+- cold_start: en un proceso nuevo, primera detección sin precargar los
+  perfiles de langdetect frente a `preload()` seguido de la primera
+  detección (mediana de `--repeat` procesos)
+- per_call: latencia por llamada ya cargados los perfiles, para el camino
+  rápido (saludos y textos cortos), textos repetidos (caché) y textos
+  nuevos, junto a `langdetect.detect` directo como referencia
+
+No necesita servicios externos. El resultado se imprime como JSON.
+
+Uso:
+    python -m benchmarks.language --calls 2000 --repeat 5
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import subprocess
+from typing import Any, Callable, Dict, List
+from langdetect import detect
+from app.services.language_service import LanguageService
+from benchmarks.run import QUESTIONS, _percentile
+
+COLD_SNIPPET = """
+import time, asyncio
+from app.services.language_service import LanguageService
+
+async def main():
+    service = LanguageService()
+    started = time.perf_counter()
+    if {preload}:
+        await service.preload()
+    preloaded = time.perf_counter()
+    await service.detect("¿Cuál es el horario de atención de la tienda?")
+    print(preloaded - started, time.perf_counter() - preloaded)
+
+asyncio.run(main())
+"""
+
+GREETINGS = ["Hola", "¡Buenos días!", "gracias", "Hello", "thanks!", "Bonjour", "ok"]
+
+def measure_cold(preload: bool, repeat: int) -> Dict[str, float]:
+    """Medianas de la precarga y de la primera detección en procesos nuevos."""
+    preloads: List[float] = []
+    firsts: List[float] = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_SNIPPET.format(preload=preload)],
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+        preload_s, first_s = output.strip().splitlines()[-1].split()
+        preloads.append(float(preload_s))
+        firsts.append(float(first_s))
+    return {
+        "preload_ms": round(statistics.median(preloads) * 1000, 2),
+        "first_detect_ms": round(statistics.median(firsts) * 1000, 2)
+    }
+
+def _summary(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "p50_us": round(_percentile(latencies, 50) * 1e6, 1),
+        "p95_us": round(_percentile(latencies, 95) * 1e6, 1),
+        "mean_us": round(statistics.fmean(latencies) * 1e6, 1)
+    }
+
+async def _time_calls(call: Callable[[str], Any], texts: List[str]) -> Dict[str, float]:
+    latencies: List[float] = []
+    for text in texts:
+        started = time.perf_counter()
+        result = call(text)
+        if asyncio.iscoroutine(result):
+            await result
+        latencies.append(time.perf_counter() - started)
+    return _summary(latencies)
+
+async def measure_per_call(calls: int) -> Dict[str, Any]:
+    service = LanguageService()
+    await service.preload()
+    # Textos distintos entre sí para que ninguno salga de la caché
+    fresh = [f"{QUESTIONS[i % len(QUESTIONS)]} pedido {i}" for i in range(calls)]
+    repeated = [QUESTIONS[i % len(QUESTIONS)] for i in range(calls)]
+    for text in QUESTIONS:
+        await service.detect(text)
+    
+    try:
+        return {
+            "fast_path": await _time_calls(service.detect, [GREETINGS[i % len(GREETINGS)] for i in range(calls)]),
+            "cached": await _time_calls(service.detect, repeated),
+            "uncached": await _time_calls(service.detect, fresh),
+            "langdetect_direct": await _time_calls(detect, [f"{text} directo" for text in fresh])
+        }
+    finally:
+        service.close()
+
+async def main(args) -> Dict[str, Any]:
+    return {
+        "cold_start": {
+            "without_preload": measure_cold(False, args.repeat),
+            "with_preload": measure_cold(True, args.repeat)
+        },
+        "per_call": await measure_per_call(args.calls)
+    }
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Latencia de la detección de idioma")
+    parser.add_argument("--calls", type=int, default=2000, help="Detecciones medidas por caso")
+    parser.add_argument("--repeat", type=int, default=5, help="Procesos para medir el arranque en frío")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(main(parse_args())), indent=2))
@@ -0,0 +1,261 @@
+"""
+Banco de pruebas de carga sin dependencias externas.
+
+Levanta servidores falsos de OpenAI y PostgREST en este proceso, arranca el
+backend con uvicorn en un subproceso apuntando a ellos y lanza cada escenario
+con la concurrencia indicada. El resultado se imprime como JSON.
+
+Uso:
+    python -m benchmarks.run --scenarios message,leads --concurrency 20 --requests 500
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import subprocess
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import httpx
+import uvicorn
+from benchmarks.fake_openai import SHARED_ASSISTANT_ID, FakeOpenAI
+from benchmarks.fake_postgrest import FakePostgrest
+from benchmarks.upstream import UpstreamProfile
+
+QUESTIONS = [
+    "¿Cuál es el horario de atención?",
+    "¿Hacen envíos a todo el país?",
+    "¿Qué métodos de pago aceptan?",
+    "Quiero hablar con un asesor",
+    "¿Tienen garantía los productos?"
+]
+
+Request = Tuple[str, str, Optional[Dict[str, Any]]]
+
+def _message(client_ids: List[str]) -> Request:
+    return "POST", "/api/v1/message", {
+        "client_id": random.choice(client_ids),
+        "role": random.choice(["ventas", "soporte"]),
+        "message": random.choice(QUESTIONS)
+    }
+
+def _train(client_ids: List[str]) -> Request:
+    return "POST", "/api/v1/train", {"client_id": random.choice(client_ids)}
+
+def _listing(resource: str) -> Callable[[List[str]], Request]:
+    def build(client_ids: List[str]) -> Request:
+        return "GET", f"/api/v1/{resource}/{random.choice(client_ids)}", None
+    return build
+
+SCENARIOS: Dict[str, Callable[[List[str]], Request]] = {
+    "message": _message,
+    "train": _train,
+    "leads": _listing("leads"),
+    "tickets": _listing("tickets"),
+    "conversations": _listing("conversations")
+}
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(percent / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+async def serve(app, port: int) -> Tuple[uvicorn.Server, asyncio.Task]:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    return server, task
+
+def backend_env(openai_port: int, postgrest_port: int, **overrides: str) -> Dict[str, str]:
+    """Variables de entorno que apuntan el backend a los servidores falsos."""
+    return {
+        **os.environ,
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+        "ASSISTANT_ID": SHARED_ASSISTANT_ID,
+        "SUPABASE_URL": f"http://127.0.0.1:{postgrest_port}",
+        "SUPABASE_KEY": "bench",
+        "SUPABASE_HTTP2": "false",
+        "DEBUG": "false",
+        **overrides
+    }
+
+def start_backend(port: int, env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        env=env
+    )
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30.0) -> float:
+    """Espera a que el backend responda y devuelve el tiempo que tardó."""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            response = await client.get("/")
+            if response.status_code == 200:
+                return time.perf_counter() - started
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.05)
+    raise RuntimeError("El backend no arrancó a tiempo")
+
+async def _settle_train_jobs(client: httpx.AsyncClient, job_ids: List[str], timeout: float = 120.0) -> None:
+    """Espera a que terminen los jobs de reentrenamiento encolados."""
+    deadline = time.perf_counter() + timeout
+    pending = set(job_ids)
+    while pending and time.perf_counter() < deadline:
+        for job_id in list(pending):
+            response = await client.get(f"/api/v1/train/jobs/{job_id}")
+            if response.status_code != 200 or response.json()["status"] in ("succeeded", "failed"):
+                pending.discard(job_id)
+        if pending:
+            await asyncio.sleep(0.2)
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    name: str,
+    client_ids: List[str],
+    concurrency: int,
+    total: int,
+    upstreams: Dict[str, Any]
+) -> Dict[str, Any]:
+    build = SCENARIOS[name]
+    for upstream in upstreams.values():
+        upstream.reset_calls()
+    
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    job_ids: List[str] = []
+    issued = 0
+    
+    async def worker():
+        nonlocal issued
+        while issued < total:
+            issued += 1
+            method, path, body = build(client_ids)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                statuses[str(response.status_code)] += 1
+                if name == "train" and response.status_code == 202:
+                    job_ids.append(response.json()["id"])
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    
+    settle_started = time.perf_counter()
+    if job_ids:
+        await _settle_train_jobs(client, job_ids)
+    settle = time.perf_counter() - settle_started
+    
+    ok = sum(count for status, count in statuses.items() if status.startswith("2"))
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "errors": len(latencies) - ok,
+        "status": dict(statuses),
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50) * 1000, 2),
+            "p95": round(_percentile(latencies, 95) * 1000, 2),
+            "p99": round(_percentile(latencies, 99) * 1000, 2),
+            "mean": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+            "max": round(max(latencies, default=0.0) * 1000, 2)
+        },
+        "settle_s": round(settle, 3),
+        "upstream": {key: upstream.upstream.report() for key, upstream in upstreams.items()}
+    }
+
+async def main(args) -> Dict[str, Any]:
+    fake_openai = FakeOpenAI(
+        UpstreamProfile(args.openai_latency, args.openai_jitter, args.openai_failure_rate),
+        run_duration=args.run_duration,
+        run_failure_rate=args.run_failure_rate
+    )
+    fake_postgrest = FakePostgrest(
+        UpstreamProfile(args.db_latency, args.db_jitter, args.db_failure_rate)
+    )
+    client_ids = fake_postgrest.seed(args.clients, args.rows)
+    upstreams = {"openai": fake_openai, "postgrest": fake_postgrest}
+    
+    servers = [
+        await serve(fake_openai.app, args.openai_port),
+        await serve(fake_postgrest.app, args.postgrest_port)
+    ]
+    backend = start_backend(args.port, backend_env(args.openai_port, args.postgrest_port))
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{args.port}",
+            timeout=args.timeout,
+            limits=limits
+        ) as client:
+            startup = await wait_ready(client)
+            results = []
+            for name in args.scenarios.split(","):
+                if args.warmup:
+                    await run_scenario(client, name, client_ids, args.concurrency, args.warmup, upstreams)
+                results.append(
+                    await run_scenario(client, name, client_ids, args.concurrency, args.requests, upstreams)
+                )
+    finally:
+        backend.terminate()
+        backend.wait()
+        for server, _ in servers:
+            server.should_exit = True
+        await asyncio.gather(*(task for _, task in servers))
+    
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "startup_s": round(startup, 3),
+        "results": results
+    }
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Banco de pruebas de carga del backend NNIA")
+    parser.add_argument("--scenarios", default="message,train,leads,tickets,conversations",
+                        help=f"Escenarios separados por comas: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por escenario")
+    parser.add_argument("--warmup", type=int, default=0, help="Peticiones de calentamiento por escenario")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--clients", type=int, default=10, help="Clientes sembrados en la base de datos falsa")
+    parser.add_argument("--rows", type=int, default=50, help="Leads, tickets y conversaciones por cliente")
+    parser.add_argument("--port", type=int, default=8100, help="Puerto del backend")
+    parser.add_argument("--openai-port", type=int, default=8101)
+    parser.add_argument("--postgrest-port", type=int, default=8102)
+    parser.add_argument("--openai-latency", type=float, default=0.05)
+    parser.add_argument("--openai-jitter", type=float, default=0.02)
+    parser.add_argument("--openai-failure-rate", type=float, default=0.0)
+    parser.add_argument("--run-duration", type=float, default=1.0, help="Segundos hasta que un run termina")
+    parser.add_argument("--run-failure-rate", type=float, default=0.0)
+    parser.add_argument("--db-latency", type=float, default=0.01)
+    parser.add_argument("--db-jitter", type=float, default=0.005)
+    parser.add_argument("--db-failure-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Fichero donde guardar el JSON (por defecto, stdout)")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
@@ -0,0 +1,109 @@
+"""
+Mide el arranque en frío del backend contra los servidores falsos.
+
+- import_s: tiempo de `import app.main` en un proceso nuevo (mediana)
+- ready_s: desde lanzar uvicorn hasta que GET / responde
+- first_response_s / second_response_s: latencia de las dos primeras
+  peticiones a /api/v1/message
+
+Se mide sin y con precalentamiento (PREWARM_CONNECTIONS,
+PREWARM_ASSISTANT_REGISTRY). El resultado se imprime como JSON.
+
+Uso:
+    python -m benchmarks.startup --repeat 5
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import subprocess
+from typing import Any, Dict, List
+import httpx
+from benchmarks.fake_openai import FakeOpenAI
+from benchmarks.fake_postgrest import FakePostgrest
+from benchmarks.run import backend_env, serve, start_backend, wait_ready
+from benchmarks.upstream import UpstreamProfile
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - started)"
+)
+
+PREWARM = {"PREWARM_CONNECTIONS": "true", "PREWARM_ASSISTANT_REGISTRY": "100"}
+
+def measure_import(env: Dict[str, str], repeat: int) -> float:
+    """Mediana del tiempo de importación de app.main en procesos nuevos."""
+    samples: List[float] = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+async def measure_start(env: Dict[str, str], port: int, client_id: str) -> Dict[str, float]:
+    started = time.perf_counter()
+    backend = start_backend(port, env)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60.0) as client:
+            await wait_ready(client)
+            ready = time.perf_counter() - started
+            latencies = []
+            for _ in range(2):
+                request_started = time.perf_counter()
+                response = await client.post("/api/v1/message", json={
+                    "client_id": client_id,
+                    "role": "ventas",
+                    "message": "¿Cuál es el horario de atención?"
+                })
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - request_started)
+            stats = (await client.get("/api/v1/stats")).json().get("startup", {})
+    finally:
+        backend.terminate()
+        backend.wait()
+    return {
+        "ready_s": round(ready, 3),
+        "startup_s": stats.get("startup_s"),
+        "first_response_s": round(latencies[0], 3),
+        "second_response_s": round(latencies[1], 3)
+    }
+
+async def main(args) -> Dict[str, Any]:
+    fake_openai = FakeOpenAI(UpstreamProfile(args.openai_latency), run_duration=args.run_duration)
+    fake_postgrest = FakePostgrest(UpstreamProfile(args.db_latency))
+    client_ids = fake_postgrest.seed(clients=1, rows_per_client=1)
+    servers = [
+        await serve(fake_openai.app, args.openai_port),
+        await serve(fake_postgrest.app, args.postgrest_port)
+    ]
+    try:
+        env = backend_env(args.openai_port, args.postgrest_port)
+        report: Dict[str, Any] = {"import_s": round(measure_import(env, args.repeat), 3)}
+        for name, overrides in (("cold", {}), ("prewarmed", PREWARM)):
+            report[name] = await measure_start({**env, **overrides}, args.port, client_ids[0])
+        return report
+    finally:
+        for server, _ in servers:
+            server.should_exit = True
+        await asyncio.gather(*(task for _, task in servers))
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Tiempos de arranque del backend NNIA")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones de la medida de importación")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--openai-port", type=int, default=8101)
+    parser.add_argument("--postgrest-port", type=int, default=8102)
+    parser.add_argument("--openai-latency", type=float, default=0.05)
+    parser.add_argument("--db-latency", type=float, default=0.01)
+    parser.add_argument("--run-duration", type=float, default=0.5)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(main(parse_args())), indent=2))
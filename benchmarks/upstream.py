@@ -0,0 +1,52 @@
+import random
+import asyncio
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict
+from fastapi import HTTPException, Request
+
+@dataclass
+class UpstreamProfile:
+    """
+    Comportamiento simulado de un servicio externo.
+    
+    - latency / jitter: retardo de cada llamada (segundos), uniforme en
+      [latency, latency + jitter]
+    - failure_rate: probabilidad de responder con un error 500
+    """
+    latency: float = 0.0
+    jitter: float = 0.0
+    failure_rate: float = 0.0
+
+class Upstream:
+    """Estado común de los servidores falsos: perfil y contador de llamadas."""
+    def __init__(self, name: str, profile: UpstreamProfile):
+        self.name = name
+        self.profile = profile
+        self.calls: Counter = Counter()
+        self.failures: Counter = Counter()
+    
+    async def handle(self, request: Request) -> None:
+        """
+        Dependencia de cada ruta: cuenta la llamada por operación, aplica el
+        retardo configurado e inyecta fallos.
+        """
+        operation = f"{request.method} {request.scope['route'].path}"
+        self.calls[operation] += 1
+        delay = self.profile.latency + random.uniform(0, self.profile.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.profile.failure_rate and random.random() < self.profile.failure_rate:
+            self.failures[operation] += 1
+            raise HTTPException(status_code=500, detail=f"Fallo inyectado en {self.name}")
+    
+    def reset(self) -> None:
+        self.calls.clear()
+        self.failures.clear()
+    
+    def report(self) -> Dict[str, Dict[str, int]]:
+        return {
+            "total": sum(self.calls.values()),
+            "calls": dict(self.calls),
+            "failures": dict(self.failures)
+        }
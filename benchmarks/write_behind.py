@@ -0,0 +1,97 @@
+"""
+Compara POST /api/v1/message con la escritura de mensajes síncrona y con
+write-behind (MESSAGE_WRITE_BEHIND), contra los servidores falsos.
+
+Para cada modo se arranca el backend, se envían `--turns` mensajes y se
+detiene el backend (el apagado vacía la cola del writer). Se informa del
+throughput, la latencia y las inserciones en la tabla messages por cada
+1.000 turnos, además de las filas escritas para comprobar que no se pierde
+ninguna.
+
+Uso:
+    python -m benchmarks.write_behind --turns 1000 --concurrency 20
+"""
+import json
+import asyncio
+import argparse
+from typing import Any, Dict
+import httpx
+from benchmarks.fake_openai import FakeOpenAI
+from benchmarks.fake_postgrest import FakePostgrest
+from benchmarks.run import backend_env, run_scenario, serve, start_backend, wait_ready
+from benchmarks.upstream import UpstreamProfile
+
+async def measure_mode(
+    args,
+    fake_openai: FakeOpenAI,
+    fake_postgrest: FakePostgrest,
+    write_behind: bool
+) -> Dict[str, Any]:
+    mode = "on" if write_behind else "off"
+    client_ids = fake_postgrest.seed(args.clients, 0, prefix=f"write-behind-{mode}")
+    upstreams = {"openai": fake_openai, "postgrest": fake_postgrest}
+    env = backend_env(args.openai_port, args.postgrest_port, MESSAGE_WRITE_BEHIND=str(write_behind).lower())
+    backend = start_backend(args.port, env)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout) as client:
+            await wait_ready(client)
+            rows_before = len(fake_postgrest.tables.get("messages", []))
+            result = await run_scenario(client, "message", client_ids, args.concurrency, args.turns, upstreams)
+    finally:
+        # El apagado ordenado escribe los mensajes que queden en la cola
+        backend.terminate()
+        backend.wait()
+    
+    inserts = fake_postgrest.inserts["messages"]
+    turns = result["requests"] - result["errors"]
+    return {
+        "write_behind": write_behind,
+        "turns": turns,
+        "rps": result["rps"],
+        "latency_ms": result["latency_ms"],
+        "message_inserts": inserts,
+        "message_inserts_per_1000_turns": round(inserts * 1000 / turns, 1) if turns else 0.0,
+        "postgrest_round_trips_per_1000_turns": (
+            round(result["upstream"]["postgrest"]["total"] * 1000 / turns, 1) if turns else 0.0
+        ),
+        "rows_written": len(fake_postgrest.tables.get("messages", [])) - rows_before
+    }
+
+async def main(args) -> Dict[str, Any]:
+    fake_openai = FakeOpenAI(UpstreamProfile(args.openai_latency), run_duration=args.run_duration)
+    fake_postgrest = FakePostgrest(UpstreamProfile(args.db_latency))
+    servers = [
+        await serve(fake_openai.app, args.openai_port),
+        await serve(fake_postgrest.app, args.postgrest_port)
+    ]
+    try:
+        results = [
+            await measure_mode(args, fake_openai, fake_postgrest, write_behind)
+            for write_behind in (False, True)
+        ]
+    finally:
+        for server, _ in servers:
+            server.should_exit = True
+        await asyncio.gather(*(task for _, task in servers))
+    
+    return {
+        "config": vars(args),
+        "results": results
+    }
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Escritura de mensajes síncrona frente a write-behind")
+    parser.add_argument("--turns", type=int, default=1000, help="Mensajes enviados por modo")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--openai-port", type=int, default=8101)
+    parser.add_argument("--postgrest-port", type=int, default=8102)
+    parser.add_argument("--openai-latency", type=float, default=0.02)
+    parser.add_argument("--run-duration", type=float, default=0.2, help="Segundos hasta que un run termina")
+    parser.add_argument("--db-latency", type=float, default=0.01)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(main(parse_args())), indent=2))
@@ -0,0 +1,22 @@
+-- Registro client_id -> assistant_id compartido por todos los workers
+-- (app/services/assistant_registry.py).
+--
+-- El índice único sobre client_id es lo que hace atómico el "insertar si no
+-- existe" de AssistantRegistry.register: si dos workers crean un assistant a
+-- la vez, la segunda inserción falla y ese worker descarta el suyo.
+-- `version` se usa como compare-and-set en los reentrenamientos.
+create table if not exists assistant_registry (
+    id bigint generated always as identity primary key,
+    client_id text not null,
+    assistant_id text not null,
+    instructions_hash text,
+    version integer not null default 1,
+    updated_at timestamptz not null default now()
+);
+
+create unique index if not exists assistant_registry_client_id_key
+    on assistant_registry (client_id);
+
+-- AssistantRegistry.preload carga los registros más recientes
+create index if not exists assistant_registry_updated_at_idx
+    on assistant_registry (updated_at desc);
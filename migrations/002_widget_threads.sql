@@ -0,0 +1,15 @@
+-- Thread de OpenAI de cada (usuario, widget) de /chat con
+-- THREAD_STORE_BACKEND=supabase (app/services/thread_store.py).
+--
+-- SupabaseService.save_widget_thread hace un upsert con
+-- on_conflict=user_id,widget_id, que necesita este índice único.
+create table if not exists widget_threads (
+    id bigint generated always as identity primary key,
+    user_id text not null,
+    widget_id text not null,
+    thread_id text not null,
+    updated_at timestamptz not null default now()
+);
+
+create unique index if not exists widget_threads_user_widget_key
+    on widget_threads (user_id, widget_id);
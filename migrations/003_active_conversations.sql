@@ -0,0 +1,9 @@
+-- Una sola conversación activa por (cliente, rol).
+--
+-- SupabaseService.get_or_create_active_conversation evita duplicados dentro
+-- de un proceso con un lock; entre workers lo evita este índice: la segunda
+-- inserción falla y ese worker relee la conversación creada por el otro.
+-- Si ya hay duplicados, hay que cerrarlos antes de crear el índice.
+create unique index if not exists conversations_active_client_role_key
+    on conversations (client_id, role)
+    where status = 'active';
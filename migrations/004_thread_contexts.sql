@@ -0,0 +1,14 @@
+-- Contexto compactado con el que empieza un thread nuevo y thread del que
+-- procede (app/services/thread_compactor.py).
+create table if not exists thread_contexts (
+    id bigint generated always as identity primary key,
+    thread_id text not null,
+    source_thread_id text not null,
+    client_id text not null,
+    policy text not null,
+    context text not null,
+    created_at timestamptz not null default now()
+);
+
+create unique index if not exists thread_contexts_thread_id_key
+    on thread_contexts (thread_id);
@@ -0,0 +1,7 @@
+-- Cada thread se compacta como mucho una vez: si dos workers compactan el
+-- mismo thread a la vez, el segundo no puede guardar su contexto y adopta el
+-- thread del primero. También es la consulta con la que cualquier worker
+-- encuentra el thread al que se movió una conversación
+-- (app/services/thread_compactor.py).
+create unique index if not exists thread_contexts_source_thread_id_key
+    on thread_contexts (source_thread_id);
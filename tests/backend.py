@@ -0,0 +1,64 @@
+"""
+Backend en el mismo proceso que los tests, apuntando a los servidores falsos
+de benchmarks/.
+
+Las variables de entorno se fijan al importar este módulo, antes de que la
+aplicación lea la configuración (get_settings() se cachea en la primera
+llamada); conftest.py lo importa primero.
+"""
+import os
+import socket
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+import httpx
+from benchmarks.fake_openai import FakeOpenAI
+from benchmarks.fake_postgrest import FakePostgrest
+from benchmarks.run import backend_env, serve
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+OPENAI_PORT = _free_port()
+POSTGREST_PORT = _free_port()
+
+# Máximo de filas por respuesta con el que se crean los PostgREST falsos que lo recortan
+MAX_ROWS = 50
+
+os.environ.update(backend_env(
+    OPENAI_PORT,
+    POSTGREST_PORT,
+    RUN_POLL_INITIAL_INTERVAL="0.05",
+    SUPABASE_MAX_ROWS=str(MAX_ROWS)
+))
+
+@asynccontextmanager
+async def running_backend(fake_openai: FakeOpenAI, fake_postgrest: FakePostgrest) -> AsyncIterator[httpx.AsyncClient]:
+    """
+    Levanta los servidores falsos y devuelve un cliente HTTP contra la
+    aplicación. Al salir cierra los pools de conexiones, que quedan ligados
+    al event loop del test.
+    """
+    from app.db.supabase_client import close_supabase_client
+    from app.main import app
+    from app.services.openai_client import close_openai_client
+    
+    servers = [
+        await serve(fake_openai.app, OPENAI_PORT),
+        await serve(fake_postgrest.app, POSTGREST_PORT)
+    ]
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://backend",
+            timeout=30.0
+        ) as client:
+            yield client
+    finally:
+        await close_openai_client()
+        await close_supabase_client()
+        for server, _ in servers:
+            server.should_exit = True
+        await asyncio.gather(*(task for _, task in servers))
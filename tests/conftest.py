@@ -0,0 +1,2 @@
+# Configura el entorno antes de que ningún test importe la aplicación
+import tests.backend  # noqa: F401
@@ -0,0 +1,24 @@
+import time
+from app.services.answer_cache import AnswerCache
+
+def test_entries_are_scoped_by_role_and_instructions():
+    cache = AnswerCache(enabled=True, roles=["ventas", "soporte"])
+    cache.set("client", "ventas", "¿Precio?", "es", "Desde 10 €", "hash-1", tokens=30)
+    
+    assert cache.get("client", "ventas", "¿precio", "es", "hash-1") == "Desde 10 €"
+    assert cache.get("client", "soporte", "¿Precio?", "es", "hash-1") is None
+    # Otro worker reentrenó: la respuesta se generó con instrucciones anteriores
+    assert cache.get("client", "ventas", "¿Precio?", "es", "hash-2") is None
+    assert cache.get("client", "ventas", "¿Precio?", "es", "hash-1") is None
+    assert cache.stats()["stale"] == 1
+
+def test_client_bucket_outlives_its_first_entry():
+    """Las escrituras renuevan el cliente; cada entrada caduca `ttl` después de guardarse."""
+    cache = AnswerCache(enabled=True, roles=["ventas"], ttl=0.3)
+    cache.set("client", "ventas", "¿Horario?", "es", "De 9 a 18", None)
+    time.sleep(0.2)
+    cache.set("client", "ventas", "¿Envíos?", "es", "A todo el país", None)
+    time.sleep(0.2)
+    
+    assert cache.get("client", "ventas", "¿Horario?", "es", None) is None
+    assert cache.get("client", "ventas", "¿Envíos?", "es", None) == "A todo el país"
@@ -0,0 +1,32 @@
+import time
+import asyncio
+from benchmarks.fake_openai import FakeOpenAI
+from benchmarks.fake_postgrest import FakePostgrest
+from benchmarks.upstream import UpstreamProfile
+from tests.backend import running_backend
+
+DB_LATENCY = 0.3
+
+def test_instruction_reads_take_one_round_trip():
+    """
+    Las tres lecturas de load_instructions (cliente, información y
+    documentos) van en paralelo: con un PostgREST que tarda DB_LATENCY por
+    consulta, el camino frío tarda ~DB_LATENCY y no 3 * DB_LATENCY.
+    """
+    from app.services.openai_assistant import openai_assistant
+    
+    fake_postgrest = FakePostgrest(UpstreamProfile(latency=DB_LATENCY))
+    client_id = fake_postgrest.seed(clients=1, rows_per_client=0, prefix="fanout")[0]
+    
+    async def scenario():
+        async with running_backend(FakeOpenAI(), fake_postgrest):
+            started = time.perf_counter()
+            client, instructions = await openai_assistant.load_instructions(client_id)
+            return time.perf_counter() - started, client, instructions
+    
+    elapsed, client, instructions = asyncio.run(scenario())
+    
+    assert client["id"] == client_id
+    assert "Catálogo" in instructions
+    assert fake_postgrest.upstream.report()["total"] == 3
+    assert DB_LATENCY <= elapsed < 2 * DB_LATENCY
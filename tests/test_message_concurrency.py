@@ -0,0 +1,74 @@
+import time
+import asyncio
+from benchmarks.fake_openai import FakeOpenAI
+from benchmarks.fake_postgrest import FakePostgrest
+from tests.backend import running_backend
+
+CONCURRENT_MESSAGES = 8
+RUN_DURATION = 0.5
+
+def test_concurrent_messages_on_one_thread_are_serialized():
+    """
+    Varios /message simultáneos de la misma conversación comparten thread:
+    ninguno falla y la API falsa, que rechaza un run mientras otro está
+    activo, nunca ve dos runs a la vez.
+    """
+    fake_openai = FakeOpenAI(run_duration=0.2)
+    fake_postgrest = FakePostgrest()
+    client_id = fake_postgrest.seed(clients=1, rows_per_client=0, prefix="concurrency")[0]
+    
+    def message(text: str):
+        return {"client_id": client_id, "role": "soporte", "message": text}
+    
+    async def scenario():
+        async with running_backend(fake_openai, fake_postgrest) as backend:
+            # El primer mensaje crea el thread de la conversación
+            first = await backend.post("/api/v1/message", json=message("Hola"))
+            responses = await asyncio.gather(*(
+                backend.post("/api/v1/message", json=message(f"Pregunta {i}"))
+                for i in range(CONCURRENT_MESSAGES)
+            ))
+        return first, responses
+    
+    first, responses = asyncio.run(scenario())
+    
+    assert first.status_code == 200
+    assert [response.status_code for response in responses] == [200] * CONCURRENT_MESSAGES
+    thread_id = first.json()["thread_id"]
+    assert {response.json()["thread_id"] for response in responses} == {thread_id}
+    assert fake_openai.run_conflicts == 0
+    # Los mensajes que llegan con un run en curso se responden juntos
+    runs = fake_openai.threads[thread_id]["runs"]
+    assert 2 <= len(runs) <= CONCURRENT_MESSAGES + 1
+    assert all(run["status"] == "completed" for run in runs.values())
+
+def test_parallel_conversations_take_about_one_run():
+    """
+    /message en conversaciones distintas no se bloquean entre sí: N
+    peticiones simultáneas tardan aproximadamente lo que un solo run y no N.
+    """
+    fake_openai = FakeOpenAI(run_duration=RUN_DURATION)
+    fake_postgrest = FakePostgrest()
+    client_ids = fake_postgrest.seed(clients=CONCURRENT_MESSAGES // 2, rows_per_client=0, prefix="parallel")
+    requests = [
+        {"client_id": client_id, "role": role, "message": "¿Cuál es el horario?"}
+        for client_id in client_ids
+        for role in ("ventas", "soporte")
+    ]
+    
+    async def send_all(backend):
+        responses = await asyncio.gather(*(backend.post("/api/v1/message", json=body) for body in requests))
+        assert [response.status_code for response in responses] == [200] * len(requests)
+    
+    async def scenario():
+        async with running_backend(fake_openai, fake_postgrest) as backend:
+            # La primera ronda crea los assistants, las conversaciones y los threads
+            await send_all(backend)
+            started = time.perf_counter()
+            await send_all(backend)
+            return time.perf_counter() - started
+    
+    elapsed = asyncio.run(scenario())
+    
+    assert elapsed < 2 * RUN_DURATION
+    assert fake_openai.run_conflicts == 0
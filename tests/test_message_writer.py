@@ -0,0 +1,45 @@
+import asyncio
+from benchmarks.fake_openai import FakeOpenAI
+from benchmarks.fake_postgrest import FakePostgrest
+from app.services.message_writer import MessageWriter
+from tests.backend import running_backend
+
+def test_replayed_batch_that_was_already_written_is_not_duplicated(tmp_path):
+    """Un lote que Supabase guardó pero cuya respuesta no llegó acaba también en el spool."""
+    fake_postgrest = FakePostgrest()
+    
+    async def scenario():
+        async with running_backend(FakeOpenAI(), fake_postgrest):
+            writer = MessageWriter(flush_interval=0.05, spool_path=str(tmp_path / "spool.jsonl"))
+            await writer.start()
+            writer.enqueue("writer-replay-conv", "user", "Hola")
+            writer.enqueue("writer-replay-conv", "assistant", "¿En qué puedo ayudarte?")
+            batch = writer.unwritten("writer-replay-conv")
+            await writer.stop()
+            
+            writer._append_spool(batch)
+            await writer._replay_spool()
+            return writer.stats()
+    
+    stats = asyncio.run(scenario())
+    
+    rows = [row for row in fake_postgrest.tables["messages"] if row["conversation_id"] == "writer-replay-conv"]
+    assert [row["content"] for row in rows] == ["Hola", "¿En qué puedo ayudarte?"]
+    assert stats["written"] == 2 and stats["replayed"] == 2
+
+def test_queued_turns_stay_readable_until_written(tmp_path):
+    fake_postgrest = FakePostgrest()
+    
+    async def scenario():
+        async with running_backend(FakeOpenAI(), fake_postgrest):
+            writer = MessageWriter(flush_interval=0.2, spool_path=str(tmp_path / "spool.jsonl"))
+            await writer.start()
+            writer.enqueue("writer-pending-conv", "user", "¿Tenéis envío gratis?")
+            queued = [row["content"] for row in writer.unwritten("writer-pending-conv")]
+            await writer.stop()
+            return queued, writer.unwritten("writer-pending-conv")
+    
+    queued, after_stop = asyncio.run(scenario())
+    
+    assert queued == ["¿Tenéis envío gratis?"]
+    assert after_stop == []
@@ -0,0 +1,60 @@
+import asyncio
+from benchmarks.fake_openai import FakeOpenAI
+from benchmarks.fake_postgrest import FakePostgrest
+from tests.backend import MAX_ROWS, running_backend
+
+PAGE_SIZE = 3
+
+def test_keyset_pages_cover_rows_sharing_created_at():
+    """
+    Las filas insertadas juntas comparten created_at: la paginación por
+    (created_at, id) las devuelve todas, una sola vez y en orden.
+    """
+    fake_postgrest = FakePostgrest()
+    client_id = fake_postgrest.seed(clients=1, rows_per_client=0, prefix="pagination")[0]
+    for i in range(8):
+        fake_postgrest._upsert("captured_leads", {
+            "client_id": client_id,
+            "name": f"Lead {i}",
+            "email": f"lead{i}@example.com",
+            "phone": None,
+            "status": "new",
+            "created_at": "2024-01-01T00:00:00+00:00" if i < 5 else "2024-01-02T00:00:00+00:00"
+        }, None)
+    expected = sorted(fake_postgrest.tables["captured_leads"], key=lambda row: (row["created_at"], row["id"]))
+    
+    async def scenario():
+        ids = []
+        cursor = None
+        async with running_backend(FakeOpenAI(), fake_postgrest) as backend:
+            while True:
+                params = {"limit": PAGE_SIZE, **({"cursor": cursor} if cursor else {})}
+                response = await backend.get(f"/api/v1/leads/{client_id}", params=params)
+                response.raise_for_status()
+                ids += [lead["id"] for lead in response.json()]
+                cursor = response.headers.get("X-Next-Cursor")
+                if not cursor:
+                    return ids
+    
+    assert asyncio.run(scenario()) == [row["id"] for row in expected]
+
+def test_conversation_histories_survive_the_max_rows_cap():
+    """Los mensajes de un lote de conversaciones se leen por páginas y no se recortan."""
+    fake_postgrest = FakePostgrest(max_rows=MAX_ROWS)
+    client_id = fake_postgrest.seed(
+        clients=1,
+        rows_per_client=3,
+        messages_per_conversation=MAX_ROWS,
+        prefix="max-rows"
+    )[0]
+    
+    async def scenario():
+        async with running_backend(FakeOpenAI(), fake_postgrest) as backend:
+            return await backend.get(f"/api/v1/conversations/{client_id}")
+    
+    response = asyncio.run(scenario())
+    
+    assert response.status_code == 200
+    conversations = response.json()
+    assert len(conversations) == 3
+    assert [len(conversation["messages"]) for conversation in conversations] == [MAX_ROWS] * 3
@@ -0,0 +1,102 @@
+import time
+import asyncio
+import httpx
+import pytest
+from benchmarks.fake_openai import SHARED_ASSISTANT_ID, FakeOpenAI
+from benchmarks.run import serve
+from benchmarks.upstream import UpstreamProfile
+from app.core.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilientTransport,
+    RetryPolicy,
+    CLOSED,
+    HALF_OPEN,
+    OPEN
+)
+from tests.backend import OPENAI_PORT
+
+BASE_URL = f"http://127.0.0.1:{OPENAI_PORT}/v1"
+
+class CountingTransport(httpx.AsyncHTTPTransport):
+    """Transporte real que cuenta los intentos de envío."""
+    def __init__(self):
+        super().__init__()
+        self.attempts = 0
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.attempts += 1
+        return await super().handle_async_request(request)
+
+def resilient_client(transport: httpx.AsyncBaseTransport, breaker: CircuitBreaker) -> httpx.AsyncClient:
+    policy = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.01)
+    return httpx.AsyncClient(transport=ResilientTransport(transport, breaker, policy), base_url=BASE_URL)
+
+def test_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker("test", failure_threshold=3, recovery_timeout=0.1)
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    
+    # Pasado recovery_timeout deja pasar una sola llamada de prueba
+    time.sleep(0.12)
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    
+    time.sleep(0.12)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.stats()["opened"] == 2
+
+def test_post_is_not_retried_once_sent():
+    """
+    Un POST que llegó al servicio y falló con 500 no se repite (podría
+    haberse aplicado); un GET sí. Los fallos abren el circuito y las
+    llamadas siguientes no llegan a enviarse.
+    """
+    fake_openai = FakeOpenAI(UpstreamProfile(failure_rate=1.0))
+    breaker = CircuitBreaker("test", failure_threshold=4, recovery_timeout=30.0)
+    
+    async def scenario():
+        server, task = await serve(fake_openai.app, OPENAI_PORT)
+        try:
+            transport = CountingTransport()
+            async with resilient_client(transport, breaker) as client:
+                created = await client.post("/assistants", json={"model": "gpt-4"})
+                retrieved = await client.get(f"/assistants/{SHARED_ASSISTANT_ID}")
+                with pytest.raises(CircuitOpenError):
+                    await client.get(f"/assistants/{SHARED_ASSISTANT_ID}")
+            return created.status_code, retrieved.status_code, transport.attempts
+        finally:
+            server.should_exit = True
+            await task
+    
+    created, retrieved, attempts = asyncio.run(scenario())
+    
+    assert (created, retrieved) == (500, 500)
+    assert fake_openai.upstream.calls["POST /v1/assistants"] == 1
+    assert fake_openai.upstream.calls["GET /v1/assistants/{assistant_id}"] == 3
+    assert attempts == 4
+    assert breaker.state == OPEN
+
+def test_post_is_retried_when_never_sent():
+    """Con el servicio caído la conexión falla antes de enviar nada: el POST se reintenta."""
+    breaker = CircuitBreaker("test", failure_threshold=10)
+    
+    async def scenario():
+        transport = CountingTransport()
+        async with resilient_client(transport, breaker) as client:
+            with pytest.raises(httpx.ConnectError):
+                await client.post("/assistants", json={"model": "gpt-4"})
+        return transport.attempts
+    
+    assert asyncio.run(scenario()) == 3
+    assert breaker.stats()["consecutive_failures"] == 3
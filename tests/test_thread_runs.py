@@ -0,0 +1,97 @@
+import asyncio
+from app.services.thread_runs import ThreadRunCoordinator
+
+THREAD_ID = "thread_refcount"
+
+def test_lock_and_runs_never_overlap():
+    """
+    Mezcla runs encolados con `submit` y accesos exclusivos con `lock` sobre
+    el mismo thread. Cuando uno suelta el candado con otros esperando, el
+    estado del thread no puede borrarse: un solicitante nuevo crearía un
+    candado distinto y habría dos a la vez dentro del thread.
+    """
+    coordinator = ThreadRunCoordinator()
+    holders = 0
+    max_holders = 0
+    
+    async def inside():
+        nonlocal holders, max_holders
+        holders += 1
+        max_holders = max(max_holders, holders)
+        await asyncio.sleep(0.001)
+        holders -= 1
+    
+    async def execute(messages):
+        await inside()
+        return {"response": " | ".join(messages)}
+    
+    async def locked():
+        async with coordinator.lock(THREAD_ID):
+            await inside()
+    
+    async def scenario():
+        for round_number in range(20):
+            tasks = [asyncio.create_task(locked()) for _ in range(3)]
+            # Llegan justo cuando el primer candado se suelta y los demás siguen esperando
+            await asyncio.sleep(0.001)
+            tasks += [
+                asyncio.create_task(coordinator.submit(THREAD_ID, f"{round_number}-{i}", execute))
+                for i in range(3)
+            ]
+            tasks += [asyncio.create_task(locked()) for _ in range(2)]
+            await asyncio.gather(*tasks)
+    
+    asyncio.run(scenario())
+    
+    assert max_holders == 1
+    assert coordinator.stats()["active_threads"] == 0
+    assert coordinator.runs >= 20
+
+def test_batched_runs_are_flagged_on_every_reply():
+    """Todas las respuestas de un run que contestó a varios mensajes llevan `batched`."""
+    coordinator = ThreadRunCoordinator()
+    
+    async def execute(messages):
+        await asyncio.sleep(0.01)
+        return {"response": " | ".join(messages)}
+    
+    async def scenario():
+        first = asyncio.create_task(coordinator.submit(THREAD_ID, "hola", execute))
+        await asyncio.sleep(0)
+        # Llegan mientras el primer run está en curso: se responden juntos
+        rest = await asyncio.gather(*(
+            coordinator.submit(THREAD_ID, text, execute) for text in ("¿precio?", "¿envíos?")
+        ))
+        return await first, rest
+    
+    first, rest = asyncio.run(scenario())
+    
+    assert first["batched"] is False
+    assert [reply["response"] for reply in rest] == ["¿precio? | ¿envíos?"] * 2
+    assert [reply["batched"] for reply in rest] == [True, True]
+    assert [reply["coalesced"] for reply in rest] == [True, False]
+
+def test_stats_list_the_deepest_conversations():
+    coordinator = ThreadRunCoordinator()
+    
+    async def execute(messages):
+        await asyncio.sleep(0.01)
+        return {"response": " | ".join(messages)}
+    
+    async def scenario():
+        tasks = [asyncio.create_task(coordinator.submit(key, "hola", execute)) for key in ("conv-a", "conv-b")]
+        await asyncio.sleep(0)
+        # Llegan con el primer run de cada conversación en curso: esperan el siguiente
+        tasks += [
+            asyncio.create_task(coordinator.submit(key, text, execute))
+            for key, text in [("conv-a", "¿precio?"), ("conv-a", "¿envíos?"), ("conv-b", "¿horario?")]
+        ]
+        await asyncio.sleep(0)
+        deepest = coordinator.stats()["deepest"]
+        await asyncio.gather(*tasks)
+        return deepest, coordinator.stats()["deepest"]
+    
+    during, after = asyncio.run(scenario())
+    
+    assert during == {"conv-a": 2, "conv-b": 1}
+    assert after == {}
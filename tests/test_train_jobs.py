@@ -0,0 +1,97 @@
+import time
+import asyncio
+from benchmarks.fake_openai import FakeOpenAI
+from benchmarks.fake_postgrest import FakePostgrest
+from benchmarks.upstream import UpstreamProfile
+from app.services.job_queue import InMemoryJobQueue, JOB_SUCCEEDED, JOB_FAILED
+from app.services.openai_assistant import TRAIN_CREATED
+from app.services.train_jobs import TrainJobManager
+from tests.backend import running_backend
+
+async def wait_finished(manager: TrainJobManager, job_id: str, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = await manager.queue.get_job(job_id)
+        if job.status in (JOB_SUCCEEDED, JOB_FAILED):
+            return job
+        await asyncio.sleep(0.02)
+    raise TimeoutError(f"El job {job_id} no terminó")
+
+def test_workers_mark_jobs_succeeded_or_failed():
+    fake_postgrest = FakePostgrest()
+    client_id = fake_postgrest.seed(clients=1, rows_per_client=0, prefix="train-ok")[0]
+    
+    async def scenario():
+        async with running_backend(FakeOpenAI(), fake_postgrest):
+            manager = TrainJobManager(InMemoryJobQueue(), workers=2, rate=0)
+            manager.start()
+            try:
+                trained = await manager.submit(client_id)
+                missing = await manager.submit("train-ok-missing")
+                return await wait_finished(manager, trained.id), await wait_finished(manager, missing.id)
+            finally:
+                await manager.stop()
+    
+    trained, missing = asyncio.run(scenario())
+    
+    assert trained.status == JOB_SUCCEEDED
+    assert trained.result["status"] == TRAIN_CREATED
+    # Un cliente inexistente falla sin reintentos
+    assert missing.status == JOB_FAILED
+    assert missing.error == "Cliente no encontrado"
+    assert missing.attempts == 1
+
+def test_failed_training_is_retried_with_backoff():
+    """
+    Con OpenAI fallando, el job se reencola tras retry_delay y 2 * retry_delay
+    y se marca como fallido al agotar los intentos. Son 3 fallos de OpenAI,
+    por debajo del umbral con el que se abre su circuit breaker.
+    """
+    retry_delay = 0.1
+    fake_openai = FakeOpenAI(UpstreamProfile(failure_rate=1.0))
+    fake_postgrest = FakePostgrest()
+    client_id = fake_postgrest.seed(clients=1, rows_per_client=0, prefix="train-retry")[0]
+    
+    async def scenario():
+        async with running_backend(fake_openai, fake_postgrest):
+            manager = TrainJobManager(InMemoryJobQueue(), workers=1, rate=0, max_attempts=3, retry_delay=retry_delay)
+            manager.start()
+            try:
+                started = time.perf_counter()
+                job = await manager.submit(client_id)
+                job = await wait_finished(manager, job.id)
+                return job, time.perf_counter() - started
+            finally:
+                await manager.stop()
+    
+    job, elapsed = asyncio.run(scenario())
+    
+    assert job.status == JOB_FAILED
+    assert job.attempts == 3
+    assert job.error == "Error al reentrenar el assistant"
+    assert fake_openai.upstream.calls["POST /v1/assistants"] == 3
+    assert elapsed >= 3 * retry_delay
+
+def test_trainings_respect_the_rate_limit():
+    """Con rate=10 y ráfagas de `workers`, 6 reentrenamientos tardan al menos 0,4 s."""
+    fake_postgrest = FakePostgrest()
+    client_ids = fake_postgrest.seed(clients=6, rows_per_client=0, prefix="train-rate")
+    
+    async def scenario():
+        async with running_backend(FakeOpenAI(), fake_postgrest):
+            manager = TrainJobManager(InMemoryJobQueue(), workers=2, rate=10)
+            manager.start()
+            try:
+                started = time.perf_counter()
+                batch = await manager.submit_many(client_ids)
+                for job_id in batch["job_ids"]:
+                    await wait_finished(manager, job_id)
+                return await manager.batch_progress(batch["batch_id"]), time.perf_counter() - started
+            finally:
+                await manager.stop()
+    
+    progress, elapsed = asyncio.run(scenario())
+    
+    assert progress["done"]
+    assert progress["counts"] == {JOB_SUCCEEDED: 6}
+    assert elapsed >= 0.35
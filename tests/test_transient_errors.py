@@ -0,0 +1,22 @@
+import asyncio
+from benchmarks.fake_openai import FakeOpenAI
+from benchmarks.fake_postgrest import FakePostgrest
+from benchmarks.upstream import UpstreamProfile
+from tests.backend import running_backend
+
+def test_postgrest_outage_answers_503():
+    """
+    Un PostgREST que responde 500 a todo (también tras los reintentos) es una
+    caída pasajera: la API responde 503 con Retry-After y no 500.
+    """
+    fake_postgrest = FakePostgrest(UpstreamProfile(failure_rate=1.0))
+    client_id = fake_postgrest.seed(clients=1, rows_per_client=1, prefix="transient")[0]
+    
+    async def scenario():
+        async with running_backend(FakeOpenAI(), fake_postgrest) as client:
+            return await client.get(f"/api/v1/leads/{client_id}")
+    
+    response = asyncio.run(scenario())
+    
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
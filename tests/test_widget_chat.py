@@ -0,0 +1,117 @@
+import asyncio
+import httpx
+from benchmarks.fake_openai import REPLY, FakeOpenAI
+from benchmarks.fake_postgrest import FakePostgrest
+from tests.backend import running_backend
+
+def chat_request(widget_id: str, message: str = "¿Qué horario tienen?") -> dict:
+    return {"message": message, "widget_id": widget_id, "user_id": "user-chat", "engine": "assistants"}
+
+def test_chat_and_chat_stream_are_mounted():
+    """/chat responde con todos los campos de ChatResponse y /chat/stream termina con `done`."""
+    fake_openai = FakeOpenAI(run_duration=0.1)
+    request = chat_request("widget-chat")
+    
+    async def scenario():
+        async with running_backend(fake_openai, FakePostgrest()) as backend:
+            response = await backend.post("/api/v1/chat", json=request)
+            stream = await backend.post("/api/v1/chat/stream", json=request)
+        return response, stream
+    
+    response, stream = asyncio.run(scenario())
+    
+    assert response.status_code == 200
+    assert response.json() == {
+        "response": REPLY,
+        "role": "assistant",
+        "finish_reason": "stop",
+        "language": "es"
+    }
+    assert stream.status_code == 200
+    assert "event: done" in stream.text
+    assert "event: error" not in stream.text
+    # El mismo usuario sigue en su thread
+    assert len(fake_openai.threads) == 1
+
+def test_chat_goes_through_admission_control():
+    """
+    /chat pasa por el control de admisión por widget: con un run por widget
+    y uno en cola, la tercera petición simultánea recibe 429 con Retry-After.
+    """
+    from app.api.deps import get_admission
+    from app.main import app
+    from app.services.admission import AdmissionController
+    
+    admission = AdmissionController(max_concurrent=10, per_tenant=1, max_queue=10)
+    app.dependency_overrides[get_admission] = lambda: admission
+    
+    async def scenario():
+        async with running_backend(FakeOpenAI(run_duration=0.3), FakePostgrest()) as backend:
+            return await asyncio.gather(*(
+                backend.post("/api/v1/chat", json=chat_request("widget-admission", f"Pregunta {i}"))
+                for i in range(3)
+            ))
+    
+    try:
+        responses = asyncio.run(scenario())
+    finally:
+        app.dependency_overrides.pop(get_admission)
+    
+    assert sorted(response.status_code for response in responses) == [200, 200, 429]
+    rejected = next(response for response in responses if response.status_code == 429)
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert admission.stats()["admitted"] == 2
+
+class StubChatService:
+    """Sustituto de openai_service que responde sin llamar a OpenAI."""
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.calls = []
+    
+    async def ask_nnia(self, **kwargs) -> str:
+        self.calls.append(kwargs)
+        if self.error:
+            raise self.error
+        return "Respuesta del sustituto"
+
+def _chat_with_service(service: StubChatService, fake_openai: FakeOpenAI):
+    from app.api.deps import get_openai_service
+    from app.main import app
+    
+    app.dependency_overrides[get_openai_service] = lambda: service
+    
+    async def scenario():
+        async with running_backend(fake_openai, FakePostgrest()) as backend:
+            return await backend.post("/api/v1/chat", json=chat_request("widget-stub"))
+    
+    try:
+        return asyncio.run(scenario())
+    finally:
+        app.dependency_overrides.pop(get_openai_service)
+
+def test_chat_uses_the_injected_service():
+    """/chat obtiene el servicio de OpenAI de deps, así que se puede sustituir."""
+    service = StubChatService()
+    fake_openai = FakeOpenAI()
+    
+    response = _chat_with_service(service, fake_openai)
+    
+    assert response.status_code == 200
+    assert response.json()["response"] == "Respuesta del sustituto"
+    assert [call["widget_id"] for call in service.calls] == ["widget-stub"]
+    assert fake_openai.threads == {}
+
+def test_chat_answers_503_when_openai_is_down():
+    """Una caída pasajera de OpenAI en /chat responde 503 con Retry-After, como /message."""
+    service = StubChatService(error=httpx.ConnectError("Conexión rechazada"))
+    
+    response = _chat_with_service(service, FakeOpenAI())
+    
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+def test_chat_answers_500_on_other_errors():
+    response = _chat_with_service(StubChatService(error=ValueError("Respuesta inesperada")), FakeOpenAI())
+    
+    assert response.status_code == 500
+    assert response.json()["detail"] == "Error interno al procesar la petición"